@@ -0,0 +1,211 @@
+"""
+Batch execution: many topics at once, sharing the work their article sets
+have in common.
+
+    results = run_many(["fed rates", "treasury yields", "inflation"])
+    results = await arun_many([...])   # same, on ainvoke
+
+1. Every topic is expanded into sub-queries and fetched from every provider
+   (workflow.expand_query and fetch_articles per topic, at most
+   max_concurrency topics in flight).
+2. The union of the fetched articles is enriched once: canonical-URL and
+   near-duplicate dedup, scraping, embedding, topic extraction and evidence
+   chunks. An article returned for several topics costs one download, one
+   embedding and one topic call.
+3. Each topic gets its own checkpointed thread of the normal workflow
+   graph, seeded as if fetch_articles and enrich_articles had just run with
+   its raw articles and the shared enriched copies of them. The similarity
+   graph, clustering, ranking and answer nodes then run per topic, again at
+   most max_concurrency at a time.
+
+LLM and embedding calls from every topic also share the process-wide
+executor's rate limits. Shared articles are the same dicts in every topic's
+state; the per-topic nodes only read them.
+"""
+
+import asyncio
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from agent import workflow
+from graph import dedup
+from llm import tracing
+
+DEFAULT_MAX_CONCURRENCY = 4
+
+
+def _fetch_topic(topic: str) -> Dict[str, Any]:
+    """
+    The expand_query + fetch_articles state for one topic.
+    """
+    return workflow.fetch_articles(workflow.expand_query({"topic": topic}))
+
+
+def _shared_index(enriched: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Canonical URL -> surviving enriched article, for every copy dedup
+    folded into it.
+    """
+    by_url: Dict[str, Dict[str, Any]] = {}
+    for article in enriched:
+        for record in article.get("sources") or [article]:
+            by_url.setdefault(dedup.canonicalize_url(record.get("url")), article)
+    return by_url
+
+
+def _topic_articles(raw: List[Dict[str, Any]], by_url: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    seen, out = set(), []
+    for article in raw:
+        shared = by_url.get(dedup.canonicalize_url(article.get("url")))
+        if shared is not None and id(shared) not in seen:
+            seen.add(id(shared))
+            out.append(shared)
+    return out
+
+
+def enrich_shared(fetched: Dict[str, Dict[str, Any]]) -> Tuple[Dict[str, List[Dict[str, Any]]], Dict[str, Any]]:
+    """
+    Enrich the union of every topic's raw_articles (fetched maps topic ->
+    fetch state) once. Returns each topic's enriched articles and the batch
+    stats.
+    """
+    # Copies: dedup annotates and merges the dicts it is given, and each
+    # topic keeps its own raw_articles untouched.
+    union = [dict(article) for state in fetched.values() for article in state.get("raw_articles", [])]
+    shared = workflow.enrich_articles({"raw_articles": union})
+    enriched = shared.get("enriched_articles", [])
+
+    by_url = _shared_index(enriched)
+    per_topic = {topic: _topic_articles(state.get("raw_articles", []), by_url) for topic, state in fetched.items()}
+    uses = Counter(id(article) for articles in per_topic.values() for article in articles)
+    stats = {
+        "topics": len(fetched),
+        "fetched_articles": len(union),
+        "unique_articles": len(enriched),
+        "shared_articles": sum(1 for n in uses.values() if n > 1),
+        "topic_articles": {topic: len(articles) for topic, articles in per_topic.items()},
+        "scrape_cache_stats": shared.get("scrape_cache_stats"),
+    }
+    return per_topic, stats
+
+
+def _seed_values(
+    refine_query: Optional[str], fetched: Dict[str, Any], enriched: List[Dict[str, Any]], stats: Dict[str, Any]
+) -> Dict[str, Any]:
+    values = dict(fetched)
+    values.update(
+        refine_query=refine_query,
+        enriched_articles=enriched,
+        scrape_cache_stats=stats.get("scrape_cache_stats"),
+        batch_stats=stats,
+    )
+    return values
+
+
+def _prepare(topics: Iterable[str], batch_id: Optional[str]) -> Tuple[List[str], Dict[str, str], tracing.Tracer]:
+    topics = list(dict.fromkeys(topics))
+    batch_id = batch_id or uuid.uuid4().hex
+    thread_ids = {topic: f"{batch_id}-{k}" for k, topic in enumerate(topics)}
+    return topics, thread_ids, tracing.Tracer(batch_id)
+
+
+def _finish_shared(tracer: tracing.Tracer, stats: Dict[str, Any], thread_ids: Dict[str, str]) -> None:
+    stats["thread_ids"] = thread_ids
+    stats["trace"] = tracer.to_state()
+
+
+def _failed(topic: str, thread_id: str, exc: BaseException) -> None:
+    print(f"[run_many:{topic}] failed: {exc} (resume with resume_run({thread_id!r}))")
+
+
+def run_many(
+    topics: Iterable[str],
+    refine_queries: Optional[Dict[str, str]] = None,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    batch_id: Optional[str] = None,
+    graph: Any = None,
+) -> Dict[str, Optional[workflow.AgentState]]:
+    """
+    Run the workflow for every topic, sharing fetch/scrape/embed/topic work
+    across them (see module docstring). Returns {topic: final state}; a
+    topic whose graph failed maps to None and its thread can be resumed
+    with workflow.resume_run (thread ids are in batch_stats["thread_ids"]).
+    Threads that complete are deleted from the checkpointer.
+    """
+    topics, thread_ids, tracer = _prepare(topics, batch_id)
+    refine_queries = refine_queries or {}
+    graph = graph or workflow.build_graph()
+
+    with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="batch") as pool:
+        with tracing.activate(tracer, node="batch_fetch"), tracing.span("node", "batch_fetch"):
+            fetched = dict(zip(topics, pool.map(tracing.wrap(_fetch_topic), topics)))
+        with tracing.activate(tracer, node="batch_enrich"), tracing.span("node", "batch_enrich"):
+            per_topic, stats = enrich_shared(fetched)
+        _finish_shared(tracer, stats, thread_ids)
+
+        configs = {}
+        for topic in topics:
+            configs[topic] = workflow._thread_config(thread_ids[topic])
+            values = _seed_values(refine_queries.get(topic), fetched[topic], per_topic[topic], stats)
+            graph.update_state(configs[topic], values, as_node="enrich_articles")
+
+        def finish(topic: str) -> Optional[workflow.AgentState]:
+            try:
+                result = graph.invoke(None, configs[topic])
+                workflow.finish_thread(graph, configs[topic])
+                return result
+            except Exception as exc:  # noqa: BLE001 - one topic must not sink the batch
+                _failed(topic, thread_ids[topic], exc)
+                return None
+
+        return dict(zip(topics, pool.map(finish, topics)))
+
+
+async def arun_many(
+    topics: Iterable[str],
+    refine_queries: Optional[Dict[str, str]] = None,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    batch_id: Optional[str] = None,
+    graph: Any = None,
+) -> Dict[str, Optional[workflow.AgentState]]:
+    """
+    run_many for a running event loop: fetches and the shared enrichment
+    run in worker threads, per-topic graphs on ainvoke, all under one
+    semaphore of max_concurrency.
+    """
+    topics, thread_ids, tracer = _prepare(topics, batch_id)
+    refine_queries = refine_queries or {}
+    graph = graph or workflow.build_graph()
+    budget = asyncio.Semaphore(max_concurrency)
+
+    async def bounded(make_awaitable):
+        async with budget:
+            return await make_awaitable()
+
+    with tracing.activate(tracer, node="batch_fetch"), tracing.span("node", "batch_fetch"):
+        fetch = tracing.wrap(_fetch_topic)
+        results = await asyncio.gather(*(bounded(lambda t=t: asyncio.to_thread(fetch, t)) for t in topics))
+        fetched = dict(zip(topics, results))
+    with tracing.activate(tracer, node="batch_enrich"), tracing.span("node", "batch_enrich"):
+        per_topic, stats = await asyncio.to_thread(tracing.wrap(enrich_shared), fetched)
+    _finish_shared(tracer, stats, thread_ids)
+
+    async def finish(topic: str) -> Optional[workflow.AgentState]:
+        config = workflow._thread_config(thread_ids[topic])
+        values = _seed_values(refine_queries.get(topic), fetched[topic], per_topic[topic], stats)
+        await graph.aupdate_state(config, values, as_node="enrich_articles")
+        try:
+            result = await bounded(lambda: graph.ainvoke(None, config))
+            await workflow.afinish_thread(graph, config)
+            return result
+        except Exception as exc:  # noqa: BLE001 - one topic must not sink the batch
+            _failed(topic, thread_ids[topic], exc)
+            return None
+
+    results = await asyncio.gather(*(finish(topic) for topic in topics))
+    return dict(zip(topics, results))
+
+
+__all__ = ["arun_many", "enrich_shared", "run_many"]
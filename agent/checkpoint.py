@@ -0,0 +1,385 @@
+"""
+Disk-backed LangGraph checkpointer that stores large state values once.
+
+MemorySaver keeps a full copy of AgentState (article texts, the similarity
+matrix, the igraph object, ...) after every node. Here each channel value is
+serialized, compressed and stored in a content-addressed `blobs` table keyed by
+its sha256; checkpoints and pending writes only hold references. Only the
+channels in a put's new_versions are serialized, and a channel version
+already on record (a replayed or forked step) reuses its stored digest
+without serializing again. Nodes hand back the whole state, so most channels
+get a new version at every step, but an unchanged value hashes to a blob
+that already exists and costs one small reference row. Disk use therefore
+grows with what actually changed between nodes.
+
+Because checkpoints are on disk, a run that dies mid-graph (say in
+draft_response) can be resumed from its last completed node with the same
+thread_id; see workflow.resume_run. Runs that complete are deleted by
+their caller (workflow.finish_thread), so the database only holds failed or
+interrupted threads; prune() drops those too once they are older than
+max_age, oldest first while blobs exceed max_bytes, and collects the blobs
+nothing references any more. get_checkpointer() prunes once per process.
+
+Values go through the saver's serde (msgpack, falling back to pickle for
+objects such as the igraph graph), so only point this at a local, trusted
+database. Rows written before the serde was used are read back as pickle.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from graph.paths import CACHE_DIR
+
+COMPRESS_LEVEL = 3
+# Retention for threads left behind by failed or interrupted runs.
+MAX_AGE_SECONDS = float(os.getenv("CHECKPOINT_MAX_AGE", str(7 * 24 * 3600)))
+MAX_BYTES = int(os.getenv("CHECKPOINT_MAX_BYTES", str(1 << 30)))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    data BLOB,
+    size INTEGER,
+    type TEXT DEFAULT 'pickle'
+);
+CREATE TABLE IF NOT EXISTS channel_values (
+    thread_id TEXT, checkpoint_ns TEXT, channel TEXT, version TEXT, hash TEXT,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT, checkpoint_ns TEXT, checkpoint_id TEXT, parent_id TEXT,
+    checkpoint BLOB, metadata BLOB,
+    checkpoint_type TEXT DEFAULT 'pickle', metadata_type TEXT DEFAULT 'pickle',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT, checkpoint_ns TEXT, checkpoint_id TEXT, task_id TEXT,
+    idx INTEGER, channel TEXT, hash TEXT, task_path TEXT,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id TEXT PRIMARY KEY,
+    updated_at REAL
+);
+"""
+_CHECKPOINT_COLUMNS = "checkpoint_id, parent_id, checkpoint, metadata, checkpoint_type, metadata_type"
+
+# Columns added since the first schema; older databases get them on open.
+# Rows that predate them were pickled.
+_ADDED_COLUMNS = (
+    ("blobs", "type TEXT DEFAULT 'pickle'"),
+    ("checkpoints", "checkpoint_type TEXT DEFAULT 'pickle'"),
+    ("checkpoints", "metadata_type TEXT DEFAULT 'pickle'"),
+)
+
+
+class DiskCheckpointer(BaseCheckpointSaver):
+    def __init__(self, path: Optional[str] = None, serde: Optional[SerializerProtocol] = None):
+        super().__init__(serde=serde or JsonPlusSerializer(pickle_fallback=True))
+        if path is None:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            path = os.path.join(CACHE_DIR, "checkpoints.sqlite")
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+        for table, column in _ADDED_COLUMNS:
+            existing = {row[1] for row in self._db.execute(f"PRAGMA table_info({table})")}
+            if column.split()[0] not in existing:
+                self._db.execute(f"ALTER TABLE {table} ADD COLUMN {column}")
+        # Threads checkpointed before the threads table existed start their clock now
+        self._db.execute(
+            "INSERT OR IGNORE INTO threads SELECT DISTINCT thread_id, ? FROM checkpoints", (time.time(),)
+        )
+        self._db.commit()
+        self.stats = {"blobs_written": 0, "blobs_reused": 0, "versions_reused": 0, "bytes_written": 0}
+
+    # --- blobs ------------------------------------------------------------ #
+
+    def _put_blob(self, value: Any) -> str:
+        """
+        Store `value` unless an identical one is already stored; returns its
+        hash. Caller holds the lock and commits.
+        """
+        type_, raw = self.serde.dumps_typed(value)
+        digest = hashlib.sha256(type_.encode() + b"\0" + raw).hexdigest()
+        if self._db.execute("SELECT 1 FROM blobs WHERE hash = ?", (digest,)).fetchone():
+            self.stats["blobs_reused"] += 1
+            return digest
+        data = zlib.compress(raw, COMPRESS_LEVEL)
+        self._db.execute("INSERT INTO blobs VALUES (?, ?, ?, ?)", (digest, data, len(data), type_))
+        self.stats["blobs_written"] += 1
+        self.stats["bytes_written"] += len(data)
+        return digest
+
+    def _touch(self, thread_id: str) -> None:
+        self._db.execute("INSERT OR REPLACE INTO threads VALUES (?, ?)", (thread_id, time.time()))
+
+    def _collect_blobs(self) -> int:
+        cur = self._db.execute(
+            "DELETE FROM blobs WHERE hash NOT IN (SELECT hash FROM channel_values WHERE hash IS NOT NULL)"
+            " AND hash NOT IN (SELECT hash FROM writes)"
+        )
+        return cur.rowcount
+
+    def _get_blob(self, digest: str, loaded: Dict[str, Any]) -> Any:
+        if digest not in loaded:
+            data, type_ = self._db.execute("SELECT data, type FROM blobs WHERE hash = ?", (digest,)).fetchone()
+            loaded[digest] = self.serde.loads_typed((type_, zlib.decompress(data)))
+        return loaded[digest]
+
+    # --- reads ------------------------------------------------------------ #
+
+    def _tuple(self, thread_id: str, ns: str, row: Tuple[Any, ...]) -> CheckpointTuple:
+        checkpoint_id, parent_id, checkpoint_raw, metadata_raw, checkpoint_type, metadata_type = row
+        checkpoint = self.serde.loads_typed((checkpoint_type, checkpoint_raw))
+        loaded: Dict[str, Any] = {}
+
+        values = {}
+        for channel, version in checkpoint["channel_versions"].items():
+            ref = self._db.execute(
+                "SELECT hash FROM channel_values"
+                " WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                (thread_id, ns, channel, str(version)),
+            ).fetchone()
+            if ref is not None and ref[0] is not None:
+                values[channel] = self._get_blob(ref[0], loaded)
+
+        writes = self._db.execute(
+            "SELECT task_id, channel, hash FROM writes"
+            " WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?"
+            " ORDER BY task_path, task_id, idx",
+            (thread_id, ns, checkpoint_id),
+        ).fetchall()
+
+        def config_for(cid: str) -> RunnableConfig:
+            return {"configurable": {"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": cid}}
+
+        return CheckpointTuple(
+            config=config_for(checkpoint_id),
+            checkpoint={**checkpoint, "channel_values": values},
+            metadata=self.serde.loads_typed((metadata_type, metadata_raw)),
+            parent_config=config_for(parent_id) if parent_id else None,
+            pending_writes=[(task_id, channel, self._get_blob(h, loaded)) for task_id, channel, h in writes],
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+        query = f"SELECT {_CHECKPOINT_COLUMNS} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+        params: List[Any] = [thread_id, ns]
+        if checkpoint_id:
+            query += " AND checkpoint_id = ?"
+            params.append(checkpoint_id)
+        query += " ORDER BY checkpoint_id DESC LIMIT 1"
+
+        with self._lock:
+            row = self._db.execute(query, params).fetchone()
+            return self._tuple(thread_id, ns, row) if row else None
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        query = f"SELECT thread_id, checkpoint_ns, {_CHECKPOINT_COLUMNS} FROM checkpoints WHERE 1 = 1"
+        params: List[Any] = []
+        if config:
+            query += " AND thread_id = ?"
+            params.append(config["configurable"]["thread_id"])
+            if config["configurable"].get("checkpoint_ns") is not None:
+                query += " AND checkpoint_ns = ?"
+                params.append(config["configurable"]["checkpoint_ns"])
+            if get_checkpoint_id(config):
+                query += " AND checkpoint_id = ?"
+                params.append(get_checkpoint_id(config))
+        if before and get_checkpoint_id(before):
+            query += " AND checkpoint_id < ?"
+            params.append(get_checkpoint_id(before))
+        query += " ORDER BY checkpoint_id DESC"
+
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+
+        for thread_id, ns, *row in rows:
+            if limit is not None and limit <= 0:
+                break
+            metadata = self.serde.loads_typed((row[5], row[3]))
+            if filter and any(metadata.get(k) != v for k, v in filter.items()):
+                continue
+            if limit is not None:
+                limit -= 1
+            with self._lock:
+                item = self._tuple(thread_id, ns, tuple(row))
+            yield item
+
+    # --- writes ----------------------------------------------------------- #
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        stored = checkpoint.copy()
+        values = stored.pop("channel_values")  # type: ignore[misc]
+        checkpoint_type, checkpoint_raw = self.serde.dumps_typed(stored)
+        metadata_type, metadata_raw = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+
+        with self._lock, self._db:
+            for channel, version in new_versions.items():
+                known = self._db.execute(
+                    "SELECT hash FROM channel_values"
+                    " WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                    (thread_id, ns, channel, str(version)),
+                ).fetchone()
+                if known is not None:
+                    self.stats["versions_reused"] += 1
+                    continue
+                digest = self._put_blob(values[channel]) if channel in values else None
+                self._db.execute(
+                    "INSERT OR REPLACE INTO channel_values VALUES (?, ?, ?, ?, ?)",
+                    (thread_id, ns, channel, str(version), digest),
+                )
+            self._db.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    thread_id,
+                    ns,
+                    checkpoint["id"],
+                    config["configurable"].get("checkpoint_id"),
+                    checkpoint_raw,
+                    metadata_raw,
+                    checkpoint_type,
+                    metadata_type,
+                ),
+            )
+            self._touch(thread_id)
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+
+        with self._lock, self._db:
+            for idx, (channel, value) in enumerate(writes):
+                idx = WRITES_IDX_MAP.get(channel, idx)
+                # Special writes (errors, interrupts) replace; ordinary ones are written once.
+                verb = "INSERT OR REPLACE" if idx < 0 else "INSERT OR IGNORE"
+                self._db.execute(
+                    f"{verb} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (thread_id, ns, checkpoint_id, task_id, idx, channel, self._put_blob(value), task_path),
+                )
+            self._touch(thread_id)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock, self._db:
+            self._delete(thread_id)
+            self._collect_blobs()
+
+    def _delete(self, thread_id: str) -> None:
+        for table in ("checkpoints", "channel_values", "writes", "threads"):
+            self._db.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+
+    def prune(self, max_age: float = MAX_AGE_SECONDS, max_bytes: Optional[int] = MAX_BYTES) -> Dict[str, int]:
+        """
+        Delete threads not written for max_age seconds, then the oldest
+        threads while stored blobs exceed max_bytes, then unreferenced
+        blobs. Returns the number of threads and blobs deleted.
+        """
+        with self._lock, self._db:
+            expired = [
+                row[0] for row in self._db.execute(
+                    "SELECT thread_id FROM threads WHERE updated_at < ?", (time.time() - max_age,)
+                )
+            ]
+            for thread_id in expired:
+                self._delete(thread_id)
+            blobs = self._collect_blobs()
+
+            if max_bytes is not None:
+                oldest = [row[0] for row in self._db.execute("SELECT thread_id FROM threads ORDER BY updated_at")]
+                for thread_id in oldest:
+                    if self._db.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0] <= max_bytes:
+                        break
+                    self._delete(thread_id)
+                    expired.append(thread_id)
+                    blobs += self._collect_blobs()
+        return {"threads": len(expired), "blobs": blobs}
+
+    # The graph runs nodes in threads anyway; async callers share the sync path.
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return self.get_tuple(config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        for item in self.list(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions) -> RunnableConfig:
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path="") -> None:
+        self.put_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        self.delete_thread(thread_id)
+
+    def disk_usage(self) -> Dict[str, int]:
+        with self._lock:
+            blobs, blob_bytes = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+            checkpoints = self._db.execute("SELECT COUNT(*) FROM checkpoints").fetchone()[0]
+        return {"blobs": blobs, "blob_bytes": blob_bytes, "checkpoints": checkpoints}
+
+
+_default_checkpointer = None
+_default_lock = threading.Lock()
+
+
+def get_checkpointer() -> DiskCheckpointer:
+    """
+    Process-wide checkpointer on CACHE_DIR/checkpoints.sqlite, pruned when
+    first opened.
+    """
+    global _default_checkpointer
+    with _default_lock:
+        if _default_checkpointer is None:
+            _default_checkpointer = DiskCheckpointer()
+            _default_checkpointer.prune()
+        return _default_checkpointer
+
+
+__all__ = ["DiskCheckpointer", "get_checkpointer"]
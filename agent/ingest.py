@@ -0,0 +1,297 @@
+"""
+Continuous ingestion mode: keep one topic's graph warm instead of
+rebuilding it on every run.
+
+Each poll fetches from the providers, enriches only articles whose
+canonical URL has never been seen (kept, folded into another article by
+dedup, or already evicted) and that are still inside the rolling window,
+evicts articles older than the window and patches the igraph in place:
+
+- new articles get their top-n out-edges computed against the current set;
+- existing articles are re-scored only if they lost a neighbour to
+  eviction or a new article now beats their weakest kept neighbour;
+- Leiden is re-run warm-started from the previous membership
+  (new articles start as singletons), so settled clusters stay put.
+
+Clusters whose membership is unchanged keep their previous summary; only
+the changed ones go back through graph_analysis.analyze_clusters.
+
+Topic IDF weights are recomputed each poll but rows that are not re-scored
+keep the edge weights they were built with; a full rebuild() resets that
+drift.
+"""
+
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from igraph import Graph
+
+from agent import workflow
+from graph import dedup, graph_analysis, kgraph
+
+DEFAULT_WINDOW_SECONDS = 24 * 3600
+DEFAULT_POLL_SECONDS = 15 * 60
+
+
+def _timestamp(article: Dict[str, Any], default: Optional[float] = None) -> float:
+    """
+    Publication time as epoch seconds, falling back to ingestion time (or
+    `default` for articles not ingested yet).
+    """
+    raw = article.get("published_at")
+    if isinstance(raw, str) and raw:
+        try:
+            parsed = datetime.fromisoformat(raw.replace("Z", "+00:00"))
+            if parsed.tzinfo is None:
+                parsed = parsed.replace(tzinfo=timezone.utc)
+            return parsed.timestamp()
+        except ValueError:
+            pass
+    return article["ingested_at"] if default is None else article.get("ingested_at", default)
+
+
+class IncrementalIngestor:
+    def __init__(
+        self,
+        topic: str,
+        window_seconds: float = DEFAULT_WINDOW_SECONDS,
+        poll_seconds: float = DEFAULT_POLL_SECONDS,
+        top_n: int = 3,
+    ):
+        self.topic = topic
+        self.window_seconds = window_seconds
+        self.poll_seconds = poll_seconds
+        self.top_n = top_n
+
+        self.articles: List[Dict[str, Any]] = []
+        self.graph = Graph()
+        self.graph.es["weight"] = []
+        self.graph.es["owner"] = []
+        # Score of each vertex's weakest kept out-edge (-inf if it has < top_n).
+        self.kth_score = np.zeros(0, dtype=np.float32)
+        self.membership: List[int] = []
+        # Canonical URLs never to enrich again: kept, folded and evicted.
+        self.seen_urls: set = set()
+        self.clusters: List[Dict[str, Any]] = []
+        self._cluster_cache: Dict[frozenset, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    # --- public API ------------------------------------------------------- #
+
+    def poll_once(self) -> workflow.AgentState:
+        """
+        Fetch, enrich new articles, evict stale ones, patch the graph and
+        re-cluster. Returns an AgentState snapshot usable by rank_clusters /
+        draft_response.
+        """
+        fetched = workflow.fetch_articles({"topic": self.topic})
+        now = time.time()
+        fresh = []
+        with self._lock:
+            seen = set(self.seen_urls)
+        for a in fetched.get("raw_articles", []):
+            url = dedup.canonicalize_url(a.get("url"))
+            if url in seen:
+                continue
+            # Already-expired articles would only be evicted again
+            if now - _timestamp(a, now) <= self.window_seconds:
+                fresh.append(a)
+            seen.add(url)
+
+        new_articles: List[Dict[str, Any]] = []
+        if fresh:
+            enriched = workflow.enrich_articles({"raw_articles": fresh})
+            new_articles = [a for a in enriched["enriched_articles"] if a["canonical_url"] not in self.seen_urls]
+
+        with self._lock:
+            # Every fetched URL counts as seen, including the ones enrichment
+            # dropped or dedup folded into another article's sources
+            self.seen_urls.update(seen)
+            now = time.time()
+            for art in new_articles:
+                art["ingested_at"] = now
+                self.seen_urls.update(dedup.canonicalize_url(r.get("url")) for r in art.get("sources") or [])
+            evicted = [
+                i for i, a in enumerate(self.articles)
+                if now - _timestamp(a) > self.window_seconds
+            ]
+            self._update_graph(new_articles, evicted)
+            self._recluster()
+            return self.snapshot(fetch_stats=fetched.get("fetch_stats", {}))
+
+    def rebuild(self) -> workflow.AgentState:
+        """
+        Recompute every edge and cluster from scratch over the current window.
+        """
+        with self._lock:
+            articles = self.articles
+            self.articles = []
+            self.graph = Graph()
+            self.graph.es["weight"] = []
+            self.graph.es["owner"] = []
+            self.kth_score = np.zeros(0, dtype=np.float32)
+            self.membership = []
+            self._update_graph(articles, [])
+            self._recluster()
+            return self.snapshot()
+
+    def snapshot(self, **extra: Any) -> workflow.AgentState:
+        state: workflow.AgentState = {
+            "topic": self.topic,
+            "enriched_articles": list(self.articles),
+            "igraph": self.graph.copy(),
+            "clusters": list(self.clusters),
+        }
+        state.update(extra)  # type: ignore[typeddict-item]
+        return state
+
+    def run_forever(
+        self,
+        stop_event: Optional[threading.Event] = None,
+        on_update: Optional[Callable[[workflow.AgentState], None]] = None,
+    ) -> None:
+        """
+        Poll every poll_seconds until stop_event is set.
+        """
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            started = time.monotonic()
+            try:
+                state = self.poll_once()
+                if on_update is not None:
+                    on_update(state)
+            except Exception as exc:  # noqa: BLE001 - keep the loop alive
+                print(f"[ingest:{self.topic}] poll failed: {exc}")
+            stop_event.wait(max(0.0, self.poll_seconds - (time.monotonic() - started)))
+
+    # --- graph maintenance ------------------------------------------------ #
+
+    def _update_graph(self, new_articles: List[Dict[str, Any]], evicted: List[int]) -> None:
+        G = self.graph
+
+        lost: set = set()
+        if evicted:
+            gone = set(evicted)
+            for e in G.es:
+                if e["owner"] not in gone and (e.source in gone or e.target in gone):
+                    lost.add(e["owner"])
+            keep = np.array([i not in gone for i in range(G.vcount())])
+            remap = np.cumsum(keep) - 1
+            G.delete_vertices(sorted(gone))
+            G.es["owner"] = [int(remap[o]) for o in G.es["owner"]]
+            lost = {int(remap[o]) for o in lost}
+            self.articles = [a for i, a in enumerate(self.articles) if keep[i]]
+            self.kth_score = self.kth_score[keep]
+            self.membership = [m for i, m in enumerate(self.membership) if keep[i]]
+
+        n_old = len(self.articles)
+        self.articles.extend(new_articles)
+        G.add_vertices(len(new_articles))
+        self.kth_score = np.concatenate(
+            [self.kth_score, np.full(len(new_articles), -np.inf, dtype=np.float32)]
+        )
+        n = len(self.articles)
+        if n == 0:
+            return
+
+        Xn = kgraph.normalize_rows(kgraph.embedding_matrix(self.articles))
+        index = kgraph.build_topic_index(self.articles)
+
+        rows = sorted(lost | set(range(n_old, n)))
+        blocks = {}
+        for start in range(0, len(rows), kgraph.DEFAULT_BLOCK_SIZE):
+            part = rows[start:start + kgraph.DEFAULT_BLOCK_SIZE]
+            S = kgraph.similarity_rows(Xn, index, part)
+            blocks.update(zip(part, S))
+
+        # Existing vertices a new article now out-scores.
+        if new_articles and n_old:
+            best_new = np.max([blocks[i][:n_old] for i in range(n_old, n)], axis=0)
+            beaten = set(np.nonzero(best_new > self.kth_score[:n_old])[0].tolist()) - set(rows)
+            extra = sorted(beaten)
+            for start in range(0, len(extra), kgraph.DEFAULT_BLOCK_SIZE):
+                part = extra[start:start + kgraph.DEFAULT_BLOCK_SIZE]
+                blocks.update(zip(part, kgraph.similarity_rows(Xn, index, part)))
+
+        self._rewire(blocks)
+
+    def _rewire(self, blocks: Dict[int, np.ndarray]) -> None:
+        """
+        Replace the out-edges of each vertex in `blocks` with its top-n.
+        """
+        G = self.graph
+        owners = set(blocks)
+        G.delete_edges([e.index for e in G.es if e["owner"] in owners])
+
+        n = G.vcount()
+        k = min(self.top_n, n - 1)
+        new_edges, weights, edge_owners = [], [], []
+        for i, row in blocks.items():
+            if k <= 0:
+                self.kth_score[i] = -np.inf
+                continue
+            row = np.array(row, dtype=np.float32)
+            row[i] = -np.inf
+            top = np.argpartition(-row, k - 1)[:k]
+            for j in top.tolist():
+                # Leiden rejects negative weights; dissimilar peers get no edge
+                if row[j] <= 0:
+                    continue
+                new_edges.append((min(i, j), max(i, j)))
+                weights.append(float(row[j]))
+                edge_owners.append(i)
+            self.kth_score[i] = row[top].min() if k == self.top_n else -np.inf
+
+        if new_edges:
+            G.add_edges(new_edges, attributes={"weight": weights, "owner": edge_owners})
+
+    # --- clustering ------------------------------------------------------- #
+
+    def _recluster(self) -> None:
+        n = len(self.articles)
+        if n == 0:
+            self.membership, self.clusters = [], []
+            return
+
+        initial = None
+        if self.membership:
+            # Renumber kept communities densely, then give new vertices
+            # singleton communities after them.
+            ids = {m: k for k, m in enumerate(sorted(set(self.membership)))}
+            initial = [ids[m] for m in self.membership]
+            initial += list(range(len(ids), len(ids) + n - len(initial)))
+
+        partition = graph_analysis.run_community(self.graph, initial_membership=initial)
+        self.membership = list(partition.membership)
+
+        clusters: List[Dict[str, Any]] = []
+        changed: List[List[int]] = []
+        changed_cids: List[int] = []
+        cache: Dict[frozenset, Dict[str, Any]] = {}
+        for cid, node_ids in enumerate(partition):
+            key = frozenset(self.articles[i]["canonical_url"] for i in node_ids)
+            previous = self._cluster_cache.get(key)
+            if previous is not None:
+                cluster = dict(previous, cid=cid, articles=[self.articles[i] for i in node_ids])
+                clusters.append(cluster)
+                cache[key] = cluster
+            else:
+                changed.append(list(node_ids))
+                changed_cids.append(cid)
+
+        if changed:
+            analysis = graph_analysis.analyze_clusters(self.articles, changed)
+            for cluster, cid in zip(workflow.clusters_from_analysis(self.articles, analysis), changed_cids):
+                cluster["cid"] = cid
+                clusters.append(cluster)
+                cache[frozenset(a["canonical_url"] for a in cluster["articles"])] = cluster
+
+        clusters.sort(key=lambda c: c["cid"])
+        self.clusters = clusters
+        self._cluster_cache = cache
+
+
+__all__ = ["IncrementalIngestor"]
@@ -0,0 +1,249 @@
+"""
+Query expansion and budgeted multi-provider retrieval.
+
+expand_query() asks the LLM once for search queries that together cover
+the topic (key entities, sub-events, alternative phrasings); the topic
+itself always comes first.
+
+fan_out() sends every sub-query to every provider at once and schedules the
+calls against one shared budget:
+
+- articles: each (sub-query, provider) call asks for its share of the
+  article budget, with the topic itself weighted ROOT_WEIGHT and OVERFETCH
+  headroom for duplicates, but never fewer than MIN_ITEMS_PER_CALL;
+- latency: a call is abandoned at its provider's timeout or when the
+  latency budget runs out, whichever comes first;
+- results are deduplicated by canonical URL as each call returns, and
+  retrieval stops early once the budget is filled with distinct relevant
+  articles (sharing a term with the topic or their sub-query). Articles
+  that share none only fill whatever budget is left at the end.
+"""
+
+import json
+import math
+import os
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from graph.dedup import StreamingDedup
+from llm import tracing
+from llm.executor import get_executor
+
+# Sub-queries per topic, the topic included; 1 disables expansion.
+MAX_SUBQUERIES = int(os.getenv("QUERY_SUBQUERIES", "4"))
+EXPANSION_MODEL = "gpt-4o"
+
+ARTICLE_BUDGET = 60
+LATENCY_BUDGET = 25.0
+ROOT_WEIGHT = 2.0
+OVERFETCH = 1.5
+MIN_ITEMS_PER_CALL = 5
+MAX_PARALLEL_CALLS = 16
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+STOPWORDS = {
+    "the", "and", "for", "with", "from", "that", "this", "are", "was", "were", "has", "have",
+    "its", "into", "over", "after", "about", "news", "latest", "new", "how", "what", "why",
+}
+
+
+def _expansion_prompt(topic: str, n: int) -> str:
+    return f"""
+Write up to {n} news search queries that together cover the topic below:
+its key entities, sub-events and common alternative phrasings. Keep each
+query short (2-6 words), as a news search box expects.
+
+Topic: "{topic}"
+
+Return ONLY a JSON list of strings.
+""".strip()
+
+
+def expand_query(topic: str, max_subqueries: Optional[int] = None) -> List[str]:
+    """
+    The topic plus up to max_subqueries - 1 LLM-generated sub-queries, from
+    one chat call. Falls back to [topic] if the call or its JSON fails.
+    """
+    max_subqueries = MAX_SUBQUERIES if max_subqueries is None else max_subqueries
+    if not topic.strip() or max_subqueries <= 1:
+        return [topic]
+    try:
+        content = get_executor().complete(_expansion_prompt(topic, max_subqueries - 1), model=EXPANSION_MODEL)
+        generated = json.loads(content.strip())
+    except Exception as exc:  # noqa: BLE001 - expansion is best effort
+        print(f"[expand_query] using the topic only: {exc}")
+        return [topic]
+
+    queries, seen = [topic], {topic.strip().lower()}
+    for query in generated if isinstance(generated, list) else []:
+        if isinstance(query, str) and query.strip() and query.strip().lower() not in seen:
+            seen.add(query.strip().lower())
+            queries.append(query.strip())
+    return queries[:max_subqueries]
+
+
+def _terms(text: str) -> set:
+    return {t for t in _TERM_RE.findall((text or "").lower()) if len(t) > 2 and t not in STOPWORDS}
+
+
+def _relevant(article: Dict[str, Any], terms: set) -> bool:
+    text = f"{article.get('title') or ''} {(article.get('body') or '')[:1000]}"
+    article_terms = _terms(text)
+    # Nothing to judge by: trust the provider's match
+    return not article_terms or not terms or bool(article_terms & terms)
+
+
+def plan_calls(
+    subqueries: Sequence[str], fetchers: Sequence[Tuple[str, Callable]], article_budget: int
+) -> List[Tuple[str, str, Callable, int]]:
+    """
+    (sub-query, provider, fetch fn, max_items) for every pair, splitting the
+    article budget by sub-query weight and then evenly across providers.
+    """
+    weights = [ROOT_WEIGHT] + [1.0] * (len(subqueries) - 1)
+    total = sum(weights)
+    plan = []
+    for query, weight in zip(subqueries, weights):
+        share = article_budget * OVERFETCH * weight / total / max(1, len(fetchers))
+        max_items = max(MIN_ITEMS_PER_CALL, math.ceil(share))
+        plan.extend((query, name, fn, max_items) for name, fn in fetchers)
+    return plan
+
+
+def _call(fn: Callable, query: str, max_items: int):
+    started = time.monotonic()
+    items = fn(query, max_items=max_items)
+    return list(items or []), time.monotonic() - started
+
+
+def _provider_stats(calls: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    fetch_stats shape (provider -> status, latency_s, items) over each
+    provider's calls: ok if any call succeeded.
+    """
+    stats: Dict[str, Dict[str, Any]] = {}
+    for call in calls:
+        entry = stats.setdefault(call["provider"], {"status": call["status"], "latency_s": 0.0, "items": 0, "calls": 0})
+        if call["status"] == "ok":
+            entry["status"] = "ok"
+        entry["latency_s"] = max(entry["latency_s"], call["latency_s"])
+        entry["items"] += call["items"]
+        entry["calls"] += 1
+        if call.get("error") and entry["status"] != "ok":
+            entry["error"] = call["error"]
+    return stats
+
+
+def fan_out(
+    topic: str,
+    subqueries: Sequence[str],
+    fetchers: Sequence[Tuple[str, Callable]],
+    timeouts: Optional[Dict[str, float]] = None,
+    article_budget: Optional[int] = None,
+    latency_budget: Optional[float] = None,
+    on_article: Optional[Callable[[Dict[str, Any]], None]] = None,
+):
+    """
+    Fetch every sub-query from every provider under the shared budgets.
+    Returns (articles, fetch_stats, retrieval_stats); each article records
+    the sub-query that found it under "subquery". on_article, if given, is
+    called with each article as it is accepted (relevant ones as their call
+    returns, the fallback fill at the end), in the calling thread.
+    """
+    article_budget = article_budget or ARTICLE_BUDGET
+    latency_budget = latency_budget or LATENCY_BUDGET
+    timeouts = timeouts or {}
+    plan = plan_calls(subqueries, fetchers, article_budget)
+    topic_terms = _terms(topic)
+
+    started = time.monotonic()
+    stage_deadline = started + latency_budget
+    pool = ThreadPoolExecutor(max_workers=max(1, min(len(plan), MAX_PARALLEL_CALLS)), thread_name_prefix="fanout")
+    futures = {pool.submit(_call, fn, query, n): (query, name, n) for query, name, fn, n in plan}
+    deadlines = {
+        fut: min(started + timeouts.get(name, latency_budget), stage_deadline)
+        for fut, (_, name, _) in futures.items()
+    }
+
+    dedup = StreamingDedup()
+    collected: List[Dict[str, Any]] = []
+    calls: List[Dict[str, Any]] = []
+    fallback: List[Dict[str, Any]] = []
+    counts = {"duplicates": 0, "irrelevant": 0, "over_budget": 0}
+
+    def finish_call(query, name, n, status, latency, items, error=None):
+        call = {"query": query, "provider": name, "max_items": n, "status": status, "latency_s": latency, "items": len(items)}
+        if error:
+            call["error"] = error
+        calls.append(call)
+        tracing.record(
+            "provider", name, latency, error=error or (status if status != "ok" else None),
+            query=query, status=status, items=len(items), max_items=n,
+            response_bytes=len(json.dumps(items, default=str)) if items and tracing.current() else 0,
+        )
+
+    pending = set(futures)
+    while pending and len(collected) < article_budget:
+        timeout = max(0.0, min(deadlines[f] for f in pending) - time.monotonic())
+        done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+        for fut in done:
+            query, name, n = futures[fut]
+            try:
+                items, latency = fut.result()
+            except Exception as exc:  # noqa: BLE001 - surface provider issues but keep going
+                print(f"[fetch:{name}] {query!r} skipped due to error: {exc}")
+                finish_call(query, name, n, "error", time.monotonic() - started, [], str(exc))
+                continue
+            finish_call(query, name, n, "ok", latency, items)
+
+            terms = topic_terms | _terms(query)
+            for item in items:
+                if dedup.seen_url(item):
+                    counts["duplicates"] += 1
+                    continue
+                item["subquery"] = query
+                if not _relevant(item, terms):
+                    counts["irrelevant"] += 1
+                    fallback.append(item)
+                elif len(collected) >= article_budget:
+                    counts["over_budget"] += 1
+                else:
+                    collected.append(item)
+                    if on_article is not None:
+                        on_article(item)
+
+        now = time.monotonic()
+        expired = {f for f in pending if now >= deadlines[f]}
+        for fut in expired:
+            query, name, n = futures[fut]
+            print(f"[fetch:{name}] {query!r} skipped after {now - started:.1f}s deadline")
+            finish_call(query, name, n, "timeout", now - started, [])
+        pending -= expired
+
+    # Budget filled: calls still out are not waited for
+    for fut in pending:
+        query, name, n = futures[fut]
+        finish_call(query, name, n, "cancelled", time.monotonic() - started, [])
+    pool.shutdown(wait=False, cancel_futures=True)
+    for item in fallback[: max(0, article_budget - len(collected))]:
+        collected.append(item)
+        if on_article is not None:
+            on_article(item)
+
+    retrieval_stats = {
+        "subqueries": list(subqueries),
+        "article_budget": article_budget,
+        "latency_budget_s": latency_budget,
+        "articles": len(collected),
+        "stopped_early": bool(pending),
+        "elapsed_s": time.monotonic() - started,
+        "calls": calls,
+        **counts,
+    }
+    return collected, _provider_stats(calls), retrieval_stats
+
+
+__all__ = ["expand_query", "fan_out", "plan_calls"]
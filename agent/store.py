@@ -0,0 +1,361 @@
+"""
+Index once, query many: persist the cluster tree built for a topic and
+answer questions against it without re-running fetch -> enrich -> graph ->
+cluster. Each question still gets its own cut of the tree
+(cluster_tree.clusters_for).
+
+Store layout (one directory per topic):
+    meta.json                 topic, built_at, counts, embedding model
+    tree.json                 cluster tree levels, membership and nodes; nodes
+                              summarised so far carry their summary and the
+                              row of its vector in summary_embeddings.npy
+    articles.jsonl            article metadata and text, one per line
+    article_embeddings.npy    (n_articles, d) float32, or float16/int8 when
+                              quantized, memory-mapped on load
+    article_scales.npy        per-row int8 scales (int8 stores only)
+    chunk_embeddings.npy      (n_chunks, d) evidence-chunk vectors, same dtype;
+                              each article row records its chunk_rows span
+    summary_embeddings.npy    (n_summarised, d) float32, memory-mapped on load
+
+ClusterStore loads lazily: opening reads meta.json only, the tree and
+articles are read on first use and embeddings stay memory-mapped. Summaries
+the tree gains while answering questions are written back
+(save_summaries), so each node is summarised at most once per build. Ranking
+compares quantized rows directly (cosine ignores the per-row scale).
+QueryService answers from the current store and, once it is older than
+max_age, rebuilds it on a background thread while still serving the old one.
+"""
+
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+from langgraph.graph import END, StateGraph
+
+from agent import workflow
+from graph import cluster_tree, embeddings, kgraph
+from graph.article_store import QUANTIZATION, QuantizedMatrix
+from graph.paths import CACHE_DIR
+
+STORE_VERSION = 2
+STORE_ROOT = os.path.join(CACHE_DIR, "stores")
+DEFAULT_MAX_AGE = 6 * 3600
+
+ARTICLE_FIELDS = (
+    "title", "url", "source", "published_at", "sources", "canonical_url", "topics", "keywords", "text", "chunks",
+)
+TREE_KEYS = ("resolutions", "levels", "membership")
+NODE_FIELDS = ("id", "level", "resolution", "article_ids", "parent", "children", "summary")
+
+
+def store_path(topic: str, root: str = STORE_ROOT) -> str:
+    slug = re.sub(r"[^a-z0-9]+", "-", topic.lower()).strip("-") or "topic"
+    return os.path.join(root, slug)
+
+
+def _matrix(vectors: List[Any]) -> np.ndarray:
+    return kgraph.embedding_matrix([{"embedding": v} for v in vectors])
+
+
+def _write_tree(tree: Dict[str, Any], path: str) -> int:
+    """
+    Write tree.json and summary_embeddings.npy into `path`; returns the
+    number of summarised nodes written.
+    """
+    rows, vectors = [], []
+    for node in tree.get("nodes", []):
+        row = {k: node[k] for k in NODE_FIELDS if k in node}
+        if "summary" in row:
+            row["summary_row"] = len(vectors)
+            vectors.append(node["summary_embedding"])
+        rows.append(row)
+    payload = {k: tree.get(k, []) for k in TREE_KEYS}
+    payload["nodes"] = rows
+
+    # Replaced file by file so a reader never sees a half-written tree;
+    # vectors go first since the tree points into them
+    tmp = os.path.join(path, f".summaries-{os.getpid()}-{threading.get_ident()}.npy")
+    np.save(tmp, _matrix(vectors))
+    os.replace(tmp, os.path.join(path, "summary_embeddings.npy"))
+    tmp = os.path.join(path, f".tree-{os.getpid()}-{threading.get_ident()}.json")
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(payload, fh)
+    os.replace(tmp, os.path.join(path, "tree.json"))
+    return len(vectors)
+
+
+def save_store(
+    state: workflow.AgentState, path: str, quantization: Optional[str] = QUANTIZATION
+) -> str:
+    """
+    Write the cluster tree and articles of a built AgentState to `path`,
+    atomically replacing any previous store there. quantization
+    ("float16"/"int8") shrinks the article embedding matrix on disk.
+    """
+    arts = state.get("enriched_articles", [])
+    tree = state.get("cluster_tree") or {}
+
+    tmp = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    chunk_vectors, start = [], 0
+    with open(os.path.join(tmp, "articles.jsonl"), "w", encoding="utf-8") as fh:
+        for art in arts:
+            row = {k: art.get(k) for k in ARTICLE_FIELDS}
+            vectors = art.get("chunk_embeddings")
+            count = len(vectors) if vectors is not None else 0
+            chunk_vectors.extend(vectors if count else [])
+            row["chunk_rows"] = [start, start + count]
+            start += count
+            fh.write(json.dumps(row, default=str) + "\n")
+
+    _write_tree(tree, tmp)
+
+    article_vectors = _matrix([a.get("embedding") for a in arts])
+    chunk_matrix = _matrix(chunk_vectors)
+    if quantization:
+        quantized = QuantizedMatrix.from_matrix(article_vectors, quantization)
+        article_vectors = quantized.data
+        if quantized.scales is not None:
+            np.save(os.path.join(tmp, "article_scales.npy"), quantized.scales)
+        # Only cosine is taken over chunks, so their scales are not kept
+        chunk_matrix = QuantizedMatrix.from_matrix(chunk_matrix, quantization).data
+    np.save(os.path.join(tmp, "article_embeddings.npy"), article_vectors)
+    np.save(os.path.join(tmp, "chunk_embeddings.npy"), chunk_matrix)
+
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as fh:
+        json.dump(
+            {
+                "version": STORE_VERSION,
+                "topic": state.get("topic"),
+                "built_at": time.time(),
+                "articles": len(arts),
+                "levels": len(tree.get("levels", [])),
+                "clusters": len(tree.get("nodes", [])),
+                "embedding_model": embeddings.EMBEDDING_MODEL,
+                "quantization": quantization,
+            },
+            fh,
+        )
+
+    old = f"{path}.old-{os.getpid()}"
+    if os.path.exists(path):
+        os.replace(path, old)
+    os.replace(tmp, path)
+    shutil.rmtree(old, ignore_errors=True)
+    return path
+
+
+class ClusterStore:
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as fh:
+            self.meta = json.load(fh)
+        if self.meta.get("version") != STORE_VERSION:
+            raise ValueError(f"unsupported store version {self.meta.get('version')} at {path}")
+        self._articles: Optional[List[Dict[str, Any]]] = None
+        self._tree: Optional[Dict[str, Any]] = None
+        self._saved_summaries = 0
+        self._lock = threading.Lock()
+
+    @property
+    def topic(self) -> str:
+        return self.meta.get("topic") or ""
+
+    def age(self) -> float:
+        return time.time() - self.meta["built_at"]
+
+    def is_stale(self, max_age: float = DEFAULT_MAX_AGE) -> bool:
+        return self.age() > max_age or self.meta.get("embedding_model") != embeddings.EMBEDDING_MODEL
+
+    def _load(self, name: str) -> np.ndarray:
+        return np.load(os.path.join(self.path, name), mmap_mode="r")
+
+    @property
+    def articles(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            if self._articles is None:
+                vectors = self._load("article_embeddings.npy")
+                chunk_path = os.path.join(self.path, "chunk_embeddings.npy")
+                chunk_vectors = self._load("chunk_embeddings.npy") if os.path.exists(chunk_path) else None
+                with open(os.path.join(self.path, "articles.jsonl"), encoding="utf-8") as fh:
+                    self._articles = [json.loads(line) for line in fh]
+                for art, vec in zip(self._articles, vectors):
+                    art["embedding"] = vec
+                    start, stop = art.pop("chunk_rows", None) or (0, 0)
+                    if chunk_vectors is not None and stop > start:
+                        art["chunk_embeddings"] = chunk_vectors[start:stop]
+            return self._articles
+
+    @property
+    def tree(self) -> Dict[str, Any]:
+        with self._lock:
+            if self._tree is None:
+                vectors = self._load("summary_embeddings.npy")
+                with open(os.path.join(self.path, "tree.json"), encoding="utf-8") as fh:
+                    tree = json.load(fh)
+                for node in tree["nodes"]:
+                    row = node.pop("summary_row", None)
+                    if row is not None:
+                        node["summary_embedding"] = vectors[row]
+                self._saved_summaries = sum(1 for node in tree["nodes"] if "summary" in node)
+                self._tree = tree
+            return self._tree
+
+    def save_summaries(self) -> None:
+        """
+        Write back summaries the tree gained since it was loaded or last
+        saved.
+        """
+        tree = self.tree
+        with self._lock:
+            if sum(1 for node in tree["nodes"] if "summary" in node) > self._saved_summaries:
+                self._saved_summaries = _write_tree(tree, self.path)
+
+
+def build_index(topic: str, path: Optional[str] = None) -> ClusterStore:
+    """
+    Run the build half of the workflow (expand -> fetch -> enrich -> graph ->
+    cluster) and persist the result.
+    """
+    state: workflow.AgentState = {"topic": topic}
+    for node in (
+        workflow.expand_query,
+        workflow.fetch_articles,
+        workflow.enrich_articles,
+        workflow.build_similarity_graph,
+        workflow.cluster_and_summarize,
+    ):
+        state = node(state)
+    return ClusterStore(save_store(state, path or store_path(topic)))
+
+
+# --- query-only LangGraph entry point ----------------------------------- #
+
+
+def build_query_graph(store: "ClusterStore", profile: Optional[Iterable[str]] = None) -> Any:
+    """
+    LangGraph workflow that starts from the persisted cluster tree: cut it
+    for the question -> rank -> draft -> optional refine. Nothing upstream
+    of clustering runs. Nodes are traced (and profiled) as in
+    workflow.build_graph.
+    """
+
+    def load_store(state: workflow.AgentState) -> workflow.AgentState:
+        tree, arts = store.tree, store.articles
+        state["cluster_tree"] = tree
+        state["enriched_articles"] = arts
+        state["clusters"] = cluster_tree.clusters_for(tree, arts, state.get("topic") or "", state.get("granularity"))
+        return state
+
+    graph = StateGraph(workflow.AgentState)
+    workflow.add_traced_nodes(
+        graph,
+        {
+            "load_store": load_store,
+            "rank_clusters": workflow.rank_clusters,
+            "draft_response": workflow.draft_response,
+            "refine_answer": workflow.refine_response,
+        },
+        profile,
+    )
+
+    graph.set_entry_point("load_store")
+    graph.add_edge("load_store", "rank_clusters")
+    graph.add_edge("rank_clusters", "draft_response")
+    graph.add_conditional_edges("draft_response", workflow._should_refine, ["refine_answer", END])
+    graph.add_edge("refine_answer", END)
+    return graph.compile()
+
+
+class QueryService:
+    """
+    Answers questions about one topic from its persisted store, building it
+    on first use and refreshing it in the background once stale.
+    """
+
+    def __init__(self, topic: str, path: Optional[str] = None, max_age: float = DEFAULT_MAX_AGE):
+        self.topic = topic
+        self.path = path or store_path(topic)
+        self.max_age = max_age
+        self._store: Optional[ClusterStore] = None
+        self._graph: Any = None
+        self._lock = threading.Lock()
+        self._rebuild: Optional[threading.Thread] = None
+
+    def _swap(self, store: ClusterStore) -> None:
+        graph = build_query_graph(store)
+        with self._lock:
+            self._store, self._graph = store, graph
+
+    def _current(self) -> ClusterStore:
+        with self._lock:
+            store = self._store
+        if store is None:
+            try:
+                store = ClusterStore(self.path)
+            except (OSError, ValueError):
+                store = build_index(self.topic, self.path)
+            self._swap(store)
+        return store
+
+    def refresh_in_background(self) -> None:
+        with self._lock:
+            if self._rebuild is not None and self._rebuild.is_alive():
+                return
+
+            def run() -> None:
+                try:
+                    self._swap(build_index(self.topic, self.path))
+                except Exception as exc:  # noqa: BLE001 - keep serving the old store
+                    print(f"[store:{self.topic}] background rebuild failed: {exc}")
+
+            self._rebuild = threading.Thread(target=run, name="store-rebuild", daemon=True)
+            self._rebuild.start()
+
+    def ask(
+        self, question: str, refine_query: Optional[str] = None, granularity: Optional[float] = None
+    ) -> workflow.AgentState:
+        store = self._current()
+        if store.is_stale(self.max_age):
+            self.refresh_in_background()
+        with self._lock:
+            store, graph = self._store, self._graph
+        result = graph.invoke({"topic": question, "refine_query": refine_query, "granularity": granularity})
+        store.save_summaries()
+        return result  # type: ignore[return-value]
+
+
+_services: Dict[str, QueryService] = {}
+_services_lock = threading.Lock()
+
+
+def ask(
+    topic: str, question: str, refine_query: Optional[str] = None, granularity: Optional[float] = None
+) -> workflow.AgentState:
+    """
+    Answer `question` from the persisted store for `topic` (process-wide
+    QueryService per topic), at `granularity` (see cluster_tree) if given.
+    """
+    with _services_lock:
+        service = _services.get(topic)
+        if service is None:
+            service = _services[topic] = QueryService(topic)
+    return service.ask(question, refine_query=refine_query, granularity=granularity)
+
+
+__all__ = [
+    "ClusterStore",
+    "QueryService",
+    "ask",
+    "build_index",
+    "build_query_graph",
+    "save_store",
+    "store_path",
+]
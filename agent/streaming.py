@@ -0,0 +1,319 @@
+"""
+Streaming execution mode: fetched articles flow through bounded asyncio
+queues instead of waiting at a barrier after every node.
+
+    providers -> url dedup -> scrape -> near-dup -> embed -> topics -> sink
+
+Each provider's results are pushed as soon as that provider returns, so
+scraping starts with the fastest provider, embedding with the first scraped
+pages and topic extraction with the first embedded batch. Queues hold at
+most QUEUE_SIZE items, so a slow stage pushes back on the ones feeding it
+instead of letting work pile up in memory. Blocking work (provider calls,
+downloads, embedding requests) runs on a thread pool; topic requests are
+awaited on the shared LLM executor's futures.
+
+When the state carries sub-queries (workflow.expand_query), fetching goes
+through retrieval.fan_out instead, under its shared article and latency
+budgets, and each accepted article is pushed as its call returns.
+
+Only the similarity graph and clustering need the full article set; the
+LangGraph built here expands the query, runs the streaming node and then the
+usual build_graph -> cluster -> rank -> draft nodes.
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from langgraph.graph import END, StateGraph
+
+from agent import retrieval, workflow
+from agent.checkpoint import get_checkpointer
+from graph import chunks, data_prep, embeddings, kgraph, scrape_cache
+from graph.article_store import ArticleStore
+from graph.dedup import StreamingDedup
+from graph.scraper import get_scraper
+from llm import tracing
+from news_api import providers
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE = 64
+SCRAPE_WORKERS = 16
+# Articles per embedding request, and how long a partial batch waits for more.
+EMBED_BATCH = 64
+EMBED_LINGER = 0.25
+EMBED_WORKERS = 2
+# Topic requests awaited at once (the executor still applies its rate limits).
+TOPIC_WORKERS = 32
+
+_DONE = object()
+
+
+class _StageStats:
+    def __init__(self, started: float):
+        self.started = started
+        self.stats: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, stage: str, count: int = 1) -> None:
+        now = time.monotonic() - self.started
+        entry = self.stats.setdefault(stage, {"items": 0, "first_s": now, "last_s": now})
+        entry["items"] += count
+        entry["last_s"] = now
+
+
+async def _workers(inbox: asyncio.Queue, outbox: asyncio.Queue, handle, count: int) -> None:
+    """
+    Run `count` consumers of inbox; handle(item) returns the items to pass
+    on. Closes outbox once inbox is drained.
+    """
+
+    async def work() -> None:
+        while True:
+            item = await inbox.get()
+            if item is _DONE:
+                await inbox.put(_DONE)  # let sibling workers see it too
+                return
+            for out in await handle(item):
+                await outbox.put(out)
+
+    await asyncio.gather(*(work() for _ in range(count)))
+    await outbox.put(_DONE)
+
+
+async def stream_articles(topic: str, subqueries: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Fetch, dedup, scrape, embed and tag articles for `topic` as a streaming
+    pipeline, fanning out over `subqueries` when given. Returns the
+    AgentState fields fetch_articles and enrich_articles would have set,
+    plus stream_stats.
+    """
+    loop = asyncio.get_running_loop()
+    started = time.monotonic()
+    stage_stats = _StageStats(started)
+    fetchers = workflow.provider_fetchers()
+    dedup = StreamingDedup()
+    service = embeddings.get_service()
+    fetch_stats: Dict[str, Dict[str, Any]] = {}
+    retrieval_stats: Dict[str, Any] = {}
+    raw: List[Dict[str, Any]] = []
+    done: List[Dict[str, Any]] = []
+
+    scrape_q: asyncio.Queue = asyncio.Queue(QUEUE_SIZE)
+    embed_q: asyncio.Queue = asyncio.Queue(QUEUE_SIZE)
+    topic_q: asyncio.Queue = asyncio.Queue(QUEUE_SIZE)
+    sink_q: asyncio.Queue = asyncio.Queue(QUEUE_SIZE)
+
+    pool = ThreadPoolExecutor(
+        max_workers=len(fetchers) + 1 + SCRAPE_WORKERS + EMBED_WORKERS, thread_name_prefix="stream"
+    )
+    scraper = get_scraper()
+    # Pool threads do not inherit the trace context of this run
+    scrape_one = tracing.wrap(scraper.scrape_one)
+    embed = tracing.wrap(service.embed)
+
+    async def fetch_one(name: str, fn) -> None:
+        timeout = min(workflow.PROVIDER_TIMEOUTS.get(name, workflow.FETCH_STAGE_BUDGET), workflow.FETCH_STAGE_BUDGET)
+        try:
+            items, latency = await asyncio.wait_for(
+                loop.run_in_executor(pool, workflow._timed_fetch, fn, topic), timeout
+            )
+        except asyncio.TimeoutError:
+            logger.warning("[fetch:%s] skipped after %.1fs deadline", name, timeout)
+            fetch_stats[name] = {"status": "timeout", "latency_s": time.monotonic() - started, "items": 0}
+            workflow.record_fetch(name, fetch_stats[name], None)
+            return
+        except Exception as exc:  # noqa: BLE001 - surface provider issues but keep going
+            logger.warning("[fetch:%s] skipped due to error: %s", name, exc)
+            fetch_stats[name] = {
+                "status": "error",
+                "latency_s": time.monotonic() - started,
+                "items": 0,
+                "error": str(exc),
+            }
+            workflow.record_fetch(name, fetch_stats[name], None)
+            return
+
+        items = list(items or [])
+        fetch_stats[name] = {"status": "ok", "latency_s": latency, "items": len(items)}
+        workflow.record_fetch(name, fetch_stats[name], items)
+        stage_stats.record("fetch", len(items))
+        for item in items:
+            await push(item)
+
+    async def push(item: Dict[str, Any]) -> None:
+        raw.append(item)
+        if not dedup.seen_url(item):
+            await scrape_q.put(item)
+
+    async def accept(item: Dict[str, Any]) -> None:
+        stage_stats.record("fetch")
+        await push(item)
+
+    def on_article(item: Dict[str, Any]) -> None:
+        # Called on the fan-out thread; waiting here is the backpressure
+        asyncio.run_coroutine_threadsafe(accept(item), loop).result()
+
+    async def fan_out() -> None:
+        _, stats, run_stats = await loop.run_in_executor(
+            pool,
+            tracing.wrap(retrieval.fan_out),
+            topic,
+            subqueries,
+            fetchers,
+            workflow.PROVIDER_TIMEOUTS,
+            None,
+            workflow.FETCH_STAGE_BUDGET,
+            on_article,
+        )
+        fetch_stats.update(stats)
+        retrieval_stats.update(run_stats)
+
+    async def fetch_all() -> None:
+        if subqueries:
+            await fan_out()
+        else:
+            await asyncio.gather(*(fetch_one(name, fn) for name, fn in fetchers))
+        await scrape_q.put(_DONE)
+
+    async def scrape(article: Dict[str, Any]) -> List[Dict[str, Any]]:
+        article["full_text"] = await loop.run_in_executor(pool, scrape_one, article.get("url"))
+        stage_stats.record("scrape")
+        if dedup.seen_text(article):
+            return []
+        return [article]
+
+    async def embed_batches() -> None:
+        async def work() -> None:
+            closed = False
+            while not closed:
+                batch = []
+                item = await embed_q.get()
+                if item is _DONE:
+                    await embed_q.put(_DONE)
+                    return
+                batch.append(item)
+                deadline = loop.time() + EMBED_LINGER
+                while len(batch) < EMBED_BATCH:
+                    try:
+                        item = await asyncio.wait_for(embed_q.get(), max(0.0, deadline - loop.time()))
+                    except asyncio.TimeoutError:
+                        break
+                    if item is _DONE:
+                        await embed_q.put(_DONE)
+                        closed = True
+                        break
+                    batch.append(item)
+
+                texts = [a.get("full_text") or "" for a in batch]
+                vectors = await loop.run_in_executor(pool, embed, texts)
+                for article, vector in zip(batch, vectors):
+                    article["embedding"] = vector
+                    await topic_q.put(article)
+                stage_stats.record("embed", len(batch))
+
+        await asyncio.gather(*(work() for _ in range(EMBED_WORKERS)))
+        await topic_q.put(_DONE)
+
+    async def tag(article: Dict[str, Any]) -> List[Dict[str, Any]]:
+        response = await asyncio.wrap_future(data_prep.submit_topics(article))
+        article["topics"] = data_prep.parse_topics(response)
+        stage_stats.record("topics")
+        return [article]
+
+    async def sink() -> None:
+        while (item := await sink_q.get()) is not _DONE:
+            done.append(item)
+
+    try:
+        await asyncio.gather(
+            fetch_all(),
+            _workers(scrape_q, embed_q, scrape, SCRAPE_WORKERS),
+            embed_batches(),
+            _workers(topic_q, sink_q, tag, TOPIC_WORKERS),
+            sink(),
+        )
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    # Re-home the per-batch vectors in one shared matrix for the graph stage
+    if done:
+        ArticleStore(kgraph.embedding_matrix(done)).attach(done)
+
+    # Evidence chunks need the final article set (near-duplicates resolved)
+    enriched = await asyncio.to_thread(tracing.wrap(chunks.index_articles), workflow.finish_enrichment(done))
+    stage_stats.record("chunks", len(enriched))
+
+    stream_stats = stage_stats.stats
+    stream_stats["total_s"] = time.monotonic() - started
+    result = {
+        "raw_articles": raw,
+        "fetch_stats": fetch_stats,
+        "enriched_articles": enriched,
+        "scrape_cache_stats": scrape_cache.get_cache().stats(),
+        "stream_stats": stream_stats,
+    }
+    if subqueries:
+        result["retrieval_stats"] = retrieval_stats
+        result["provider_cache_stats"] = providers.stats()
+    return result
+
+
+def stream_node(state: workflow.AgentState) -> workflow.AgentState:
+    state.update(asyncio.run(stream_articles(state.get("topic") or "", state.get("subqueries"))))
+    return state
+
+
+async def astream_node(state: workflow.AgentState) -> workflow.AgentState:
+    state.update(await stream_articles(state.get("topic") or "", state.get("subqueries")))
+    return state
+
+
+def build_streaming_graph(checkpointer: Any = None, use_async: bool = False, profile: Any = None) -> Any:
+    """
+    The workflow with fetch + enrich replaced by the streaming node. Use
+    use_async=True when driving it with ainvoke from a running event loop.
+    """
+    graph = StateGraph(workflow.AgentState)
+    workflow.add_traced_nodes(
+        graph,
+        {
+            "expand_query": workflow.expand_query,
+            "stream_articles": astream_node if use_async else stream_node,
+            "build_graph": workflow.build_similarity_graph,
+            "cluster_and_summarize": workflow.cluster_and_summarize,
+            "rank_clusters": workflow.rank_clusters,
+            "draft_response": workflow.draft_response,
+            "refine_answer": workflow.refine_response,
+        },
+        profile,
+    )
+
+    graph.set_entry_point("expand_query")
+    graph.add_edge("expand_query", "stream_articles")
+    graph.add_edge("stream_articles", "build_graph")
+    graph.add_edge("build_graph", "cluster_and_summarize")
+    graph.add_edge("cluster_and_summarize", "rank_clusters")
+    graph.add_edge("rank_clusters", "draft_response")
+    graph.add_conditional_edges("draft_response", workflow._should_refine, ["refine_answer", END])
+    graph.add_edge("refine_answer", END)
+    return graph.compile(checkpointer=checkpointer or get_checkpointer())
+
+
+def run_streaming(
+    topic: str, refine_query: Optional[str] = None, thread_id: Optional[str] = None
+) -> workflow.AgentState:
+    """
+    run_once in streaming mode.
+    """
+    graph = build_streaming_graph()
+    config = {"configurable": {"thread_id": thread_id or uuid.uuid4().hex}}
+    result = graph.invoke({"topic": topic, "refine_query": refine_query}, config)
+    workflow.finish_thread(graph, config)
+    return result  # type: ignore[return-value]
+
+
+__all__ = ["build_streaming_graph", "run_streaming", "stream_articles"]
@@ -2,60 +2,183 @@
 LangGraph-powered agentic workflow for the news assistant.
 
 Pipeline:
-1) Fetch articles from multiple providers (news_api/api_calls).
+0) Expand the topic into sub-queries with one LLM call (agent/retrieval.py).
+1) Fetch articles for every sub-query from multiple providers
+   (news_api/api_calls) under a shared article and latency budget.
 2) Enrich articles with full text, embeddings, and topics.
-3) Build similarity graph and cluster articles.
-4) Rank clusters and draft an answer (summary/summarise_answer.py).
-5) Optional refinement loop using a follow-up query.
+3) Build similarity graph and cluster articles at every resolution into a
+   cluster tree (graph/cluster_tree.py).
+4) Pick the tree's clusters for the question, summarise only those, rank
+   them and draft an answer (summary/summarise_answer.py).
+5) Optional refinement loop using a follow-up query, which picks its own
+   clusters from the same tree.
+
+Every node is traced (llm/tracing.py): the returned state's "trace" holds
+the trace's per-node totals, while its node and call spans stay with the
+process's tracer; export them with tracing.export_trace(state["trace"], path). Pass build_graph(profile=...)
+or set NEWS_AGENT_PROFILE to run nodes under cProfile.
 
 Note: This module relies on API keys for the underlying providers and OpenAI.
 Ensure the relevant environment variables/config are set before execution.
 """
 
-from typing import Any, Dict, List, Optional, TypedDict
+import json
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, TypedDict
 
-from langgraph.checkpoint.memory import MemorySaver
+from langgraph.config import get_stream_writer
 from langgraph.graph import END, StateGraph
 
-from graph import data_prep, graph_analysis, kgraph
-from news_api import api_calls
-from ranking.ranking_articles import rerank_articles
+from agent import retrieval
+from agent.checkpoint import get_checkpointer
+from graph import ann, chunks, cluster_tree, data_prep, kgraph, scrape_cache
+from llm import tracing
+from news_api import providers
+from ranking.ranking_articles import rank_clusters_by_embedding
 from summary import summarise_answer
 
 
 class AgentState(TypedDict, total=False):
     topic: str
     refine_query: Optional[str]
+    subqueries: List[str]  # topic first, then LLM-generated expansions
     raw_articles: List[Dict[str, Any]]
+    fetch_stats: Dict[str, Dict[str, Any]]  # provider -> status, latency_s, items
+    provider_cache_stats: Dict[str, Any]  # response cache hit rate, breaker states
+    retrieval_stats: Dict[str, Any]  # sub-query fan-out: per-call outcomes, dedup, early stop
     enriched_articles: List[Dict[str, Any]]
-    sim_matrix: List[List[float]]
+    scrape_cache_stats: Dict[str, Any]  # hit_rate, bytes_saved, entries, ...
+    stream_stats: Dict[str, Any]  # streaming mode: per-stage items and timings
+    sim_matrix: Any  # (n, n) float32 ndarray, None when built chunked
     edges: List[Any]
+    graph_stats: Dict[str, Any]  # builder (dense/chunked/ann), edges, recall, seconds
     igraph: Any
+    cluster_tree: Dict[str, Any]  # nested Leiden levels, see graph/cluster_tree.py
+    granularity: Optional[float]  # cluster resolution per question; None picks adaptively
     clusters: List[Dict[str, Any]]
     ranked_clusters: List[Dict[str, Any]]
     answer: str
+    generation_stats: List[Dict[str, Any]]  # per drafted answer: ttft_s, total_s, events
+    trace: Dict[str, Any]  # trace summary (per-node call totals), see llm/tracing.py
+    batch_stats: Dict[str, Any]  # run_many: shared fetch/enrich counts, see agent/batch.py
 
 
 # --- LangGraph nodes ----------------------------------------------------- #
 
 
+# Per-provider deadlines (seconds) and the overall fetch-stage budget. When
+# the budget runs out the stage returns whatever providers have delivered.
+PROVIDER_TIMEOUTS = {
+    "event_registry": 20.0,
+    "news_data": 15.0,
+    "finflight": 15.0,
+    "the_news_api": 10.0,
+}
+FETCH_STAGE_BUDGET = 25.0
+
+
+def _timed_fetch(fn, topic: str):
+    started = time.monotonic()
+    items = fn(topic, max_items=10)
+    return items, time.monotonic() - started
+
+
+def record_fetch(name: str, stat: Dict[str, Any], items: List[Dict[str, Any]]) -> None:
+    """
+    Provider span for one fetch outcome (fetch_stats entry plus payload size).
+    """
+    if tracing.current() is None:
+        return
+    tracing.record(
+        "provider",
+        name,
+        stat["latency_s"],
+        error=stat.get("error") or (stat["status"] if stat["status"] != "ok" else None),
+        status=stat["status"],
+        items=stat["items"],
+        response_bytes=len(json.dumps(items, default=str)) if items else 0,
+    )
+
+
+def provider_fetchers():
+    # Each behind the shared response cache and its circuit breaker
+    return providers.fetchers()
+
+
+def expand_query(state: AgentState) -> AgentState:
+    state["subqueries"] = retrieval.expand_query(state.get("topic") or "")
+    return state
+
+
 def fetch_articles(state: AgentState) -> AgentState:
     topic = state.get("topic") or ""
-    fetchers = [
-        ("event_registry", api_calls.fetch_event_registry),
-        ("news_data", api_calls.fetch_news_data),
-        ("finflight", api_calls.fetch_finflight),
-        ("the_news_api", api_calls.fetch_the_news_api),
-    ]
+    fetchers = provider_fetchers()
+
+    subqueries = state.get("subqueries")
+    if subqueries:
+        articles, stats, retrieval_stats = retrieval.fan_out(
+            topic, subqueries, fetchers, timeouts=PROVIDER_TIMEOUTS, latency_budget=FETCH_STAGE_BUDGET
+        )
+        state["raw_articles"] = articles
+        state["fetch_stats"] = stats
+        state["retrieval_stats"] = retrieval_stats
+        state["provider_cache_stats"] = providers.stats()
+        return state
+
+    started = time.monotonic()
+    stage_deadline = started + FETCH_STAGE_BUDGET
+    pool = ThreadPoolExecutor(max_workers=len(fetchers), thread_name_prefix="fetch")
+    futures = {pool.submit(_timed_fetch, fn, topic): name for name, fn in fetchers}
+    deadlines = {
+        fut: min(started + PROVIDER_TIMEOUTS.get(name, FETCH_STAGE_BUDGET), stage_deadline)
+        for fut, name in futures.items()
+    }
+
+    results: Dict[str, List[Dict[str, Any]]] = {}
+    stats: Dict[str, Dict[str, Any]] = {}
+    pending = set(futures)
+    while pending:
+        timeout = max(0.0, min(deadlines[f] for f in pending) - time.monotonic())
+        done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+        for fut in done:
+            name = futures[fut]
+            try:
+                items, latency = fut.result()
+                results[name] = list(items or [])
+                stats[name] = {"status": "ok", "latency_s": latency, "items": len(results[name])}
+            except Exception as exc:  # noqa: BLE001 - surface provider issues but keep going
+                print(f"[fetch:{name}] skipped due to error: {exc}")
+                stats[name] = {
+                    "status": "error",
+                    "latency_s": time.monotonic() - started,
+                    "items": 0,
+                    "error": str(exc),
+                }
+            record_fetch(name, stats[name], results.get(name))
+
+        now = time.monotonic()
+        expired = {f for f in pending if now >= deadlines[f]}
+        for fut in expired:
+            name = futures[fut]
+            print(f"[fetch:{name}] skipped after {now - started:.1f}s deadline")
+            stats[name] = {"status": "timeout", "latency_s": now - started, "items": 0}
+            record_fetch(name, stats[name], None)
+        pending -= expired
+
+    # Stragglers keep their worker thread until their socket gives up, but
+    # nothing waits on them.
+    pool.shutdown(wait=False, cancel_futures=True)
 
     collected: List[Dict[str, Any]] = []
-    for name, fn in fetchers:
-        try:
-            collected.extend(fn(topic, max_items=10))
-        except Exception as exc:  # noqa: BLE001 - surface provider issues but keep going
-            print(f"[fetch:{name}] skipped due to error: {exc}")
+    for name, _ in fetchers:
+        collected.extend(results.get(name, []))
 
     state["raw_articles"] = collected
+    state["fetch_stats"] = stats
+    state["provider_cache_stats"] = providers.stats()
     return state
 
 
@@ -65,29 +188,75 @@ def enrich_articles(state: AgentState) -> AgentState:
         state["enriched_articles"] = []
         return state
 
-    enriched = data_prep.get_full_texts(articles)
-    enriched = data_prep.get_embeddings(enriched)
-    enriched = data_prep.get_topics(enriched)
+    with tracing.span("step", "scrape", items=len(articles)):
+        enriched = data_prep.get_full_texts(articles)
+    state["scrape_cache_stats"] = scrape_cache.get_cache().stats()
+    with tracing.span("step", "embed", items=len(enriched)):
+        enriched = data_prep.get_embeddings(enriched)
+    with tracing.span("step", "topics", items=len(enriched)):
+        enriched = data_prep.get_topics(enriched)
+
+    # Sentence-aware evidence chunks for answering, embedded in one batch
+    with tracing.span("step", "chunks", items=len(enriched)):
+        state["enriched_articles"] = chunks.index_articles(finish_enrichment(enriched))
+    return state
+
 
+def finish_enrichment(articles: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     # Align with graph_analysis expectations.
-    for art in enriched:
+    for art in articles:
         art["text"] = art.get("full_text") or art.get("body") or ""
         topics = art.get("topics") or []
         art["keywords"] = topics if isinstance(topics, list) else topics
+    return articles
 
-    state["enriched_articles"] = enriched
-    return state
+
+# Above DENSE_SIMILARITY_LIMIT articles the dense n x n matrix is skipped in
+# favour of row-block streaming so peak memory stays bounded; above
+# ANN_SIMILARITY_LIMIT neighbours come from an approximate IVF index instead.
+DENSE_SIMILARITY_LIMIT = 5000
+ANN_SIMILARITY_LIMIT = 20000
+# Rows sampled to report ANN recall against exact scores (0 disables).
+ANN_RECALL_SAMPLE = 200
+# "local" scores topic overlap from extracted topics; "llm" also re-scores a
+# cosine shortlist per article with gpt-4o.
+TOPIC_OVERLAP_MODE = "local"
 
 
 def build_similarity_graph(state: AgentState) -> AgentState:
     arts = state.get("enriched_articles", [])
-    sim_matrix = kgraph.compute_similarity(arts)
-    edges = kgraph.build_graph(sim_matrix, top_n=3)
-    igraph_obj = kgraph.create_graph(edges, num_articles=len(arts)) if arts else None
+    started = time.monotonic()
+    graph_stats: Dict[str, Any] = {"articles": len(arts)}
+
+    if len(arts) > ANN_SIMILARITY_LIMIT:
+        sim_matrix = None
+        with tracing.span("step", "ann_neighbors", items=len(arts)):
+            edges, neighbors = ann.build_graph_ann(arts, top_n=3)
+        graph_stats["builder"] = "ann"
+        if ANN_RECALL_SAMPLE:
+            graph_stats["recall"] = ann.evaluate_recall(
+                arts, neighbors, top_n=3, sample_size=ANN_RECALL_SAMPLE
+            )
+    elif len(arts) > DENSE_SIMILARITY_LIMIT:
+        sim_matrix = None
+        with tracing.span("step", "similarity_chunked", items=len(arts)):
+            edges = kgraph.build_graph_chunked(arts, top_n=3, topic_mode=TOPIC_OVERLAP_MODE)
+        graph_stats["builder"] = "chunked"
+    else:
+        with tracing.span("step", "similarity", items=len(arts)):
+            sim_matrix = kgraph.compute_similarity(arts, topic_mode=TOPIC_OVERLAP_MODE)
+        with tracing.span("step", "top_n_edges", items=len(arts)):
+            edges = kgraph.build_graph(sim_matrix, top_n=3)
+        graph_stats["builder"] = "dense"
+    with tracing.span("step", "create_graph", items=len(edges)):
+        igraph_obj = kgraph.create_graph(edges, num_articles=len(arts)) if arts else None
+    graph_stats["edges"] = len(edges)
+    graph_stats["seconds"] = time.monotonic() - started
 
     state["sim_matrix"] = sim_matrix
     state["edges"] = edges
     state["igraph"] = igraph_obj
+    state["graph_stats"] = graph_stats
     return state
 
 
@@ -95,12 +264,27 @@ def cluster_and_summarize(state: AgentState) -> AgentState:
     G = state.get("igraph")
     arts = state.get("enriched_articles", [])
     if not G or not arts:
+        state["cluster_tree"] = {}
         state["clusters"] = []
         return state
 
-    partition = graph_analysis.run_community(G)
-    clusters_dict = graph_analysis.analyze_clusters(arts, partition)
+    with tracing.span("step", "leiden", items=len(arts)) as attrs:
+        tree = cluster_tree.build_tree(G)
+        attrs["levels"] = len(tree["levels"])
+        attrs["clusters"] = len(tree["nodes"])
+    # Only the clusters picked for the topic are summarised here
+    state["cluster_tree"] = tree
+    state["clusters"] = cluster_tree.clusters_for(tree, arts, state.get("topic") or "", state.get("granularity"))
+    return state
+
 
+def clusters_from_analysis(
+    arts: List[Dict[str, Any]], clusters_dict: Dict[Any, Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """
+    Shape graph_analysis.analyze_clusters output into the cluster dicts the
+    ranking and answer nodes expect.
+    """
     clusters: List[Dict[str, Any]] = []
     for cid, data in clusters_dict.items():
         clusters.append(
@@ -112,9 +296,7 @@ def cluster_and_summarize(state: AgentState) -> AgentState:
                 "embedding": data.get("summary_embedding"),
             }
         )
-
-    state["clusters"] = clusters
-    return state
+    return clusters
 
 
 def rank_clusters(state: AgentState) -> AgentState:
@@ -125,23 +307,9 @@ def rank_clusters(state: AgentState) -> AgentState:
         state["ranked_clusters"] = []
         return state
 
-    chunks = [c.get("summary", "") for c in clusters]
     try:
-        ordered = rerank_articles(chunks, topic, top_k=len(chunks))
-        summary_to_cluster = {c.get("summary", ""): c for c in clusters}
-
-        ranked: List[Dict[str, Any]] = []
-        for summary in ordered:
-            cluster = summary_to_cluster.get(summary)
-            if cluster and cluster not in ranked:
-                ranked.append(cluster)
-
-        # Append any missing clusters to preserve completeness.
-        for c in clusters:
-            if c not in ranked:
-                ranked.append(c)
-
-        state["ranked_clusters"] = ranked
+        # Stored summary/article vectors; only the topic gets embedded
+        state["ranked_clusters"] = rank_clusters_by_embedding(clusters, topic)
     except Exception as exc:  # noqa: BLE001 - fallback to original order
         print(f"[rank_clusters] fallback due to error: {exc}")
         state["ranked_clusters"] = clusters
@@ -157,24 +325,58 @@ def draft_response(state: AgentState) -> AgentState:
         state["answer"] = "No relevant articles found."
         return state
 
-    top_clusters = summarise_answer.retrieve_top_k_clusters(
-        topic, clusters, k=min(8, len(clusters))
-    )
-    filtered = summarise_answer.llm_filter_clusters(topic, top_clusters)
-    answer = summarise_answer.draft_answer(topic, filtered)
-    state["answer"] = answer
+    # The reranker's final LLM stage already drops irrelevant clusters, so no
+    # separate cluster-filtering pass is needed.
+    with tracing.span("step", "rerank", items=len(clusters)):
+        filtered = summarise_answer.retrieve_top_k_clusters(
+            topic, clusters, k=min(8, len(clusters))
+        )
+    state["answer"] = _generate_answer(state, topic, filtered)
     return state
 
 
+def _generate_answer(state: AgentState, query: str, clusters: List[Dict[str, Any]]) -> str:
+    """
+    Stream the answer, forwarding token/citation events to LangGraph's
+    "custom" stream mode when the graph is being streamed, and record its
+    timings in generation_stats.
+    """
+    try:
+        writer = get_stream_writer()
+    except RuntimeError:  # node called directly, outside a graph run
+        writer = None
+
+    stats: Dict[str, Any] = {}
+    parts = []
+    with tracing.span("step", "generate_answer", items=len(clusters)) as attrs:
+        for event in summarise_answer.stream_answer(query, clusters, stats=stats):
+            parts.append(event["text"])
+            if writer is not None:
+                writer(event)
+        attrs["ttft_s"] = stats.get("ttft_s")
+    state["generation_stats"] = list(state.get("generation_stats") or []) + [stats]
+    return "".join(parts)
+
+
 def refine_response(state: AgentState) -> AgentState:
     refine_query = state.get("refine_query")
     if not refine_query:
         return state
 
-    clusters = state.get("ranked_clusters") or state.get("clusters") or []
-    filtered = summarise_answer.llm_filter_clusters(refine_query, clusters)
-    answer = summarise_answer.draft_answer(refine_query, filtered)
-    state["answer"] = answer
+    # The follow-up gets its own cut of the tree; clusters the topic already
+    # used keep their summaries
+    tree = state.get("cluster_tree")
+    if tree:
+        clusters = cluster_tree.clusters_for(
+            tree, state.get("enriched_articles", []), refine_query, state.get("granularity")
+        )
+    else:
+        clusters = state.get("ranked_clusters") or state.get("clusters") or []
+    with tracing.span("step", "rerank", items=len(clusters)):
+        filtered = summarise_answer.retrieve_top_k_clusters(
+            refine_query, clusters, k=min(8, len(clusters))
+        )
+    state["answer"] = _generate_answer(state, refine_query, filtered)
     state["refine_query"] = None  # prevent loops
     return state
 
@@ -186,21 +388,42 @@ def _should_refine(state: AgentState):
     return "refine_answer" if state.get("refine_query") else END
 
 
-def build_graph() -> Any:
+def add_traced_nodes(graph: Any, nodes: Dict[str, Any], profile: Optional[Iterable[str]] = None) -> None:
+    """
+    Add each node wrapped in tracing.traced_node. `profile` names nodes to
+    run under cProfile ("all" for every node); None defers to
+    NEWS_AGENT_PROFILE.
+    """
+    profile = set(profile) if profile is not None else None
+    for name, fn in nodes.items():
+        wanted = None if profile is None else (name in profile or "all" in profile)
+        graph.add_node(name, tracing.traced_node(name, fn, profile=wanted))
+
+
+def build_graph(checkpointer: Any = None, profile: Optional[Iterable[str]] = None) -> Any:
     """
-    Build and compile the LangGraph workflow.
+    Build and compile the LangGraph workflow. State is checkpointed after
+    every node to the shared on-disk checkpointer unless one is given.
     """
     workflow = StateGraph(AgentState)
 
-    workflow.add_node("fetch_articles", fetch_articles)
-    workflow.add_node("enrich_articles", enrich_articles)
-    workflow.add_node("build_graph", build_similarity_graph)
-    workflow.add_node("cluster_and_summarize", cluster_and_summarize)
-    workflow.add_node("rank_clusters", rank_clusters)
-    workflow.add_node("draft_response", draft_response)
-    workflow.add_node("refine_answer", refine_response)
+    add_traced_nodes(
+        workflow,
+        {
+            "expand_query": expand_query,
+            "fetch_articles": fetch_articles,
+            "enrich_articles": enrich_articles,
+            "build_graph": build_similarity_graph,
+            "cluster_and_summarize": cluster_and_summarize,
+            "rank_clusters": rank_clusters,
+            "draft_response": draft_response,
+            "refine_answer": refine_response,
+        },
+        profile,
+    )
 
-    workflow.set_entry_point("fetch_articles")
+    workflow.set_entry_point("expand_query")
+    workflow.add_edge("expand_query", "fetch_articles")
     workflow.add_edge("fetch_articles", "enrich_articles")
     workflow.add_edge("enrich_articles", "build_graph")
     workflow.add_edge("build_graph", "cluster_and_summarize")
@@ -209,21 +432,98 @@ def build_graph() -> Any:
     workflow.add_conditional_edges("draft_response", _should_refine, ["refine_answer", END])
     workflow.add_edge("refine_answer", END)
 
-    return workflow.compile(checkpointer=MemorySaver())
+    return workflow.compile(checkpointer=checkpointer or get_checkpointer())
+
 
+def _thread_config(thread_id: str) -> Dict[str, Any]:
+    return {"configurable": {"thread_id": thread_id}}
 
-def run_once(topic: str, refine_query: Optional[str] = None) -> AgentState:
+
+def finish_thread(graph: Any, config: Dict[str, Any]) -> None:
+    """
+    Delete a thread's checkpoints once its run has reached END; threads of
+    failed or interrupted runs are kept for resume_run.
+    """
+    checkpointer = getattr(graph, "checkpointer", None)
+    if checkpointer and not graph.get_state(config).next:
+        checkpointer.delete_thread(config["configurable"]["thread_id"])
+
+
+async def afinish_thread(graph: Any, config: Dict[str, Any]) -> None:
+    checkpointer = getattr(graph, "checkpointer", None)
+    if checkpointer and not (await graph.aget_state(config)).next:
+        await checkpointer.adelete_thread(config["configurable"]["thread_id"])
+
+
+def run_once(
+    topic: str,
+    refine_query: Optional[str] = None,
+    thread_id: Optional[str] = None,
+    granularity: Optional[float] = None,
+) -> AgentState:
+    """
+    Convenience helper to run the full workflow once. Pass a thread_id to be
+    able to resume_run it if it fails part way (its checkpoints are deleted
+    once it completes), and a granularity (cluster resolution, higher is
+    finer) to override the adaptive choice.
+    """
+    graph = build_graph()
+    config = _thread_config(thread_id or uuid.uuid4().hex)
+    inputs = {"topic": topic, "refine_query": refine_query, "granularity": granularity}
+    result = graph.invoke(inputs, config)
+    finish_thread(graph, config)
+    return result  # type: ignore[return-value]
+
+
+async def astream_answer(
+    topic: str, refine_query: Optional[str] = None, thread_id: Optional[str] = None, graph: Any = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Run the workflow asynchronously and yield answer events as they are
+    generated: {"type": "token"|"citation", ...} from draft/refine (see
+    summarise_answer.stream_answer), then one {"type": "done", "answer",
+    "generation_stats"} with the final state's answer.
+    """
+    graph = graph or build_graph()
+    config = _thread_config(thread_id or uuid.uuid4().hex)
+    final: Dict[str, Any] = {}
+    async for mode, chunk in graph.astream(
+        {"topic": topic, "refine_query": refine_query}, config, stream_mode=["custom", "values"]
+    ):
+        if mode == "custom":
+            yield chunk
+        else:
+            final = chunk
+    await afinish_thread(graph, config)
+    yield {"type": "done", "answer": final.get("answer"), "generation_stats": final.get("generation_stats", [])}
+
+
+def resume_run(thread_id: str) -> AgentState:
     """
-    Convenience helper to run the full workflow once.
+    Continue a checkpointed run from its last completed node; nodes that
+    already finished are not re-run. Completed runs are not kept, so only
+    failed or interrupted threads can be resumed.
     """
     graph = build_graph()
-    result = graph.invoke({"topic": topic, "refine_query": refine_query})
+    config = _thread_config(thread_id)
+    snapshot = graph.get_state(config)
+    if not snapshot.values:
+        raise KeyError(f"no checkpoints for thread {thread_id!r}")
+    if not snapshot.next:
+        finish_thread(graph, config)
+        return snapshot.values  # type: ignore[return-value]
+    result = graph.invoke(None, config)
+    finish_thread(graph, config)
     return result  # type: ignore[return-value]
 
 
 __all__ = [
     "AgentState",
+    "astream_answer",
     "build_graph",
+    "clusters_from_analysis",
+    "finish_thread",
+    "resume_run",
     "run_once",
 ]
 
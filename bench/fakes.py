@@ -0,0 +1,245 @@
+"""
+Local stand-ins for everything the pipeline calls over the network, for
+offline benchmarking.
+
+- SyntheticCorpus: deterministic articles drawn from a fixed number of
+  stories (shared vocabulary per story, so clustering has structure), with
+  a fraction of syndicated copies to exercise dedup.
+- fake fetchers: the corpus split across the four providers in
+  news_api/api_calls, each with its own latency. Every query gets the
+  provider's whole share, so the retrieval article budget is raised to the
+  corpus size.
+- fake scraping: Scraper.download serves the article's page from the
+  corpus after a delay, and parse_html strips tags instead of running
+  newspaper.
+- FakeOpenAI: chat completions (topics, summaries, judge scores, streamed
+  answers) and embeddings with configurable latency. Embeddings are feature
+  hashes of the words, so they are deterministic and similar texts get
+  similar vectors. It counts calls and tokens per kind.
+
+install() patches these in and points the shared LLM executor and
+embedding service at FakeOpenAI.
+"""
+
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+PROVIDERS = ("event_registry", "news_data", "finflight", "the_news_api")
+DEFAULT_PROVIDER_LATENCY = {"event_registry": 0.8, "news_data": 0.5, "finflight": 0.6, "the_news_api": 0.3}
+DEFAULT_PAGE_LATENCY = 0.02
+DEFAULT_CHAT_LATENCY = 0.05
+DEFAULT_EMBED_LATENCY = 0.02
+FAKE_EMBEDDING_DIMENSIONS = 256
+
+WORDS_PER_PAGE = 600
+STORY_VOCABULARY = 40
+# Fraction of each page's words drawn from its story's vocabulary.
+STORY_WORD_SHARE = 0.5
+SYNDICATED_FRACTION = 0.05
+
+_TAG_RE = re.compile(r"<[^>]+>")
+_WORD_RE = re.compile(r"\w+")
+
+
+class SyntheticCorpus:
+    def __init__(self, size, seed=0, stories=None):
+        rng = random.Random(seed)
+        self.size = size
+        n_stories = stories or max(5, size // 25)
+        common = [f"word{k}" for k in range(2000)]
+        story_words = [[f"story{s}term{k}" for k in range(STORY_VOCABULARY)] for s in range(n_stories)]
+        domains = [f"outlet{k}.example" for k in range(max(50, size // 5))]
+
+        self.articles = []
+        self.pages = {}
+        for i in range(size):
+            story = rng.randrange(n_stories)
+            if self.articles and rng.random() < SYNDICATED_FRACTION:
+                # Wire copy: same text as an earlier article on another outlet
+                original = self.articles[rng.randrange(len(self.articles))]
+                text = self.pages[original["url"]]
+            else:
+                words = [
+                    rng.choice(story_words[story]) if rng.random() < STORY_WORD_SHARE else rng.choice(common)
+                    for _ in range(WORDS_PER_PAGE)
+                ]
+                sentences = [" ".join(words[k:k + 15]).capitalize() + "." for k in range(0, len(words), 15)]
+                text = " ".join(sentences)
+            url = f"https://{rng.choice(domains)}/news/{i}"
+            self.pages[url] = text
+            self.articles.append({
+                "title": f"Story {story} report {i}",
+                "url": url,
+                "source": urlsplit_host(url),
+                "published_at": "2025-01-01T00:00:00Z",
+                "body": text[:300],
+            })
+
+    def split(self, providers=PROVIDERS):
+        shares = {name: [] for name in providers}
+        for i, article in enumerate(self.articles):
+            shares[providers[i % len(providers)]].append(article)
+        return shares
+
+
+def urlsplit_host(url):
+    return url.split("/")[2]
+
+
+def page_html(text):
+    return "<html><body>" + "".join(f"<p>{p}</p>" for p in text.split(". ")) + "</body></html>"
+
+
+def fake_parse_html(url, html):
+    """
+    Stand-in for newspaper parsing: the page's paragraphs as plain text.
+    """
+    text = _TAG_RE.sub(" ", html or "")
+    return " ".join(text.split()) or None
+
+
+class FakeResponse:
+    def __init__(self, text, status_code=200):
+        self.text = text
+        self.content = text.encode("utf-8")
+        self.status_code = status_code
+        self.headers = {}
+
+
+def _tokens(text):
+    return max(1, len(text) // 4)
+
+
+def feature_hash(text, dims=FAKE_EMBEDDING_DIMENSIONS):
+    """
+    Deterministic embedding: signed hashing of lowercase words into dims.
+    """
+    vec = np.zeros(dims, dtype=np.float32)
+    for word in _WORD_RE.findall(text.lower()):
+        h = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+        vec[h % dims] += 1.0 if (h >> 32) & 1 else -1.0
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+class FakeOpenAI:
+    """
+    Duck-types the parts of openai.OpenAI the executor uses.
+    """
+
+    def __init__(self, chat_latency=DEFAULT_CHAT_LATENCY, embed_latency=DEFAULT_EMBED_LATENCY):
+        self.chat_latency = chat_latency
+        self.embed_latency = embed_latency
+        self._lock = threading.Lock()
+        self.counts = {}
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat))
+        self.embeddings = SimpleNamespace(create=self._embed)
+
+    def _count(self, kind, prompt_tokens, completion_tokens=0):
+        with self._lock:
+            entry = self.counts.setdefault(kind, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0})
+            entry["calls"] += 1
+            entry["prompt_tokens"] += prompt_tokens
+            entry["completion_tokens"] += completion_tokens
+
+    def snapshot(self):
+        with self._lock:
+            return {kind: dict(entry) for kind, entry in self.counts.items()}
+
+    # --- chat ------------------------------------------------------------- #
+
+    def _reply(self, prompt):
+        if "news search queries" in prompt:
+            topic = re.search(r'^Topic: "(.*)"$', prompt, re.M).group(1)
+            return "chat.expand", json.dumps([f"{topic} latest", f"{topic} analysis", f"{topic} reaction"])
+        if "key topics" in prompt:
+            words = [w for w in _WORD_RE.findall(prompt.split("Article:", 1)[-1].lower()) if w.startswith("story")]
+            common = sorted(set(words), key=words.count, reverse=True)[:6]
+            return "chat.topics", json.dumps(common or ["general"])
+        if "Rate how relevant" in prompt:
+            n = len(re.findall(r"^\[(\d+)\]", prompt, re.M))
+            return "chat.judge", json.dumps({str(k): 10 - (k % 7) for k in range(n)})
+        if "Answer the user query" in prompt:
+            tags = re.findall(r"^\[(CID [^\]]+)\]", prompt, re.M)[:4]
+            body = " ".join(f"Finding {k} is supported [{tag}]." for k, tag in enumerate(tags))
+            return "chat.answer", body or "Not found."
+        return "chat.summary", "Summary: " + " ".join(prompt.split()[-60:])
+
+    def _chat(self, model, messages, stream=False, **kwargs):
+        prompt = "\n".join(str(m.get("content", "")) for m in messages)
+        kind, content = self._reply(prompt)
+        usage = SimpleNamespace(prompt_tokens=_tokens(prompt), completion_tokens=_tokens(content))
+        self._count(kind, usage.prompt_tokens, usage.completion_tokens)
+        time.sleep(self.chat_latency)
+        if not stream:
+            message = SimpleNamespace(content=content)
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+        def chunks():
+            for k in range(0, len(content), 8):
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content[k:k + 8]))], usage=None)
+            yield SimpleNamespace(choices=[], usage=usage)
+
+        return chunks()
+
+    # --- embeddings ------------------------------------------------------- #
+
+    def _embed(self, model, input, dimensions=None, **kwargs):
+        texts = [input] if isinstance(input, str) else list(input)
+        dims = dimensions or FAKE_EMBEDDING_DIMENSIONS
+        tokens = sum(_tokens(t) for t in texts)
+        self._count("embedding", tokens)
+        time.sleep(self.embed_latency)
+        data = [SimpleNamespace(index=k, embedding=feature_hash(t, dims).tolist()) for k, t in enumerate(texts)]
+        return SimpleNamespace(data=data, usage=SimpleNamespace(prompt_tokens=tokens, total_tokens=tokens))
+
+
+def install(corpus, provider_latency=None, page_latency=DEFAULT_PAGE_LATENCY, client=None):
+    """
+    Patch the fetchers, scraper and shared OpenAI-backed singletons to use
+    the fakes. Returns the FakeOpenAI client (for its counts).
+    """
+    from agent import retrieval
+    from graph import embeddings, scraper
+    from llm import executor
+    from news_api import api_calls
+
+    provider_latency = dict(DEFAULT_PROVIDER_LATENCY, **(provider_latency or {}))
+    shares = corpus.split()
+
+    def make_fetcher(name):
+        def fetch(keyword, max_items=10, **kwargs):
+            # Returns the provider's whole share: max_items would cap the
+            # benchmark at 40 articles.
+            time.sleep(provider_latency[name])
+            return [dict(a) for a in shares[name]]
+        return fetch
+
+    for name in PROVIDERS:
+        fn_name = "fetch_finflight" if name == "finflight" else f"fetch_{name}"
+        setattr(api_calls, fn_name, make_fetcher(name))
+
+    def download(self, url, headers=None):
+        time.sleep(page_latency)
+        text = corpus.pages.get(url)
+        return FakeResponse(page_html(text)) if text is not None else FakeResponse("", 404)
+
+    retrieval.ARTICLE_BUDGET = corpus.size
+    scraper.Scraper.download = download
+    scraper.parse_html = fake_parse_html
+
+    client = client or FakeOpenAI()
+    unlimited = {model: (10**9, 10**12) for model in executor.MODEL_LIMITS}
+    unlimited[embeddings.EMBEDDING_MODEL] = (10**9, 10**12)
+    executor._default_executor = executor.LLMExecutor(client=client, model_limits=unlimited)
+    embeddings._default_service = embeddings.EmbeddingService(
+        dimensions=FAKE_EMBEDDING_DIMENSIONS, executor=executor._default_executor
+    )
+    return client
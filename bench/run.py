@@ -0,0 +1,211 @@
+"""
+Offline benchmark: the pipeline on synthetic corpora against local fakes
+(see bench/fakes.py), so scaling can be compared across commits without
+API keys or spend.
+
+    python -m bench.run --sizes 100 1000 10000 --out bench.json
+
+For each size two runs are made, each in its own subprocess with an empty
+cache directory:
+
+- "stages": every workflow node called on its own, in order, each
+  measured separately;
+- "graph": workflow.build_graph() invoked end to end.
+
+Per stage (and for the whole graph run) the JSON report has wall_s, LLM
+and embedding call counts and tokens as seen by the fake OpenAI client,
+the executor's retry/coalesce counters, the process peak RSS after the
+stage, and, with --trace-memory, the tracemalloc peak within the stage.
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+DEFAULT_SIZES = (100, 1000, 10000)
+STAGES = (
+    "expand_query",
+    "fetch_articles",
+    "enrich_articles",
+    "build_similarity_graph",
+    "cluster_and_summarize",
+    "rank_clusters",
+    "draft_response",
+)
+
+
+def _peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _delta(after, before):
+    out = {}
+    for kind, entry in after.items():
+        prev = before.get(kind, {})
+        diff = {k: v - prev.get(k, 0) for k, v in entry.items()}
+        if diff["calls"]:
+            out[kind] = diff
+    return out
+
+
+def _totals(counts):
+    chat = [v for k, v in counts.items() if k.startswith("chat.")]
+    embedding = counts.get("embedding", {})
+    return {
+        "llm_calls": sum(v["calls"] for v in chat),
+        "llm_prompt_tokens": sum(v["prompt_tokens"] for v in chat),
+        "llm_completion_tokens": sum(v["completion_tokens"] for v in chat),
+        "embedding_calls": embedding.get("calls", 0),
+        "embedding_tokens": embedding.get("prompt_tokens", 0),
+        "calls_by_kind": counts,
+    }
+
+
+class _Meter:
+    def __init__(self, client, executor, trace_memory):
+        self.client = client
+        self.executor = executor
+        self.trace_memory = trace_memory
+
+    def measure(self, fn):
+        counts = self.client.snapshot()
+        executor_stats = dict(self.executor.stats)
+        if self.trace_memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        result = fn()
+        wall = time.perf_counter() - started
+        report = {"wall_s": round(wall, 4)}
+        if self.trace_memory:
+            report["traced_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+            tracemalloc.stop()
+        report.update(_totals(_delta(self.client.snapshot(), counts)))
+        report["executor"] = {k: v - executor_stats.get(k, 0) for k, v in self.executor.stats.items()}
+        report["peak_rss_mb"] = round(_peak_rss_mb(), 1)
+        return result, report
+
+
+def run_worker(size, mode, seed, trace_memory, chat_latency, embed_latency, page_latency):
+    """
+    One measured run in this process; NEWS_AGENT_CACHE_DIR must already
+    point at an empty directory.
+    """
+    from bench import fakes
+
+    corpus = fakes.SyntheticCorpus(size, seed=seed)
+    client = fakes.install(
+        corpus,
+        page_latency=page_latency,
+        client=fakes.FakeOpenAI(chat_latency=chat_latency, embed_latency=embed_latency),
+    )
+
+    from agent import workflow
+    from llm.executor import get_executor
+
+    meter = _Meter(client, get_executor(), trace_memory)
+    report = {"size": size, "mode": mode, "seed": seed}
+    topic = "story 1"
+
+    if mode == "stages":
+        state = {"topic": topic, "refine_query": None}
+        stages = {}
+        for name in STAGES:
+            node = getattr(workflow, name)
+            state, stages[name] = meter.measure(lambda: node(state))
+        report["stages"] = stages
+    else:
+        graph = workflow.build_graph()
+        config = {"configurable": {"thread_id": f"bench-{size}"}}
+        state, report["total"] = meter.measure(
+            lambda: graph.invoke({"topic": topic, "refine_query": None}, config)
+        )
+
+    report["articles"] = {
+        "raw": len(state.get("raw_articles") or []),
+        "enriched": len(state.get("enriched_articles") or []),
+        "clusters": len(state.get("clusters") or []),
+    }
+    report["graph_stats"] = state.get("graph_stats")
+    report["generation_stats"] = state.get("generation_stats")
+    return report
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--modes", nargs="+", choices=("stages", "graph"), default=["stages", "graph"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--trace-memory", action="store_true", help="tracemalloc peak per stage (slower)")
+    parser.add_argument("--chat-latency", type=float, default=0.05)
+    parser.add_argument("--embed-latency", type=float, default=0.02)
+    parser.add_argument("--page-latency", type=float, default=0.02)
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    parser.add_argument("--worker", nargs=2, metavar=("SIZE", "MODE"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    latencies = (args.chat_latency, args.embed_latency, args.page_latency)
+    if args.worker:
+        size, mode = int(args.worker[0]), args.worker[1]
+        print(json.dumps(run_worker(size, mode, args.seed, args.trace_memory, *latencies), default=str))
+        return 0
+
+    results = []
+    for size in args.sizes:
+        for mode in args.modes:
+            with tempfile.TemporaryDirectory(prefix="news-agent-bench-") as cache_dir:
+                cmd = [
+                    sys.executable, "-m", "bench.run", "--worker", str(size), mode,
+                    "--seed", str(args.seed),
+                    "--chat-latency", str(args.chat_latency),
+                    "--embed-latency", str(args.embed_latency),
+                    "--page-latency", str(args.page_latency),
+                ]
+                if args.trace_memory:
+                    cmd.append("--trace-memory")
+                env = dict(os.environ, NEWS_AGENT_CACHE_DIR=cache_dir)
+                proc = subprocess.run(cmd, capture_output=True, text=True, env=env)
+                if proc.returncode != 0:
+                    print(f"[bench] size={size} mode={mode} failed:\n{proc.stderr}", file=sys.stderr)
+                    results.append({"size": size, "mode": mode, "error": proc.stderr.strip().splitlines()[-1:]})
+                    continue
+                results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+                print(f"[bench] size={size} mode={mode} done", file=sys.stderr)
+
+    report = {
+        "commit": _git_commit(),
+        "created_at": time.time(),
+        "config": {
+            "seed": args.seed,
+            "chat_latency": args.chat_latency,
+            "embed_latency": args.embed_latency,
+            "page_latency": args.page_latency,
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2, default=str)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            fh.write(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+"""
+Approximate kNN graph construction for large article sets.
+
+IVFIndex is an inverted-file index over NumPy: spherical k-means splits
+the normalised embeddings into `nlist` cells and each query scans only its
+`nprobe` closest cells. build_graph_ann uses it to shortlist
+top_n * oversample cosine candidates per article, re-scores just those
+with kgraph's combined cosine + topic-overlap score and emits the same
+(u, v, score) edge list as kgraph.build_graph, so the n x n matrix is
+never materialised.
+
+evaluate_recall compares a sample of rows against the exact scores so
+nlist / nprobe / oversample can be tuned.
+"""
+
+import math
+
+import numpy as np
+
+from graph import kgraph
+
+DEFAULT_NPROBE = 8
+DEFAULT_OVERSAMPLE = 4
+KMEANS_ITERATIONS = 10
+# Training points per centroid; the rest are only assigned.
+KMEANS_SAMPLE_PER_LIST = 64
+
+
+def default_nlist(n):
+    return max(1, int(4 * math.sqrt(n)))
+
+
+class IVFIndex:
+    def __init__(self, nlist=None, nprobe=DEFAULT_NPROBE, seed=0, block_size=kgraph.DEFAULT_BLOCK_SIZE):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.seed = seed
+        self.block_size = block_size
+        self.centroids = None
+        self.lists = []
+        self.X = None
+
+    def _assign(self, X, k=1):
+        """
+        Indices of the k most similar centroids for each row, blockwise.
+        """
+        out = np.empty((len(X), k), dtype=np.int64)
+        for start in range(0, len(X), self.block_size):
+            sims = X[start:start + self.block_size] @ self.centroids.T
+            if k < sims.shape[1]:
+                out[start:start + len(sims)] = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+            else:
+                out[start:start + len(sims)] = np.argsort(-sims, axis=1)[:, :k]
+        return out
+
+    def fit(self, Xn):
+        """
+        Train centroids on a sample of the (already normalised) rows and
+        bucket every row into its nearest cell.
+        """
+        rng = np.random.default_rng(self.seed)
+        n = len(Xn)
+        nlist = min(self.nlist or default_nlist(n), n)
+        self.X = Xn
+
+        sample_size = min(n, nlist * KMEANS_SAMPLE_PER_LIST)
+        sample = Xn[rng.choice(n, size=sample_size, replace=False)]
+        self.centroids = sample[rng.choice(sample_size, size=nlist, replace=False)].copy()
+
+        for _ in range(KMEANS_ITERATIONS):
+            assign = self._assign(sample)[:, 0]
+            sums = np.zeros_like(self.centroids)
+            np.add.at(sums, assign, sample)
+            counts = np.bincount(assign, minlength=nlist)
+            empty = counts == 0
+            if empty.any():
+                sums[empty] = sample[rng.choice(sample_size, size=int(empty.sum()))]
+            self.centroids = kgraph.normalize_rows(sums)
+
+        assign = self._assign(Xn)[:, 0]
+        order = np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(nlist + 1))
+        self.lists = [order[bounds[c]:bounds[c + 1]] for c in range(nlist)]
+        return self
+
+    def self_knn(self, k):
+        """
+        Approximate top-k neighbours (by cosine, excluding self) of every
+        indexed row. Returns (idx, sims), both (n, k); unfilled slots have
+        idx -1 and sim -inf.
+
+        Work is grouped by cell: every query probing cell c is scored against
+        c's members in one matrix product, then merged into a running top-k.
+        """
+        n = len(self.X)
+        k = min(k, n - 1)
+        best_idx = np.full((n, max(k, 0)), -1, dtype=np.int64)
+        best_sim = np.full((n, max(k, 0)), -np.inf, dtype=np.float32)
+        if k <= 0:
+            return best_idx, best_sim
+
+        probes = self._assign(self.X, k=min(self.nprobe, len(self.lists)))
+        probe_order = np.argsort(probes, axis=None, kind="stable")
+        probe_cells = probes.ravel()[probe_order]
+        probe_rows = probe_order // probes.shape[1]
+        bounds = np.searchsorted(probe_cells, np.arange(len(self.lists) + 1))
+
+        for c, members in enumerate(self.lists):
+            queries = probe_rows[bounds[c]:bounds[c + 1]]
+            if not len(queries) or not len(members):
+                continue
+            for start in range(0, len(queries), self.block_size):
+                q = queries[start:start + self.block_size]
+                sims = self.X[q] @ self.X[members].T
+                sims[q[:, None] == members[None, :]] = -np.inf
+
+                cand_idx = np.concatenate([best_idx[q], np.broadcast_to(members, sims.shape)], axis=1)
+                cand_sim = np.concatenate([best_sim[q], sims], axis=1)
+                top = np.argpartition(-cand_sim, k - 1, axis=1)[:, :k]
+                best_idx[q] = np.take_along_axis(cand_idx, top, axis=1)
+                best_sim[q] = np.take_along_axis(cand_sim, top, axis=1)
+
+        best_idx[~np.isfinite(best_sim)] = -1
+        return best_idx, best_sim
+
+
+def ann_neighbors(
+    articles,
+    top_n=3,
+    nlist=None,
+    nprobe=DEFAULT_NPROBE,
+    oversample=DEFAULT_OVERSAMPLE,
+    seed=0,
+):
+    """
+    Top-n neighbours per article under the combined score. Returns
+    (idx, scores), (n, top_n) arrays ordered best first; idx -1 marks an
+    empty slot.
+    """
+    Xn = kgraph.normalize_rows(kgraph.embedding_matrix(articles))
+    n = len(Xn)
+    index = IVFIndex(nlist=nlist, nprobe=nprobe, seed=seed).fit(Xn)
+    cand_idx, cand_cos = index.self_knn(top_n * oversample)
+
+    topics = kgraph.build_topic_index(articles)
+    rows = np.repeat(np.arange(n), cand_idx.shape[1])
+    cols = cand_idx.ravel()
+    valid = cols >= 0
+    overlap = np.zeros(len(cols), dtype=np.float32)
+    overlap[valid] = kgraph.topic_overlap_pairs(topics, rows[valid], cols[valid])
+
+    scores = 0.5 * cand_cos + 0.5 * overlap.reshape(cand_cos.shape)
+    scores[cand_idx < 0] = -np.inf
+
+    k = min(top_n, scores.shape[1])
+    order = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+    return np.take_along_axis(cand_idx, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+
+def build_graph_ann(articles, top_n=3, **ann_options):
+    """
+    Edge list in kgraph.build_graph's (u, v, score) format from
+    ann_neighbors, plus the neighbour index array for evaluate_recall.
+    """
+    if not articles:
+        return [], np.zeros((0, top_n), dtype=np.int64)
+    idx, scores = ann_neighbors(articles, top_n=top_n, **ann_options)
+    edges = []
+    for i in range(len(idx)):
+        for j, score in zip(idx[i].tolist(), scores[i].tolist()):
+            if j < 0:
+                continue
+            u, v = (i, j) if i < j else (j, i)
+            edges.append((u, v, score))
+    return edges, idx
+
+
+def evaluate_recall(articles, neighbors, top_n=3, sample_size=200, seed=0):
+    """
+    Fraction of the exact top-n neighbours (combined score) recovered by
+    `neighbors` (the idx array from ann_neighbors), over a random row sample.
+    """
+    n = len(articles)
+    if n < 2:
+        return 1.0
+    rng = np.random.default_rng(seed)
+    rows = np.sort(rng.choice(n, size=min(sample_size, n), replace=False))
+
+    Xn = kgraph.normalize_rows(kgraph.embedding_matrix(articles))
+    exact = 0.5 * (Xn[rows] @ Xn.T) + 0.5 * kgraph.topic_overlap_rows(kgraph.build_topic_index(articles), rows)
+    exact[np.arange(len(rows)), rows] = -np.inf
+    k = min(top_n, n - 1)
+    truth = np.argpartition(-exact, k - 1, axis=1)[:, :k]
+
+    found = sum(len(set(truth[r].tolist()) & set(neighbors[i].tolist())) for r, i in enumerate(rows.tolist()))
+    return found / (len(rows) * k)
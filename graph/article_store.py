@@ -0,0 +1,255 @@
+"""
+Columnar embedding storage for articles.
+
+Articles still travel between stages as dicts (the scraper, dedup, the
+persisted store, ingest's eviction and the checkpointer all work on them),
+and their metadata stays there: no hot loop scans it, and the one that
+scans topics builds its own columnar index (kgraph.build_topic_index).
+Their embeddings live in one contiguous (n, d) matrix held by an ArticleStore:
+article["embedding"] is a row view into it and article["row"] its index.
+stacked_embeddings() recognises such views and returns the shared matrix
+itself (or a single gather from it) instead of re-stacking per-article
+vectors, so similarity, ANN and ranking all read the same buffer.
+
+Long-lived matrices can be quantized to float16 or int8 with a per-row
+symmetric scale (QuantizedMatrix), optionally keeping only the leading
+STORE_DIMENSIONS columns (text-embedding-3 vectors stay usable when
+shortened). Cosine is scale invariant, so cosine() compares quantized rows
+directly, upcasting one block of rows at a time. With EMBEDDING_QUANTIZATION
+set, article_cosine() scores query-time cosine (cluster ranking, the
+cluster-tree cut) against a cached quantized copy of the shared matrix.
+The all-pairs product in kgraph stays float32: numpy has no BLAS path for
+float16 or int8 matrix products.
+"""
+
+import os
+import weakref
+
+import numpy as np
+
+# "float16" or "int8" to keep quantized copies of stored embedding matrices.
+QUANTIZATION = os.getenv("EMBEDDING_QUANTIZATION") or None
+QUANTIZED_DTYPES = {"float16": np.float16, "int8": np.int8}
+# Leading embedding columns kept by quantized copies (0 keeps all).
+STORE_DIMENSIONS = int(os.getenv("EMBEDDING_STORE_DIMENSIONS", "0")) or None
+# Rows upcast to float32 at a time by the quantized cosine path.
+COSINE_BLOCK_ROWS = 4096
+
+
+def _root(array):
+    while isinstance(array.base, np.ndarray):
+        array = array.base
+    return array
+
+
+def _row_indices(root, vectors):
+    """
+    Row index of each vector in `root`, or None unless every vector is a
+    full row view of it.
+    """
+    if root.ndim != 2 or not root.flags.c_contiguous:
+        return None
+    start, row_bytes = root.ctypes.data, root.strides[0]
+    rows = []
+    for v in vectors:
+        if _root(v) is not root or v.shape != root.shape[1:]:
+            return None
+        offset = v.ctypes.data - start
+        if offset % row_bytes:
+            return None
+        rows.append(offset // row_bytes)
+    return np.asarray(rows, dtype=np.int64)
+
+
+def stacked_embeddings(articles, dtype=np.float32):
+    """
+    The (n, d) matrix of the articles' embeddings without a per-article
+    copy: when they are row views of one matrix (in order) that matrix slice
+    is returned as is, otherwise rows are gathered in one indexing call.
+    Returns None when the embeddings do not share a matrix; dtype=None keeps
+    the stored dtype (e.g. int8).
+    """
+    vectors = [a.get("embedding") for a in articles]
+    if not vectors or not all(isinstance(v, np.ndarray) and v.ndim == 1 for v in vectors):
+        return None
+    root = _root(vectors[0])
+    rows = _row_indices(root, vectors)
+    if rows is None:
+        return None
+
+    first = int(rows[0])
+    if np.array_equal(rows, np.arange(first, first + len(rows))):
+        X = root[first:first + len(rows)]
+    else:
+        X = root[rows]
+    return X if dtype is None or X.dtype == dtype else X.astype(dtype)
+
+
+def row_norms(X, block_rows=COSINE_BLOCK_ROWS):
+    norms = np.empty(len(X), dtype=np.float32)
+    for start in range(0, len(X), block_rows):
+        block = np.asarray(X[start:start + block_rows], dtype=np.float32)
+        norms[start:start + len(block)] = np.linalg.norm(block, axis=1)
+    return norms
+
+
+def cosine(X, query, norms=None, block_rows=COSINE_BLOCK_ROWS):
+    """
+    Cosine of every row of X (float32, float16 or int8) against one query
+    vector, upcasting block_rows rows at a time. Zero rows score 0.
+    """
+    q = np.asarray(query, dtype=np.float32)
+    q_norm = np.linalg.norm(q)
+    out = np.zeros(len(X), dtype=np.float32)
+    if not len(X) or q_norm == 0:
+        return out
+    q = q / q_norm
+    if norms is None:
+        norms = row_norms(X, block_rows)
+    for start in range(0, len(X), block_rows):
+        block = np.asarray(X[start:start + block_rows], dtype=np.float32)
+        out[start:start + len(block)] = block @ q
+    nonzero = norms > 0
+    out[nonzero] /= norms[nonzero]
+    out[~nonzero] = 0.0
+    return out
+
+
+class QuantizedMatrix:
+    """
+    float16 or int8 copy of a float32 matrix. int8 rows are scaled
+    symmetrically so each row's largest magnitude maps to 127; `scales`
+    recovers approximate float32 values, but cosine never needs them.
+    """
+
+    __slots__ = ("data", "scales", "norms")
+
+    def __init__(self, data, scales=None):
+        self.data = data
+        self.scales = scales
+        self.norms = row_norms(data)
+
+    @classmethod
+    def from_matrix(cls, X, dtype="int8", dimensions=None):
+        if dtype not in QUANTIZED_DTYPES:
+            raise ValueError(f"unsupported quantization {dtype!r}")
+        X = np.asarray(X, dtype=np.float32)
+        if dimensions and X.ndim == 2 and dimensions < X.shape[1]:
+            X = X[:, :dimensions]
+        if dtype == "float16":
+            return cls(X.astype(np.float16))
+        scales = np.abs(X).max(axis=1) / 127.0 if X.size else np.zeros(len(X), dtype=np.float32)
+        scales[scales == 0] = 1.0
+        data = np.rint(X / scales[:, None]).astype(np.int8)
+        return cls(data, scales.astype(np.float32))
+
+    @property
+    def dtype(self):
+        return self.data.dtype.name
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def __len__(self):
+        return len(self.data)
+
+    def dequantize(self, rows=None):
+        data = self.data if rows is None else self.data[rows]
+        X = data.astype(np.float32)
+        if self.scales is not None:
+            X *= (self.scales if rows is None else self.scales[rows])[:, None]
+        return X
+
+    def cosine(self, query, rows=None):
+        """
+        Cosine of every row (or of `rows`) against a full-length query,
+        compared on the columns this copy kept.
+        """
+        query = np.asarray(query, dtype=np.float32)[:self.data.shape[1]]
+        if rows is None:
+            return cosine(self.data, query, norms=self.norms)
+        rows = np.asarray(rows, dtype=np.int64)
+        return cosine(self.data[rows], query, norms=self.norms[rows])
+
+
+# Quantized copies of live float32 matrices, keyed by (id(matrix), dtype,
+# dimensions) and dropped when the matrix is garbage collected.
+_quantized = {}
+
+
+def quantized_copy(matrix, dtype=QUANTIZATION, dimensions=STORE_DIMENSIONS):
+    """
+    Cached QuantizedMatrix of `matrix`, or None for dtype=None.
+    """
+    if not dtype:
+        return None
+    key = (id(matrix), dtype, dimensions)
+    copy = _quantized.get(key)
+    if copy is None:
+        copy = _quantized[key] = QuantizedMatrix.from_matrix(matrix, dtype, dimensions)
+        weakref.finalize(matrix, _quantized.pop, key, None)
+    return copy
+
+
+def article_cosine(articles, query, quantization=QUANTIZATION, dimensions=STORE_DIMENSIONS):
+    """
+    Cosine of each article's embedding against the query. Rows of one
+    shared float32 matrix are scored against its quantized copy when
+    `quantization` is set; already-quantized rows (a loaded int8 store) and
+    float32 rows are scored as they are.
+    """
+    vectors = [a.get("embedding") for a in articles]
+    if vectors and all(isinstance(v, np.ndarray) and v.ndim == 1 for v in vectors):
+        root = _root(vectors[0])
+        rows = _row_indices(root, vectors)
+        if rows is not None:
+            copy = quantized_copy(root, quantization, dimensions) if root.dtype == np.float32 else None
+            if copy is not None:
+                return copy.cosine(query, rows)
+            return cosine(stacked_embeddings(articles, dtype=None), query)
+    if not vectors:
+        return np.zeros(0, dtype=np.float32)
+    return cosine(np.stack([np.asarray(v, dtype=np.float32) for v in vectors]), query)
+
+
+class ArticleStore:
+    """
+    One contiguous float32 embedding matrix for a batch of articles,
+    addressed by row. attach() points each article dict at its row;
+    quantized() and cosine() use the configured quantization.
+    """
+
+    def __init__(self, matrix):
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.matrix)
+
+    @property
+    def dimensions(self):
+        return self.matrix.shape[1] if self.matrix.ndim == 2 else 0
+
+    def row(self, i):
+        return self.matrix[i]
+
+    def rows(self, indices):
+        return self.matrix[np.asarray(indices, dtype=np.int64)]
+
+    def attach(self, articles):
+        for i, article in enumerate(articles):
+            article["embedding"] = self.matrix[i]
+            article["row"] = i
+        return articles
+
+    def quantized(self, dtype=QUANTIZATION, dimensions=STORE_DIMENSIONS):
+        """
+        Cached QuantizedMatrix of the store, or None for dtype=None.
+        """
+        return quantized_copy(self.matrix, dtype, dimensions)
+
+    def cosine(self, query, quantization=QUANTIZATION, dimensions=STORE_DIMENSIONS):
+        quantized = self.quantized(quantization, dimensions)
+        if quantized is not None:
+            return quantized.cosine(query)
+        return cosine(self.matrix, query)
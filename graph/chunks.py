@@ -0,0 +1,117 @@
+"""
+Sentence-aware article chunks, embedded once at enrichment time.
+
+index_articles() splits each article's text into chunks of about
+CHUNK_TOKENS tokens on sentence boundaries (sentences longer than that are
+split on words), keeping one sentence of overlap between neighbours. All
+chunks of all articles are embedded in one call through the batched,
+cached EmbeddingService and stored as one float32 matrix. Each article
+gets:
+
+    article["chunks"]            list of chunk strings
+    article["chunk_embeddings"]  (k, d) row view into the shared matrix
+
+Answering then retrieves evidence passages from these instead of pasting
+article prefixes (see summarise_answer).
+"""
+
+import re
+
+from graph import embeddings
+from graph.article_store import ArticleStore
+
+CHUNK_TOKENS = 256
+CHUNK_OVERLAP_SENTENCES = 1
+# Very long articles (transcripts, live blogs) are capped to bound embedding cost.
+MAX_CHUNKS_PER_ARTICLE = 64
+
+# Splits after terminal punctuation and up to two closing quotes/brackets,
+# which stay with the sentence they close.
+_SENTENCE_RE = re.compile(
+    r"(?:(?<=[.!?])|(?<=[.!?][\"'”’)\]])|(?<=[.!?][\"'”’)\]]{2}))\s+(?=[\"'“‘(\[]?[A-Z0-9])"
+)
+# A period after these does not end a sentence.
+ABBREVIATIONS = {
+    "mr", "mrs", "ms", "dr", "prof", "sen", "rep", "gov", "gen", "st", "jr", "sr",
+    "inc", "corp", "co", "ltd", "no", "vs", "u.s", "u.k", "jan", "feb", "aug", "sept", "oct", "nov", "dec",
+}
+
+
+def split_sentences(text):
+    sentences = []
+    for paragraph in re.split(r"\n\s*\n|\n", text or ""):
+        pieces = [s.strip() for s in _SENTENCE_RE.split(paragraph.strip()) if s.strip()]
+        merged = []
+        for piece in pieces:
+            last_word = merged[-1].rsplit(None, 1)[-1].rstrip(".").lower() if merged else ""
+            if last_word in ABBREVIATIONS:
+                merged[-1] = f"{merged[-1]} {piece}"
+            else:
+                merged.append(piece)
+        sentences.extend(merged)
+    return sentences
+
+
+def _split_long(sentence, max_tokens, tokenizer):
+    pieces, current, size = [], [], 0
+    for word in sentence.split():
+        n = tokenizer.count(" " + word)
+        if current and size + n > max_tokens:
+            pieces.append(" ".join(current))
+            current, size = [], 0
+        current.append(word)
+        size += n
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+def chunk_text(text, max_tokens=CHUNK_TOKENS, overlap=CHUNK_OVERLAP_SENTENCES, tokenizer=None):
+    """
+    Pack consecutive sentences into chunks of at most max_tokens tokens,
+    repeating the last `overlap` sentences at the start of the next chunk.
+    """
+    tokenizer = tokenizer or embeddings.get_tokenizer(embeddings.EMBEDDING_MODEL)
+    units = []
+    for sentence in split_sentences(text):
+        n = tokenizer.count(sentence)
+        if n > max_tokens:
+            units.extend((piece, tokenizer.count(piece)) for piece in _split_long(sentence, max_tokens, tokenizer))
+        else:
+            units.append((sentence, n))
+
+    chunks, current, size = [], [], 0
+    for unit in units:
+        if current and size + unit[1] > max_tokens:
+            chunks.append(" ".join(s for s, _ in current))
+            current = current[-overlap:] if overlap else []
+            size = sum(n for _, n in current)
+            if size + unit[1] > max_tokens:
+                current, size = [], 0
+        current.append(unit)
+        size += unit[1]
+    if current:
+        chunks.append(" ".join(s for s, _ in current))
+    return chunks
+
+
+def index_articles(articles, max_tokens=CHUNK_TOKENS, max_chunks=MAX_CHUNKS_PER_ARTICLE):
+    """
+    Chunk and embed every article's text (article["text"], else full_text /
+    body) in one batched embedding call. Returns the articles.
+    """
+    tokenizer = embeddings.get_tokenizer(embeddings.EMBEDDING_MODEL)
+    per_article = []
+    for article in articles:
+        text = article.get("text") or article.get("full_text") or article.get("body") or ""
+        per_article.append(chunk_text(text, max_tokens, tokenizer=tokenizer)[:max_chunks])
+
+    texts = [chunk for chunks in per_article for chunk in chunks]
+    store = ArticleStore(embeddings.get_service().embed(texts)) if texts else None
+
+    start = 0
+    for article, chunks in zip(articles, per_article):
+        article["chunks"] = chunks
+        article["chunk_embeddings"] = store.matrix[start:start + len(chunks)] if store is not None else None
+        start += len(chunks)
+    return articles
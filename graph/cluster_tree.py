@@ -0,0 +1,227 @@
+"""
+Multi-resolution cluster tree: the similarity graph is clustered once at
+every resolution in RESOLUTIONS and queried at whatever granularity a
+question needs.
+
+build_tree() runs Leiden (RBConfigurationVertexPartition) at the finest
+resolution, then repeatedly aggregates each level's communities into single
+nodes and re-optimises them at the next coarser resolution. Every coarse
+cluster is therefore a union of finer ones and the levels nest into a tree;
+levels identical to the finer one below are dropped. Resolution 1.0 is the
+granularity run_community() used on its own.
+
+The tree is plain lists and dicts (it is checkpointed with the workflow
+state). Nothing in it is summarised up front: clusters_for() picks the
+nodes for one question and only those get a summary, cached on the node and
+in graph_analysis' TextCache, so another question, or another granularity,
+over the same tree only pays for nodes it has not used yet.
+
+Granularity per question:
+
+- None (adaptive): start from the coarsest level and split a cluster into
+  its children while one child is clearly more relevant to the question
+  (mean article cosine up by EXPAND_GAIN). Broad questions stay coarse;
+  narrow ones drill into the fine clusters around them.
+- a float: the level whose resolution is closest (higher is finer).
+"""
+
+from typing import Any, Dict, List, Optional, Sequence
+
+import leidenalg
+import numpy as np
+
+from graph import embeddings, graph_analysis
+from graph.article_store import article_cosine
+from llm import tracing
+
+# Coarse to fine.
+RESOLUTIONS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0)
+# Mean article cosine a child must gain over its parent to be used instead.
+EXPAND_GAIN = 0.05
+# Children smaller than this are not worth splitting a cluster for.
+MIN_CLUSTER_ARTICLES = 2
+# Upper bound on the adaptive cut, and clusters summarised per question
+# (the reranker's embedding prefilter keeps 20).
+MAX_CUT_NODES = 64
+MAX_SUMMARIZED_CLUSTERS = 20
+
+
+def _memberships(G, resolutions: Sequence[float]) -> List[List[int]]:
+    """
+    Article -> community at each resolution, coarse to fine, nested.
+    """
+    resolutions = sorted(resolutions, reverse=True)
+    partition = leidenalg.find_partition(
+        G,
+        leidenalg.RBConfigurationVertexPartition,
+        weights='weight',
+        resolution_parameter=resolutions[0],
+    )
+    membership = list(partition.membership)
+    levels = [(resolutions[0], membership)]
+    optimiser = leidenalg.Optimiser()
+    for resolution in resolutions[1:]:
+        # Communities become single nodes, so they can only merge
+        partition = partition.aggregate_partition()
+        partition.resolution_parameter = resolution
+        optimiser.optimise_partition(partition)
+        membership = [partition.membership[m] for m in membership]
+        if len(set(membership)) < len(set(levels[-1][1])):
+            levels.append((resolution, membership))
+    return levels[::-1]
+
+
+def build_tree(G, resolutions: Sequence[float] = RESOLUTIONS) -> Dict[str, Any]:
+    """
+    Cluster G at every resolution in one pass and return the tree:
+
+        resolutions  per level, coarse to fine
+        levels       node ids per level
+        membership   per level, the node id of every article
+        nodes        {id, level, resolution, article_ids, parent, children}
+    """
+    tree: Dict[str, Any] = {"resolutions": [], "levels": [], "membership": [], "nodes": []}
+    nodes = tree["nodes"]
+    for depth, (resolution, membership) in enumerate(_memberships(G, resolutions)):
+        ids: Dict[int, int] = {}
+        for article_id, community in enumerate(membership):
+            if community not in ids:
+                ids[community] = len(nodes)
+                nodes.append({
+                    "id": len(nodes),
+                    "level": depth,
+                    "resolution": resolution,
+                    "article_ids": [],
+                    "parent": tree["membership"][-1][article_id] if depth else None,
+                    "children": [],
+                })
+            nodes[ids[community]]["article_ids"].append(article_id)
+        tree["resolutions"].append(resolution)
+        tree["levels"].append(list(ids.values()))
+        tree["membership"].append([ids[c] for c in membership])
+        if depth:
+            for nid in tree["levels"][-1]:
+                nodes[nodes[nid]["parent"]]["children"].append(nid)
+    return tree
+
+
+def level_for(tree: Dict[str, Any], resolution: float) -> int:
+    """
+    Index of the level whose resolution is closest to `resolution`.
+    """
+    return int(np.argmin([abs(np.log(r / resolution)) for r in tree["resolutions"]]))
+
+
+def node_relevance(tree: Dict[str, Any], articles: List[Dict[str, Any]], query_vec) -> np.ndarray:
+    """
+    Mean cosine between the query and each node's articles, for every node
+    at once. Articles without a matching embedding are left out; nodes with
+    none score -inf.
+    """
+    scores = np.full(len(articles), np.nan, dtype=np.float32)
+    rows = [i for i, a in enumerate(articles) if a.get("embedding") is not None and len(a["embedding"]) == len(query_vec)]
+    if rows:
+        scores[rows] = article_cosine([articles[i] for i in rows], query_vec)
+
+    known = ~np.isnan(scores)
+    relevance = np.full(len(tree["nodes"]), -np.inf, dtype=np.float32)
+    for membership in tree["membership"]:
+        membership = np.asarray(membership)
+        totals = np.bincount(membership[known], weights=scores[known], minlength=len(relevance))
+        counts = np.bincount(membership[known], minlength=len(relevance))
+        present = np.unique(membership[known])
+        relevance[present] = totals[present] / counts[present]
+    return relevance
+
+
+def adaptive_cut(tree: Dict[str, Any], relevance: np.ndarray, max_nodes: int = MAX_CUT_NODES) -> List[int]:
+    """
+    Nodes covering every article, starting from the coarsest level and
+    splitting the node whose best child gains most relevance, while that
+    gain is at least EXPAND_GAIN and the cut stays within max_nodes.
+    """
+    nodes = tree["nodes"]
+    cut = set(tree["levels"][0])
+
+    def gain(nid):
+        sizable = [c for c in nodes[nid]["children"] if len(nodes[c]["article_ids"]) >= MIN_CLUSTER_ARTICLES]
+        if not sizable or not np.isfinite(relevance[nid]):
+            return -np.inf
+        return float(max(relevance[c] for c in sizable) - relevance[nid])
+
+    gains = {nid: gain(nid) for nid in cut}
+    while gains:
+        best = max(gains, key=gains.get)
+        children = nodes[best]["children"]
+        if gains[best] < EXPAND_GAIN or len(cut) - 1 + len(children) > max_nodes:
+            break
+        cut.remove(best)
+        del gains[best]
+        cut.update(children)
+        gains.update((c, gain(c)) for c in children)
+    return sorted(cut)
+
+
+def summarize_nodes(tree: Dict[str, Any], articles: List[Dict[str, Any]], node_ids: Sequence[int]) -> None:
+    """
+    Summarise (and embed the summary of) the given nodes that do not have
+    one yet, storing both on the node.
+    """
+    nodes = tree["nodes"]
+    missing = [nid for nid in node_ids if "summary" not in nodes[nid]]
+    if not missing:
+        return
+    analysis = graph_analysis.analyze_clusters(articles, [nodes[nid]["article_ids"] for nid in missing])
+    for k, nid in enumerate(missing):
+        # Embedding first: "summary" in a node means both are there
+        nodes[nid]["summary_embedding"] = analysis[k]["summary_embedding"]
+        nodes[nid]["summary"] = analysis[k]["combined_summary"]
+
+
+def clusters_for(
+    tree: Dict[str, Any],
+    articles: List[Dict[str, Any]],
+    query: str,
+    granularity: Optional[float] = None,
+    max_clusters: int = MAX_SUMMARIZED_CLUSTERS,
+) -> List[Dict[str, Any]]:
+    """
+    Cluster dicts (the shape the ranking and answer nodes expect, plus
+    "level" and "resolution") for one question: the tree cut at
+    `granularity` (None: adaptive, see module docstring), keeping the
+    max_clusters most relevant nodes, which are summarised if needed.
+    """
+    if not tree or not tree.get("nodes"):
+        return []
+
+    query_vec = embeddings.get_service().embed_one(query)
+    relevance = node_relevance(tree, articles, query_vec)
+    if granularity is None:
+        cut = adaptive_cut(tree, relevance)
+    else:
+        cut = tree["levels"][level_for(tree, granularity)]
+    chosen = sorted(cut, key=lambda nid: -relevance[nid])[:max_clusters]
+
+    with tracing.span("step", "summarize_clusters", items=len(chosen)) as attrs:
+        attrs["cached"] = sum(1 for nid in chosen if "summary" in tree["nodes"][nid])
+        summarize_nodes(tree, articles, chosen)
+
+    clusters = []
+    for nid in chosen:
+        node = tree["nodes"][nid]
+        keywords = []
+        for i in node["article_ids"]:
+            keywords.extend(articles[i].get("keywords") or [])
+        clusters.append({
+            "cid": nid,
+            "summary": node["summary"],
+            "articles": [articles[i] for i in node["article_ids"]],
+            "keywords": keywords,
+            "embedding": node["summary_embedding"],
+            "level": node["level"],
+            "resolution": node["resolution"],
+        })
+    return clusters
+
+
+__all__ = ["adaptive_cut", "build_tree", "clusters_for", "level_for", "node_relevance", "summarize_nodes"]
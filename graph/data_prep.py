@@ -1,69 +1,86 @@
-from newspaper import Article
 import json
+import re
 
+from graph import dedup, embeddings, scrape_cache
+from graph.article_store import ArticleStore
+from graph.scraper import scrape_urls
+from llm.executor import get_executor
 
+# ```json ... ``` wrapper some replies put around the list
+_FENCE_RE = re.compile(r"^```[a-zA-Z]*\s*|\s*```$")
 
-def get_full_texts(articles):
-    # 1. Deduplicate by URL
-    unique = set()
-    unique_articles = []
-    for article in articles:
-        url = article.get("url")
-        if url not in unique:
-            unique.add(url)
-            unique_articles.append(article)
 
-    # 2. Scrape & add full_text field
-    for article in unique_articles:
-        url = article["url"]
-        try:
-            article_text = scrape_url(url)
-        except:
-            article_text = None
+def get_full_texts(articles, **scraper_options):
+    # 1. Deduplicate by canonical URL, then by near-identical provider snippets
+    unique_articles = dedup.dedup_by_url(articles)
+    unique_articles = dedup.collapse_near_duplicates(unique_articles, text_key="body")
 
-        # Add the new field to the article dict
+    # 2. Scrape in parallel & add full_text field (None when unavailable)
+    urls = [article["url"] for article in unique_articles]
+    if scraper_options:
+        scraper_options.setdefault("cache", scrape_cache.get_cache())
+    texts = scrape_urls(urls, **scraper_options)
+    for article, article_text in zip(unique_articles, texts):
         article["full_text"] = article_text
 
-    return unique_articles
-
-def scrape_url(url):
-    try:
-        art = Article(url)
-        art.download()
-        art.parse()
-        text = art.text
-    except:
-        return None
-
-    if len(text) < 300:
-        return None
-
-    return text
-
-from openai import OpenAI
-
-client = OpenAI()
+    # 3. Collapse syndicated copies whose full bodies match, before embedding
+    return dedup.collapse_near_duplicates(unique_articles, text_key="full_text")
 
 def get_embeddings(articles):
-    for article in articles:
-        text = article.get("full_text") or ""
-        
-        # Call OpenAI embeddings endpoint
-        response = client.embeddings.create(
-            model="text-embedding-3-large",
-            input=text
-        )
-        
-        # Save embedding vector to article dict
-        article["embedding"] = response.data[0].embedding
+    # One batched, cache-backed call for the whole set
+    texts = [article.get("full_text") or "" for article in articles]
+    store = ArticleStore(embeddings.get_service().embed(texts))
+
+    # Each article's embedding is a row view of the one float32 matrix
+    store.attach(articles)
 
     return articles
 
+def _topics_prompt(text):
+    return f"""
+List the 5-10 key topics of this news article as short lowercase phrases
+(named entities, events, themes).
+
+Article:
+{text}
+
+Return ONLY a JSON list of strings.
+    """.strip()
+
+def extract_topics(text):
+    """
+    Ask the LLM for the article's key topics as a JSON list of short strings.
+    Returns the raw JSON text; get_topics parses it.
+    """
+    return get_executor().complete(_topics_prompt(text), model="gpt-4o").strip()
+
+def submit_topics(article):
+    """
+    Queue the topic-extraction request for one article on the shared
+    executor; returns its future.
+    """
+    messages = [{"role": "user", "content": _topics_prompt(article["full_text"])}]
+    return get_executor().chat(messages, model="gpt-4o")
+
+def parse_topics(response):
+    """
+    The topic list from a topics completion; [] for a reply that is not a
+    JSON list, so one bad reply does not fail the whole run.
+    """
+    content = _FENCE_RE.sub("", (response.choices[0].message.content or "").strip())
+    try:
+        topics = json.loads(content)
+    except (json.JSONDecodeError, TypeError):
+        return []
+    return topics if isinstance(topics, list) else []
+
 def get_topics(articles):
 
-    for article in articles:
-        topics_json = extract_topics(article["full_text"])
-        article["topics"] = json.loads(topics_json)
+    # Submit every article up front; the shared executor runs them
+    # concurrently within the rate limits
+    futures = [submit_topics(article) for article in articles]
+    for article, future in zip(articles, futures):
+        article["topics"] = parse_topics(future.result())
 
     return articles
 
@@ -0,0 +1,224 @@
+"""
+Collapse duplicate and syndicated articles before the expensive stages.
+
+Two passes, both keeping every collapsed copy in the survivor's `sources`
+list so citations can still name each outlet:
+
+1. dedup_by_url: canonical URLs (lowercased host, no www., no fragment,
+   tracking parameters dropped, remaining query sorted, AMP variants
+   folded) collapse exact copies that differ only in links.
+2. collapse_near_duplicates: 64-bit SimHash over word 3-gram shingles,
+   LSH-banded so only candidates sharing a 16-bit band are compared; pairs
+   within MAX_HAMMING bits are merged (wire stories reprinted by AP/Reuters
+   subscribers with different boilerplate around them).
+"""
+
+import hashlib
+import re
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import numpy as np
+
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "msclkid", "mc_cid", "mc_eid", "cmpid", "ocid",
+    "smid", "smtyp", "ref", "ref_src", "referrer", "src", "share", "taid",
+    "cid", "itm_source", "itm_medium", "itm_campaign", "guccounter",
+}
+TRACKING_PREFIXES = ("utm_", "at_", "pk_", "mkt_")
+
+SHINGLE_SIZE = 3
+MAX_HAMMING = 3
+# 64 bits in 4 bands: two fingerprints within 3 bits must agree on one band.
+BANDS = 4
+# Texts shorter than this (in words) are too small to fingerprint reliably.
+MIN_WORDS = 30
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def canonicalize_url(url):
+    if not url:
+        return url
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if host.startswith("amp."):
+        host = host[4:]
+
+    path = parts.path or "/"
+    for suffix in ("/amp", "/amp/", ".amp"):
+        if path.endswith(suffix):
+            path = path[: -len(suffix)] or "/"
+    if len(path) > 1:
+        path = path.rstrip("/")
+
+    query = [
+        (k, v)
+        for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k.lower() not in TRACKING_PARAMS
+        and not k.lower().startswith(TRACKING_PREFIXES)
+        and not (k.lower() == "outputtype" and v.lower() == "amp")
+    ]
+    query.sort()
+
+    scheme = parts.scheme.lower() or "https"
+    if scheme == "http":
+        scheme = "https"
+    return urlunsplit((scheme, host, path, urlencode(query), ""))
+
+
+def _source_record(article):
+    return {
+        "url": article.get("url"),
+        "source": article.get("source"),
+        "title": article.get("title"),
+        "published_at": article.get("published_at"),
+    }
+
+
+def _merge_into(keep, other):
+    sources = keep.setdefault("sources", [_source_record(keep)])
+    seen = {s.get("url") for s in sources}
+    for record in other.get("sources") or [_source_record(other)]:
+        if record.get("url") not in seen:
+            sources.append(record)
+            seen.add(record.get("url"))
+
+
+def _text_of(article, text_key):
+    text = article.get(text_key)
+    if text_key == "full_text" and not text:
+        text = article.get("body")
+    return text or ""
+
+
+def dedup_by_url(articles):
+    """
+    Collapse articles whose canonical URLs match; the first copy survives.
+    """
+    by_url = {}
+    unique = []
+    for article in articles:
+        url = canonicalize_url(article.get("url"))
+        keep = by_url.get(url)
+        if keep is None:
+            by_url[url] = article
+            article.setdefault("sources", [_source_record(article)])
+            article["canonical_url"] = url
+            unique.append(article)
+        else:
+            _merge_into(keep, article)
+    return unique
+
+
+class StreamingDedup:
+    """
+    Incremental form of both passes for articles that arrive one at a time.
+    The first copy seen survives (it may already be downstream); later
+    copies are folded into its `sources`.
+    """
+
+    def __init__(self, max_hamming=MAX_HAMMING):
+        self.max_hamming = max_hamming
+        self._by_url = {}
+        self._prints = []
+        self._buckets = {}
+
+    def seen_url(self, article):
+        """
+        True if an article with the same canonical URL was already added.
+        """
+        url = canonicalize_url(article.get("url"))
+        keep = self._by_url.get(url)
+        if keep is not None:
+            _merge_into(keep, article)
+            return True
+        self._by_url[url] = article
+        article.setdefault("sources", [_source_record(article)])
+        article["canonical_url"] = url
+        return False
+
+    def seen_text(self, article, text_key="full_text"):
+        """
+        True if a near-duplicate of the article's text was already added.
+        """
+        fp = simhash(_text_of(article, text_key))
+        if fp is None:
+            return False
+        band_bits = 64 // BANDS
+        mask = (1 << band_bits) - 1
+        keys = [(b, (fp >> (b * band_bits)) & mask) for b in range(BANDS)]
+        for key in keys:
+            for j in self._buckets.get(key, ()):
+                other_fp, keep = self._prints[j]
+                if bin(fp ^ other_fp).count("1") <= self.max_hamming:
+                    _merge_into(keep, article)
+                    return True
+        for key in keys:
+            self._buckets.setdefault(key, []).append(len(self._prints))
+        self._prints.append((fp, article))
+        return False
+
+
+def simhash(text):
+    """
+    64-bit SimHash over lowercase word shingles; None if the text is too short.
+    """
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < MIN_WORDS:
+        return None
+    shingles = {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little") for s in shingles),
+        dtype=np.uint64,
+        count=len(shingles),
+    )
+    bits = (hashes[:, None] >> np.arange(64, dtype=np.uint64)) & np.uint64(1)
+    votes = bits.astype(np.int64).sum(axis=0) * 2 - len(hashes)
+    return int(np.packbits(votes > 0, bitorder="little").view(np.uint64)[0])
+
+
+def collapse_near_duplicates(articles, text_key="full_text", max_hamming=MAX_HAMMING):
+    """
+    Merge articles whose SimHash fingerprints are within max_hamming bits.
+    Within each group the article with the longest text survives (ties keep
+    the earliest); the rest are folded into its `sources`.
+    """
+    n = len(articles)
+    prints = [simhash(_text_of(a, text_key)) for a in articles]
+
+    parent = list(range(n))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    band_bits = 64 // BANDS
+    mask = (1 << band_bits) - 1
+    buckets = {}
+    for i, fp in enumerate(prints):
+        if fp is None:
+            continue
+        for b in range(BANDS):
+            key = (b, (fp >> (b * band_bits)) & mask)
+            for j in buckets.get(key, ()):
+                if find(i) != find(j) and bin(fp ^ prints[j]).count("1") <= max_hamming:
+                    parent[find(i)] = find(j)
+            buckets.setdefault(key, []).append(i)
+
+    groups = {}
+    for i in range(n):
+        groups.setdefault(find(i), []).append(i)
+
+    survivors = []
+    for members in groups.values():
+        keep = max(members, key=lambda i: (len(_text_of(articles[i], text_key)), -i))
+        for i in members:
+            if i != keep:
+                _merge_into(articles[keep], articles[i])
+        survivors.append(keep)
+
+    return [articles[i] for i in sorted(survivors)]
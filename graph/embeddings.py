@@ -0,0 +1,289 @@
+"""
+Batched embedding service with a persistent, content-addressed cache.
+
+Every stage that needs vectors (data_prep.get_embeddings,
+graph_analysis.analyze_clusters, chunks.index_articles, ranking) goes through
+EmbeddingService.embed(). Texts are keyed by (model, dimensions, sha256);
+cached vectors come from disk and only the misses are sent to the API,
+packed into as few requests as the item and token limits allow.
+
+On-disk layout under cache_dir:
+    embeddings.sqlite          key -> row index, plus one row per matrix
+    <model>-<dimensions>.f32   append-only float32 matrix, read via np.memmap
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+
+import numpy as np
+
+from graph.paths import CACHE_DIR
+from llm import tracing
+from llm.executor import get_executor
+
+try:
+    import tiktoken
+except ImportError:  # optional: fall back to a chars/4 estimate
+    tiktoken = None
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-large")
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "0")) or None
+
+# OpenAI embeddings limits: items per request, tokens per request, tokens per input.
+MAX_BATCH_ITEMS = 2048
+MAX_BATCH_TOKENS = 300_000
+MAX_INPUT_TOKENS = 8191
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class Tokenizer:
+    """
+    tiktoken encoding for `model` when available, else a chars/4 estimate.
+    """
+
+    def __init__(self, model):
+        self.encoding = None
+        if tiktoken is not None:
+            try:
+                try:
+                    self.encoding = tiktoken.encoding_for_model(model)
+                except KeyError:
+                    self.encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception:  # noqa: BLE001 - BPE files unavailable offline
+                self.encoding = None
+
+    def count(self, text):
+        if self.encoding is None:
+            return (len(text) + 3) // 4
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text, max_tokens):
+        """
+        Clip text to max_tokens; returns (text, token_count).
+        """
+        if self.encoding is None:
+            text = text[: max_tokens * 4]
+            return text, max(1, len(text) // 4)
+        tokens = self.encoding.encode(text, disallowed_special=())
+        if len(tokens) > max_tokens:
+            tokens = tokens[:max_tokens]
+            text = self.encoding.decode(tokens)
+        return text, len(tokens)
+
+
+_tokenizers = {}
+
+
+def get_tokenizer(model):
+    """
+    Shared Tokenizer per model (loading an encoding is not free).
+    """
+    tokenizer = _tokenizers.get(model)
+    if tokenizer is None:
+        tokenizer = _tokenizers[model] = Tokenizer(model)
+    return tokenizer
+
+
+class EmbeddingCache:
+    """
+    SQLite index over append-only memory-mapped float32 matrices.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            os.path.join(cache_dir, "embeddings.sqlite"), check_same_thread=False
+        )
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS vectors (
+                model TEXT, dimensions INTEGER, text_hash TEXT, row INTEGER,
+                PRIMARY KEY (model, dimensions, text_hash)
+            );
+            CREATE TABLE IF NOT EXISTS matrices (
+                model TEXT, dimensions INTEGER, width INTEGER, rows INTEGER,
+                PRIMARY KEY (model, dimensions)
+            );
+            """
+        )
+        self._maps = {}
+
+    def _path(self, model, dimensions):
+        safe = re.sub(r"[^A-Za-z0-9_.-]", "_", model)
+        return os.path.join(self.cache_dir, f"{safe}-{dimensions or 'native'}.f32")
+
+    def _matrix(self, model, dimensions):
+        row = self._db.execute(
+            "SELECT width, rows FROM matrices WHERE model = ? AND dimensions = ?",
+            (model, dimensions or 0),
+        ).fetchone()
+        if not row or not row[1]:
+            return None
+        width, rows = row
+        key = (model, dimensions)
+        cached = self._maps.get(key)
+        if cached is None or cached.shape[0] != rows:
+            cached = np.memmap(self._path(model, dimensions), dtype=np.float32, mode="r", shape=(rows, width))
+            self._maps[key] = cached
+        return cached
+
+    def get_many(self, model, dimensions, hashes):
+        """
+        Returns {hash: float32 vector} for the hashes present in the cache.
+        """
+        if not hashes:
+            return {}
+        with self._lock:
+            found = {}
+            unique = list(set(hashes))
+            for k in range(0, len(unique), 500):
+                part = unique[k:k + 500]
+                marks = ",".join("?" * len(part))
+                found.update(
+                    self._db.execute(
+                        f"SELECT text_hash, row FROM vectors WHERE model = ? AND dimensions = ?"
+                        f" AND text_hash IN ({marks})",
+                        (model, dimensions or 0, *part),
+                    ).fetchall()
+                )
+            matrix = self._matrix(model, dimensions) if found else None
+            return {h: np.array(matrix[r]) for h, r in found.items()}
+
+    def put_many(self, model, dimensions, hashes, vectors):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if not len(hashes):
+            return
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT width, rows FROM matrices WHERE model = ? AND dimensions = ?",
+                (model, dimensions or 0),
+            ).fetchone()
+            width, rows = row if row else (vectors.shape[1], 0)
+            if width != vectors.shape[1]:
+                raise ValueError(f"cached width {width} != {vectors.shape[1]} for {model}")
+
+            path = self._path(model, dimensions)
+            with open(path, "r+b" if os.path.exists(path) else "wb") as fh:
+                # Seek past committed rows only: bytes from an interrupted
+                # write are overwritten rather than trusted.
+                fh.seek(rows * width * 4)
+                fh.write(vectors.tobytes())
+                fh.truncate()
+
+            self._db.executemany(
+                "INSERT OR REPLACE INTO vectors VALUES (?, ?, ?, ?)",
+                [(model, dimensions or 0, h, rows + k) for k, h in enumerate(hashes)],
+            )
+            self._db.execute(
+                "INSERT OR REPLACE INTO matrices VALUES (?, ?, ?, ?)",
+                (model, dimensions or 0, width, rows + len(hashes)),
+            )
+
+    def close(self):
+        self._maps.clear()
+        self._db.close()
+
+
+class EmbeddingService:
+    """
+    embed(texts) -> (n, d) float32 matrix, served from cache where possible.
+    Empty texts map to zero rows without an API call.
+    """
+
+    def __init__(
+        self,
+        model=EMBEDDING_MODEL,
+        dimensions=EMBEDDING_DIMENSIONS,
+        cache=None,
+        executor=None,
+        max_batch_items=MAX_BATCH_ITEMS,
+        max_batch_tokens=MAX_BATCH_TOKENS,
+    ):
+        self.model = model
+        self.dimensions = dimensions
+        self.cache = cache if cache is not None else EmbeddingCache()
+        self.executor = executor or get_executor()
+        self.max_batch_items = max_batch_items
+        self.max_batch_tokens = max_batch_tokens
+        self.tokenizer = Tokenizer(model)
+        self.api_calls = 0
+        self.cache_hits = 0
+
+    def _batches(self, texts):
+        batch, tokens = [], 0
+        for text in texts:
+            text, n_tokens = self.tokenizer.truncate(text, MAX_INPUT_TOKENS)
+            if batch and (
+                len(batch) >= self.max_batch_items or tokens + n_tokens > self.max_batch_tokens
+            ):
+                yield batch
+                batch, tokens = [], 0
+            batch.append(text)
+            tokens += n_tokens
+        if batch:
+            yield batch
+
+    def _request(self, batch):
+        kwargs = {}
+        if self.dimensions:
+            kwargs["dimensions"] = self.dimensions
+        response = self.executor.embed(batch, self.model, **kwargs).result()
+        self.api_calls += 1
+        data = sorted(response.data, key=lambda d: d.index)
+        return np.asarray([d.embedding for d in data], dtype=np.float32)
+
+    def embed(self, texts):
+        texts = [t or "" for t in texts]
+        hashes = [text_hash(t) for t in texts]
+        vectors = self.cache.get_many(self.model, self.dimensions, [h for h, t in zip(hashes, texts) if t])
+        self.cache_hits += len(vectors)
+
+        missing = {}
+        for h, t in zip(hashes, texts):
+            if t and h not in vectors:
+                missing.setdefault(h, t)
+        tracing.add("embedding", cache_hits=len(vectors), cache_misses=len(missing))
+
+        if missing:
+            miss_hashes = list(missing)
+            miss_texts = [missing[h] for h in miss_hashes]
+            done = 0
+            for batch in self._batches(miss_texts):
+                fresh = self._request(batch)
+                batch_hashes = miss_hashes[done:done + len(batch)]
+                self.cache.put_many(self.model, self.dimensions, batch_hashes, fresh)
+                vectors.update(zip(batch_hashes, fresh))
+                done += len(batch)
+
+        width = next((len(v) for v in vectors.values()), self.dimensions or 0)
+        out = np.zeros((len(texts), width), dtype=np.float32)
+        for i, (h, t) in enumerate(zip(hashes, texts)):
+            if t:
+                out[i] = vectors[h]
+        return out
+
+    def embed_one(self, text):
+        return self.embed([text])[0]
+
+
+_default_service = None
+_default_lock = threading.Lock()
+
+
+def get_service():
+    """
+    Process-wide EmbeddingService for the configured model and cache dir.
+    """
+    global _default_service
+    with _default_lock:
+        if _default_service is None:
+            _default_service = EmbeddingService()
+        return _default_service
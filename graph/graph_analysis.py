@@ -1,46 +1,153 @@
-from igraph import Graph
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import leidenalg
-from openai import OpenAI
 import numpy as np
-def run_community(G):
-    partition = leidenalg.find_partition(G, leidenalg.RBConfigurationVertexPartition, weights='weight')
+
+from graph import embeddings
+from graph.text_cache import TextCache, content_hash
+from llm import tracing
+from llm.executor import get_executor
+
+# Clusters whose joined text is longer than this (chars, ~12k tokens) are
+# summarised map-reduce style: per-article digests, then merged.
+DIRECT_SUMMARY_MAX_CHARS = 48_000
+# Article text sent to the digest prompt, and merged-digest text per reduce call.
+DIGEST_INPUT_CHARS = 12_000
+REDUCE_MAX_CHARS = 24_000
+# Concurrent summary / digest completions.
+SUMMARY_WORKERS = 8
+# Bump when prompts change so cached summaries are not reused.
+SUMMARY_PROMPT_VERSION = "v1"
+
+_summary_cache = None
+_digest_cache = None
+_cache_lock = threading.Lock()
+
+
+def _caches():
+    # Called from the summary workers: both caches are set under the lock
+    global _summary_cache, _digest_cache
+    with _cache_lock:
+        if _summary_cache is None or _digest_cache is None:
+            _digest_cache = TextCache("article_digest")
+            _summary_cache = TextCache("cluster_summary")
+        return _summary_cache, _digest_cache
+
+
+def run_community(G, initial_membership=None):
+    """
+    Leiden communities; pass the previous membership to warm-start so only
+    the neighbourhoods that changed get reshuffled.
+    """
+    partition = leidenalg.find_partition(
+        G,
+        leidenalg.RBConfigurationVertexPartition,
+        weights='weight',
+        initial_membership=initial_membership,
+    )
 
     return partition
 
-client = OpenAI()
 def analyze_clusters(articles, partition):
     clusters = {}
+    groups = [list(node_ids) for node_ids in partition]
+
+    # Summaries for all clusters in parallel; cached ones return immediately
+    with ThreadPoolExecutor(max_workers=SUMMARY_WORKERS) as pool:
+        summaries = list(pool.map(
+            tracing.wrap(lambda node_ids: summarize_articles([articles[i]["text"] for i in node_ids])),
+            groups,
+        ))
 
-    for cid, node_ids in enumerate(partition):
-        # Gather raw text of all articles in the cluster
-        cluster_texts = [articles[i]["text"] for i in node_ids]
-        full_text = "\n".join(cluster_texts)
+    # One batched (and cached) embedding call for every summary
+    summary_embeddings = embeddings.get_service().embed(summaries)
 
+    for cid, node_ids in enumerate(groups):
         keywords = []
         for i in node_ids:
             keywords.extend(articles[i]["keywords"])
-    
-        embedding = []
-        for i in node_ids:
-            embedding.append(articles[i]["embedding"])
-        combined_summary = summarize_cluster(full_text)
-  
-        response = client.embeddings.create(
-            input=[combined_summary],
-            model="text-embedding-ada-002"
-        )
-        summary_embedding = np.array(response.data[0].embedding)
+
+        # Article vectors stay in the shared matrix, addressed by article_ids
         clusters[cid] = {
             "article_ids": node_ids,
             "keywords": keywords,
-            "embedding": embedding,
-            "combined_summary": combined_summary,
-            "summary_embedding": summary_embedding
+            "combined_summary": summaries[cid],
+            "summary_embedding": summary_embeddings[cid]
         }
 
     return clusters
 
 
+def cluster_key(texts):
+    """
+    Cache key for a cluster: its sorted article content hashes, so the key
+    only changes when membership or article text does.
+    """
+    return content_hash(SUMMARY_PROMPT_VERSION, *sorted(content_hash(t) for t in texts))
+
+
+def summarize_articles(texts):
+    """
+    Cached cluster summary. Small clusters go straight to summarize_cluster;
+    large ones are digested per article in parallel and the digests merged,
+    so prompt size stays bounded whatever the cluster size.
+    """
+    summary_cache, _ = _caches()
+
+    def compute():
+        full_text = "\n".join(texts)
+        if len(full_text) <= DIRECT_SUMMARY_MAX_CHARS:
+            return summarize_cluster(full_text)
+
+        with ThreadPoolExecutor(max_workers=SUMMARY_WORKERS) as pool:
+            digests = list(pool.map(tracing.wrap(digest_article), texts))
+            while len("\n".join(digests)) > REDUCE_MAX_CHARS and len(digests) > 1:
+                digests = list(pool.map(tracing.wrap(summarize_cluster), _pack(digests, REDUCE_MAX_CHARS)))
+        return summarize_cluster("\n".join(digests))
+
+    return summary_cache.get_or_compute(cluster_key(texts), compute)
+
+
+def _pack(texts, max_chars):
+    """
+    Group consecutive texts into newline-joined chunks of at most max_chars
+    (a single oversize text becomes its own chunk). Always returns fewer
+    chunks than texts when there are at least two.
+    """
+    chunks, current = [], []
+    for text in texts:
+        if current and len("\n".join(current + [text])) > max_chars:
+            chunks.append(current)
+            current = []
+        current.append(text)
+    if current:
+        chunks.append(current)
+    if len(chunks) == len(texts) and len(texts) > 1:
+        chunks = [texts[k:k + 2] for k in range(0, len(texts), 2)]
+    return ["\n".join(chunk) for chunk in chunks]
+
+
+def digest_article(text):
+    """
+    Short factual digest of one article, cached by its content hash.
+    """
+    _, digest_cache = _caches()
+
+    def compute():
+        prompt = f"""
+Summarise this news article in 3-5 sentences. Keep names, numbers, dates and
+any claims attributed to sources.
+
+article:
+{(text or "")[:DIGEST_INPUT_CHARS]}
+    """
+
+        return get_executor().complete(prompt.strip(), model="gpt-4o")
+
+    return digest_cache.get_or_compute(content_hash(SUMMARY_PROMPT_VERSION, text), compute)
+
+
 def summarize_cluster(text):
     prompt = f"""
 Give a proper summary of this combinations of articles they talk about a similar topic point out
@@ -50,11 +157,4 @@ topics:
 {text}
     """
 
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "user", "content": prompt.strip()}
-        ]
-    )
-
-    return response.choices[0].message.content
\ No newline at end of file
+    return get_executor().complete(prompt.strip(), model="gpt-4o")
@@ -1,48 +1,206 @@
-from openai import OpenAI
+import json
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from graph.article_store import stacked_embeddings
+from llm import tracing
+from llm.executor import get_executor
+
+# Rows per matrix-product block; bounds temporaries to block_size x n floats.
+DEFAULT_BLOCK_SIZE = 1024
 
-def compute_similarity(articles):
+# Neighbours per article (by cosine) that the LLM re-scores in "llm" mode.
+DEFAULT_LLM_SHORTLIST = 5
+# Pairs per chat completion, and completions in flight.
+LLM_PAIR_BATCH_SIZE = 8
+LLM_MAX_WORKERS = 8
+# Per-article text sent to the LLM; the lead carries the topic.
+LLM_PAIR_TEXT_CHARS = 2000
+
+
+def embedding_matrix(articles, dtype=np.float32):
+    """
+    Stack article embeddings into an (n, d) matrix. Articles without an
+    embedding get a zero row so indices stay aligned with the input list.
+    Embeddings that are rows of one ArticleStore matrix come back as that
+    matrix (or one gather from it); treat the result as read-only.
+    """
+    shared = stacked_embeddings(articles, dtype)
+    if shared is not None:
+        return shared
+    vectors = [a.get("embedding") for a in articles]
+    dim = next((len(v) for v in vectors if v is not None and len(v)), 0)
+    X = np.zeros((len(articles), dim), dtype=dtype)
+    for i, v in enumerate(vectors):
+        if v is not None and len(v) == dim and dim:
+            X[i] = v
+    return X
+
+
+def normalize_rows(X):
+    """
+    L2-normalise rows in float32; zero rows stay zero (cosine 0 to everything).
+    """
+    X = np.asarray(X, dtype=np.float32)
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return X / norms
+
+
+def compute_similarity(
+    articles,
+    block_size=DEFAULT_BLOCK_SIZE,
+    topic_mode="local",
+    llm_shortlist=DEFAULT_LLM_SHORTLIST,
+):
     """
     Build a symmetric similarity matrix combining cosine distance on embeddings
-    and a lightweight topic-overlap score from the LLM.
+    and a topic-overlap score (0.5 each). Returns an (n, n) float32 ndarray.
+
+    topic_mode="local" scores overlap from the articles' `topics` lists
+    (IDF-weighted Jaccard). topic_mode="llm" additionally has the LLM re-score
+    each article's llm_shortlist nearest neighbours by cosine.
     """
     n = len(articles)
     if n == 0:
-        return []
+        return np.zeros((0, 0), dtype=np.float32)
 
-    sim_matrix = [[0.0 for _ in range(n)] for _ in range(n)]
+    Xn = normalize_rows(embedding_matrix(articles))
+    index = build_topic_index(articles)
+    llm_pairs = _llm_pairs(Xn, articles, block_size, llm_shortlist) if topic_mode == "llm" else {}
 
-    for i in range(n):
-        for j in range(i + 1, n):
-            art_i = articles[i]
-            art_j = articles[j]
+    sim_matrix = np.empty((n, n), dtype=np.float32)
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        sim_matrix[start:stop] = _similarity_block(Xn, index, start, stop, llm_pairs)
 
-            cosine = compute_cosine(art_i.get("embedding", []), art_j.get("embedding", []))
-            topic_overlap = compute_topic_overlap(
-                art_i.get("full_text", "") or "",
-                art_j.get("full_text", "") or "",
-            )
+    return sim_matrix
 
-            score = 0.5 * cosine + 0.5 * topic_overlap
-            sim_matrix[i][j] = score
-            sim_matrix[j][i] = score
 
-    return sim_matrix
+def _similarity_block(Xn, index, start, stop, llm_pairs=None):
+    """
+    Similarity of rows start..stop against every article, diagonal zeroed,
+    with the overlap of any pair in llm_pairs (see _llm_pairs) replaced by
+    its LLM score.
+    """
+    cosine = Xn[start:stop] @ Xn.T
+    overlap = topic_overlap_block(index, start, stop)
 
+    for i in range(start, stop):
+        for j, score in (llm_pairs or {}).get(i, ()):
+            overlap[i - start, j] = score
+
+    block = 0.5 * cosine + 0.5 * overlap
+    rows = np.arange(stop - start)
+    block[rows, rows + start] = 0.0
+    return block
 
-import math
 
-def compute_cosine(e1, e2):
-    dot = sum(a * b for a, b in zip(e1, e2))
+def similarity_rows(Xn, index, rows):
+    """
+    Combined local similarity of arbitrary article rows against every
+    article, self-similarity zeroed. Xn is the normalised embedding matrix
+    and index the build_topic_index of the same articles.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    block = 0.5 * (Xn[rows] @ Xn.T) + 0.5 * topic_overlap_rows(index, rows)
+    block[np.arange(len(rows)), rows] = 0.0
+    return block
 
-    norm1 = math.sqrt(sum(a * a for a in e1)) if e1 else 0.0
-    norm2 = math.sqrt(sum(b * b for b in e2)) if e2 else 0.0
 
-    if norm1 == 0 or norm2 == 0:
-        return 0.0
+# --- Local topic overlap --------------------------------------------------- #
 
-    return dot / (norm1 * norm2)
 
-client = OpenAI()
+def _normalize_topic(topic):
+    if isinstance(topic, dict):
+        topic = topic.get("topic") or topic.get("name") or ""
+    return str(topic).strip().lower()
+
+
+def build_topic_index(articles):
+    """
+    Inverted index over the `topics` lists from data_prep.get_topics.
+    Each topic is weighted by smoothed IDF so rare shared topics count more
+    than ubiquitous ones ("economy", "markets").
+    """
+    n = len(articles)
+    article_terms = []
+    postings = {}
+    for i, art in enumerate(articles):
+        topics = art.get("topics") or []
+        if not isinstance(topics, list):
+            topics = [topics]
+        terms = {t for t in (_normalize_topic(t) for t in topics) if t}
+        article_terms.append(terms)
+        for t in terms:
+            postings.setdefault(t, []).append(i)
+
+    postings = {t: np.asarray(ids, dtype=np.int64) for t, ids in postings.items()}
+    weights = {t: math.log((1 + n) / (1 + len(ids))) + 1.0 for t, ids in postings.items()}
+    sizes = np.array(
+        [sum(weights[t] for t in terms) for terms in article_terms], dtype=np.float32
+    )
+
+    return {
+        "n": n,
+        "article_terms": article_terms,
+        "postings": postings,
+        "weights": weights,
+        "sizes": sizes,
+    }
+
+
+def topic_overlap_rows(index, rows):
+    """
+    Weighted Jaccard |A & B|_w / |A | B|_w of the given article rows against
+    all articles, accumulated through the postings of those rows' topics only.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    inter = np.zeros((len(rows), index["n"]), dtype=np.float32)
+    position = np.full(index["n"], -1, dtype=np.int64)
+    position[rows] = np.arange(len(rows))
+
+    row_terms = set()
+    for r in rows.tolist():
+        row_terms.update(index["article_terms"][r])
+
+    for t in row_terms:
+        ids = index["postings"][t]
+        hit = position[ids]
+        inter[np.ix_(hit[hit >= 0], ids)] += index["weights"][t]
+
+    sizes = index["sizes"]
+    union = sizes[rows, None] + sizes[None, :] - inter
+    overlap = np.zeros_like(inter)
+    np.divide(inter, union, out=overlap, where=union > 0)
+    return overlap
+
+
+def topic_overlap_block(index, start, stop):
+    """
+    Topic overlap of the contiguous rows start..stop against all articles.
+    """
+    return topic_overlap_rows(index, np.arange(start, stop))
+
+
+def topic_overlap_pairs(index, left, right):
+    """
+    Topic overlap for explicit (left[k], right[k]) pairs, without building rows.
+    """
+    terms, weights, sizes = index["article_terms"], index["weights"], index["sizes"]
+    out = np.zeros(len(left), dtype=np.float32)
+    for k, (i, j) in enumerate(zip(np.asarray(left).tolist(), np.asarray(right).tolist())):
+        shared = terms[i] & terms[j]
+        if not shared:
+            continue
+        inter = sum(weights[t] for t in shared)
+        out[k] = inter / (sizes[i] + sizes[j] - inter)
+    return out
+
+
+# --- Optional LLM overlap on a cosine shortlist ---------------------------- #
 
 def compute_topic_overlap(t1, t2):
     """
@@ -59,34 +217,166 @@ Article B:
     """
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "user", "content": prompt.strip()}
-            ]
-        )
-        raw = response.choices[0].message.content.strip()
+        raw = get_executor().complete(prompt.strip(), model="gpt-4o").strip()
         return float(raw)
     except Exception:
         return 0.0
 
 
-def build_graph(sim_matrix, top_n=3):
+def compute_topic_overlap_batch(pairs):
+    """
+    Score several (text_a, text_b) pairs in one completion. Returns one float
+    per pair; falls back to per-pair calls if the reply cannot be parsed.
+    """
+    blocks = []
+    for k, (t1, t2) in enumerate(pairs):
+        blocks.append(
+            f"Pair {k}:\nArticle A:\n{t1[:LLM_PAIR_TEXT_CHARS]}\n\n"
+            f"Article B:\n{t2[:LLM_PAIR_TEXT_CHARS]}\n"
+        )
+    joined = "\n".join(blocks)
+
+    prompt = f"""
+For each pair below give a score between 0 and 1 (two decimals) for how similar
+the two articles are.
+
+{joined}
+Return ONLY a JSON list of {len(pairs)} numbers, in pair order.
+    """
+
+    try:
+        scores = json.loads(get_executor().complete(prompt.strip(), model="gpt-4o").strip())
+        if len(scores) != len(pairs):
+            raise ValueError("score count mismatch")
+        return [float(s) for s in scores]
+    except Exception:
+        return [compute_topic_overlap(t1, t2) for t1, t2 in pairs]
+
+
+def score_pairs_llm(articles, pairs, batch_size=LLM_PAIR_BATCH_SIZE, max_workers=LLM_MAX_WORKERS):
+    """
+    LLM topic overlap for the given (i, j) index pairs, batched and run
+    concurrently. Returns {(i, j): score}.
+    """
+    pairs = list(pairs)
+    if not pairs:
+        return {}
+
+    def texts(batch):
+        return [
+            (articles[i].get("full_text", "") or "", articles[j].get("full_text", "") or "")
+            for i, j in batch
+        ]
+
+    batches = [pairs[k:k + batch_size] for k in range(0, len(pairs), batch_size)]
+    scores = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = pool.map(tracing.wrap(lambda batch: compute_topic_overlap_batch(texts(batch))), batches)
+        for batch, batch_scores in zip(batches, results):
+            scores.update(zip(batch, batch_scores))
+    return scores
+
+
+def _llm_pairs(Xn, articles, block_size, shortlist):
+    """
+    LLM overlap for each row's top `shortlist` cosine neighbours, scored
+    before any similarity block so that both rows of a pair get the same
+    score whichever of them shortlisted it. Returns {i: [(j, score), ...]}
+    holding every pair in both directions.
+    """
+    n = len(Xn)
+    k = min(shortlist, n - 1)
+    if k <= 0:
+        return {}
+
+    pairs = set()
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        masked = Xn[start:stop] @ Xn.T
+        masked[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+        candidates = np.argpartition(-masked, k - 1, axis=1)[:, :k]
+        for r, row in enumerate(candidates.tolist()):
+            i = start + r
+            pairs.update((i, j) if i < j else (j, i) for j in row)
+
+    by_row = {}
+    for (i, j), score in score_pairs_llm(articles, sorted(pairs)).items():
+        by_row.setdefault(i, []).append((j, score))
+        by_row.setdefault(j, []).append((i, score))
+    return by_row
+
+
+# --- Edge selection -------------------------------------------------------- #
+
+
+def _top_n_edges(block, start, top_n):
+    """
+    Select the top_n peers of each row in a similarity block with
+    argpartition, then order just those few by score (descending).
+    """
+    rows, n = block.shape
+    k = min(top_n, n - 1)
+    if k <= 0:
+        return []
+
+    block = np.array(block, dtype=np.float32)
+    block[np.arange(rows), np.arange(start, start + rows)] = -np.inf
+
+    idx = np.argpartition(-block, k - 1, axis=1)[:, :k]
+    scores = np.take_along_axis(block, idx, axis=1)
+    order = np.argsort(-scores, axis=1, kind="stable")
+    idx = np.take_along_axis(idx, order, axis=1)
+    scores = np.take_along_axis(scores, order, axis=1)
+
+    edges = []
+    for r in range(rows):
+        i = start + r
+        for j, score in zip(idx[r].tolist(), scores[r].tolist()):
+            u, v = (i, j) if i < j else (j, i)
+            edges.append((u, v, score))
+    return edges
+
+
+def build_graph(sim_matrix, top_n=3, block_size=DEFAULT_BLOCK_SIZE):
     """
     Build an edge list by connecting each node to its top_n most similar peers.
     """
+    sim_matrix = np.asarray(sim_matrix, dtype=np.float32)
     n = len(sim_matrix)
     edges = []
 
-    for i in range(n):
-        sims = list(enumerate(sim_matrix[i]))
-        sims = [(j, s) for j, s in sims if j != i]
-        sims.sort(key=lambda x: x[1], reverse=True)
-        top_neighbors = sims[:top_n]
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        edges.extend(_top_n_edges(sim_matrix[start:stop], start, top_n))
 
-        for j, score in top_neighbors:
-            u, v = sorted((i, j))
-            edges.append((u, v, score))
+    return edges
+
+
+def build_graph_chunked(
+    articles,
+    top_n=3,
+    block_size=DEFAULT_BLOCK_SIZE,
+    topic_mode="local",
+    llm_shortlist=DEFAULT_LLM_SHORTLIST,
+):
+    """
+    Same edges as build_graph(compute_similarity(articles)) without ever
+    holding the n x n matrix: similarity is computed and consumed one
+    block_size x n row block at a time.
+    """
+    n = len(articles)
+    if n == 0:
+        return []
+
+    Xn = normalize_rows(embedding_matrix(articles))
+    index = build_topic_index(articles)
+    llm_pairs = _llm_pairs(Xn, articles, block_size, llm_shortlist) if topic_mode == "llm" else {}
+    edges = []
+
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        block = _similarity_block(Xn, index, start, stop, llm_pairs)
+        edges.extend(_top_n_edges(block, start, top_n))
 
     return edges
 
@@ -0,0 +1,9 @@
+"""
+On-disk locations shared by every cache and store.
+"""
+
+import os
+
+# Root for the embedding, text, scrape, provider and checkpoint caches, the
+# persisted cluster stores and profiles.
+CACHE_DIR = os.getenv("NEWS_AGENT_CACHE_DIR", os.path.join(".cache", "news_agent"))
@@ -0,0 +1,166 @@
+"""
+Disk-backed cache of parsed article text, keyed by URL.
+
+Entries live for `ttl` seconds. After that the scraper revalidates with
+If-None-Match / If-Modified-Since and a 304 renews the entry without
+re-downloading or re-parsing. URLs that failed or parsed to fewer than
+MIN_TEXT_CHARS characters are cached negatively (text NULL) for
+`negative_ttl`, so paywalled and broken pages are not retried every run.
+
+stats() reports hit rate and bytes saved for sizing the cache.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+from graph.paths import CACHE_DIR
+
+DEFAULT_TTL = 24 * 3600
+DEFAULT_NEGATIVE_TTL = 6 * 3600
+
+
+class ScrapeCache:
+    def __init__(self, path=None, ttl=DEFAULT_TTL, negative_ttl=DEFAULT_NEGATIVE_TTL):
+        if path is None:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            path = os.path.join(CACHE_DIR, "scrape.sqlite")
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                text TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                content_bytes INTEGER,
+                fetched_at REAL,
+                expires_at REAL
+            )
+            """
+        )
+        self._db.commit()
+        self._stats = {
+            "lookups": 0,
+            "hits": 0,
+            "negative_hits": 0,
+            "revalidated": 0,
+            "misses": 0,
+            "stores": 0,
+            "negative_stores": 0,
+            "bytes_saved": 0,
+        }
+
+    def lookup(self, url):
+        """
+        Returns (entry, fresh). entry is None on a miss; otherwise a dict
+        with text (None for negative entries), etag, last_modified and
+        content_bytes. Fresh hits are counted here; stale ones are counted
+        when the scraper reports the revalidation outcome.
+        """
+        with self._lock:
+            self._stats["lookups"] += 1
+            row = self._db.execute(
+                "SELECT text, etag, last_modified, content_bytes, expires_at FROM pages WHERE url = ?",
+                (url,),
+            ).fetchone()
+            if row is None:
+                self._stats["misses"] += 1
+                return None, False
+
+            text, etag, last_modified, content_bytes, expires_at = row
+            entry = {
+                "text": text,
+                "etag": etag,
+                "last_modified": last_modified,
+                "content_bytes": content_bytes or 0,
+            }
+            fresh = time.time() < expires_at
+            if fresh:
+                self._stats["hits" if text is not None else "negative_hits"] += 1
+                self._stats["bytes_saved"] += entry["content_bytes"]
+            elif text is None:
+                # Expired negative entries are simply retried.
+                self._stats["misses"] += 1
+            return entry, fresh
+
+    def validators(self, entry):
+        """
+        Conditional-request headers for a stale positive entry.
+        """
+        headers = {}
+        if entry and entry["text"] is not None:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def mark_revalidated(self, url, entry):
+        """
+        Record a 304: keep the text, push the expiry out by ttl.
+        """
+        with self._lock, self._db:
+            now = time.time()
+            self._db.execute(
+                "UPDATE pages SET fetched_at = ?, expires_at = ? WHERE url = ?",
+                (now, now + self.ttl, url),
+            )
+            self._stats["revalidated"] += 1
+            self._stats["bytes_saved"] += entry["content_bytes"]
+
+    def store(self, url, text, etag=None, last_modified=None, content_bytes=0):
+        """
+        Save a parse result; text=None stores a negative entry.
+        """
+        with self._lock, self._db:
+            now = time.time()
+            ttl = self.ttl if text is not None else self.negative_ttl
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, text, etag, last_modified, content_bytes, now, now + ttl),
+            )
+            self._stats["stores" if text is not None else "negative_stores"] += 1
+
+    def purge_expired(self, grace=0):
+        """
+        Drop entries that expired more than `grace` seconds ago.
+        """
+        with self._lock, self._db:
+            cur = self._db.execute("DELETE FROM pages WHERE expires_at < ?", (time.time() - grace,))
+            return cur.rowcount
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            entries, negatives, text_bytes = self._db.execute(
+                "SELECT COUNT(*), SUM(text IS NULL), COALESCE(SUM(LENGTH(text)), 0) FROM pages"
+            ).fetchone()
+        served = stats["hits"] + stats["negative_hits"] + stats["revalidated"]
+        stats["hit_rate"] = served / stats["lookups"] if stats["lookups"] else 0.0
+        stats["entries"] = entries
+        stats["negative_entries"] = negatives or 0
+        stats["text_bytes"] = text_bytes
+        return stats
+
+    def close(self):
+        self._db.close()
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_cache():
+    """
+    Process-wide ScrapeCache under NEWS_AGENT_CACHE_DIR.
+    """
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ScrapeCache()
+        return _default_cache
@@ -0,0 +1,287 @@
+"""
+Parallel full-text scraping for data_prep.get_full_texts.
+
+Downloads run on a bounded thread pool over one pooled requests.Session,
+with a per-domain concurrency cap and minimum spacing between hits to the
+same host. Downloaded HTML is handed to a process pool for newspaper's
+parser so extraction does not hold the GIL against the downloads.
+
+Pass a scrape_cache.ScrapeCache as `cache` to serve repeat URLs from disk,
+revalidate stale ones conditionally and skip recently failed ones.
+get_scraper() is the process-wide instance on the shared cache, so the
+connection pool, parse processes and per-domain spacing carry over from
+one call to the next.
+
+Every URL yields its article text, or None when the download or parse
+failed or the text is shorter than MIN_TEXT_CHARS characters.
+"""
+
+import atexit
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from graph import scrape_cache
+from llm import tracing
+
+MIN_TEXT_CHARS = 300
+
+DEFAULT_MAX_CONCURRENCY = 16
+DEFAULT_MAX_PER_DOMAIN = 2
+DEFAULT_DOMAIN_INTERVAL = 0.5  # seconds between request starts per host
+DEFAULT_TIMEOUT = 10.0
+DEFAULT_PARSE_WORKERS = 4
+USER_AGENT = "Mozilla/5.0 (compatible; news-agent/1.0)"
+
+
+def parse_html(url, html):
+    """
+    Extract article text from already-downloaded HTML with newspaper.
+    Runs in a worker process; returns None when parsing fails.
+    """
+    from newspaper import Article
+
+    try:
+        art = Article(url)
+        art.download(input_html=html)
+        art.parse()
+        return art.text
+    except Exception:
+        return None
+
+
+def _usable(text):
+    """
+    Parsed text, or None below MIN_TEXT_CHARS (teasers, paywalls, cookie
+    walls).
+    """
+    if not text or len(text) < MIN_TEXT_CHARS:
+        return None
+    return text
+
+
+class _DomainLimiter:
+    """
+    Caps in-flight requests per host and spaces their start times.
+    """
+
+    def __init__(self, max_per_domain, min_interval):
+        self.max_per_domain = max_per_domain
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._next_start = {}
+
+    def acquire(self, domain):
+        with self._lock:
+            slot = self._slots.setdefault(domain, threading.Semaphore(self.max_per_domain))
+        slot.acquire()
+        with self._lock:
+            now = time.monotonic()
+            start_at = max(now, self._next_start.get(domain, now))
+            self._next_start[domain] = start_at + self.min_interval
+        if start_at > now:
+            time.sleep(start_at - now)
+
+    def release(self, domain):
+        self._slots[domain].release()
+
+
+class Scraper:
+    """
+    Reusable scraping engine; use as a context manager or call close().
+    """
+
+    def __init__(
+        self,
+        max_concurrency=DEFAULT_MAX_CONCURRENCY,
+        max_per_domain=DEFAULT_MAX_PER_DOMAIN,
+        domain_interval=DEFAULT_DOMAIN_INTERVAL,
+        timeout=DEFAULT_TIMEOUT,
+        parse_workers=DEFAULT_PARSE_WORKERS,
+        session=None,
+        cache=None,
+    ):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.parse_workers = parse_workers
+        self.limiter = _DomainLimiter(max_per_domain, domain_interval)
+
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=max_concurrency, pool_maxsize=max_concurrency)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers["User-Agent"] = USER_AGENT
+        self.session = session
+        self.cache = cache
+        self._parse_pool = None
+        self._parse_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._parse_pool is not None:
+            self._parse_pool.shutdown()
+            self._parse_pool = None
+        self.session.close()
+
+    def download(self, url, headers=None):
+        """
+        GET one URL under the domain limiter. Returns the response, or None
+        on a network error.
+        """
+        if not url:
+            return None
+        domain = urlsplit(url).netloc.lower()
+        self.limiter.acquire(domain)
+        try:
+            return self.session.get(url, timeout=self.timeout, headers=headers)
+        except requests.RequestException:
+            return None
+        finally:
+            self.limiter.release(domain)
+
+    def _resolve(self, url):
+        """
+        Runs on a download thread. Returns ("text", text_or_None) when the
+        answer is already known (cache hit, 304, failure) or
+        ("html", html, response) when the page still has to be parsed.
+        """
+        with tracing.span("scrape", urlsplit(url or "").netloc.lower() or "-") as attrs:
+            entry, fresh = self.cache.lookup(url) if (self.cache and url) else (None, False)
+            if fresh:
+                attrs.update(outcome="cache_hit", cache_hits=1)
+                return ("text", entry["text"])
+
+            resp = self.download(url, headers=self.cache.validators(entry) if entry else None)
+            attrs["status"] = resp.status_code if resp is not None else None
+            if resp is not None and resp.status_code == 304 and entry and entry["text"] is not None:
+                self.cache.mark_revalidated(url, entry)
+                attrs.update(outcome="revalidated", cache_hits=1)
+                return ("text", entry["text"])
+            attrs["cache_misses"] = 1 if self.cache else 0
+            if resp is None or resp.status_code != 200:
+                if self.cache and url:
+                    self.cache.store(url, None)
+                attrs["outcome"] = "failed"
+                return ("text", None)
+            attrs.update(outcome="downloaded", response_bytes=len(resp.content))
+            return ("html", resp.text, resp)
+
+    def _store(self, url, text, resp):
+        if self.cache:
+            self.cache.store(
+                url,
+                text,
+                etag=resp.headers.get("ETag"),
+                last_modified=resp.headers.get("Last-Modified"),
+                content_bytes=len(resp.content),
+            )
+
+    def _parse_executor(self):
+        with self._parse_lock:
+            if self.parse_workers <= 0:
+                return None
+            if self._parse_pool is None:
+                try:
+                    self._parse_pool = ProcessPoolExecutor(max_workers=self.parse_workers)
+                except (OSError, NotImplementedError):
+                    # No process support (sandboxes, some serverless runtimes).
+                    self.parse_workers = 0
+                    return None
+            return self._parse_pool
+
+    def scrape_one(self, url):
+        """
+        Download and parse a single URL on the calling thread (parsing still
+        goes to the process pool); for callers that stream URLs in.
+        """
+        outcome = self._resolve(url)
+        if outcome[0] == "text":
+            return outcome[1]
+        _, html, resp = outcome
+        parse_pool = self._parse_executor()
+        try:
+            if parse_pool is None:
+                text = parse_html(url, html)
+            else:
+                text = parse_pool.submit(parse_html, url, html).result()
+        except Exception:
+            text = None
+        text = _usable(text)
+        self._store(url, text, resp)
+        return text
+
+    def scrape_urls(self, urls):
+        """
+        Download and parse every URL; returns texts (or None) in input order.
+        Parsing of early pages overlaps with downloading of later ones.
+        """
+        results = [None] * len(urls)
+        if not urls:
+            return results
+
+        parse_pool = self._parse_executor()
+        parse_futures = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="scrape") as pool:
+            resolve = tracing.wrap(self._resolve)
+            downloads = {pool.submit(resolve, url): i for i, url in enumerate(urls)}
+            for fut in as_completed(downloads):
+                i = downloads[fut]
+                outcome = fut.result()
+                if outcome[0] == "text":
+                    results[i] = outcome[1]
+                    continue
+                _, html, resp = outcome
+                if parse_pool is None:
+                    results[i] = _usable(parse_html(urls[i], html))
+                    self._store(urls[i], results[i], resp)
+                else:
+                    parse_futures[parse_pool.submit(parse_html, urls[i], html)] = (i, resp)
+
+        for fut in as_completed(parse_futures):
+            i, resp = parse_futures[fut]
+            try:
+                results[i] = _usable(fut.result())
+            except Exception:
+                results[i] = None
+            self._store(urls[i], results[i], resp)
+
+        return results
+
+
+_default_scraper = None
+_default_lock = threading.Lock()
+
+
+def get_scraper():
+    """
+    Process-wide Scraper on scrape_cache.get_cache(), closed at exit.
+    """
+    global _default_scraper
+    with _default_lock:
+        if _default_scraper is None:
+            _default_scraper = Scraper(cache=scrape_cache.get_cache())
+            atexit.register(_default_scraper.close)
+        return _default_scraper
+
+
+def scrape_urls(urls, **kwargs):
+    """
+    Scrape `urls` with the shared Scraper, or with a temporary one built
+    from `kwargs` when Scraper options are given.
+    """
+    if not kwargs:
+        return get_scraper().scrape_urls(urls)
+    with Scraper(**kwargs) as scraper:
+        return scraper.scrape_urls(urls)
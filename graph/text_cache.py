@@ -0,0 +1,72 @@
+"""
+Small persistent key -> text store for LLM outputs (cluster summaries,
+article digests) keyed by content hashes, so unchanged inputs never hit the
+API twice. Values are plain strings; callers JSON-encode structured data.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from graph.paths import CACHE_DIR
+from llm import tracing
+
+
+def content_hash(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update((part or "").encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class TextCache:
+    def __init__(self, namespace, path=None):
+        if path is None:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            path = os.path.join(CACHE_DIR, "text_cache.sqlite")
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                namespace TEXT, key TEXT, value TEXT, created_at REAL,
+                PRIMARY KEY (namespace, key)
+            )
+            """
+        )
+        self._db.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM entries WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                tracing.add("llm", cache_misses=1)
+                return None
+            self.hits += 1
+            tracing.add("llm", cache_hits=1)
+            return row[0]
+
+    def put(self, key, value):
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                (self.namespace, key, value, time.time()),
+            )
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            if value is not None:
+                self.put(key, value)
+        return value
@@ -0,0 +1,366 @@
+"""
+Shared, rate-limit-aware executor for every OpenAI chat and embedding call.
+
+All stages submit work here instead of calling their own OpenAI() client:
+
+- requests wait on per-model token buckets for requests/minute and
+  tokens/minute before they are sent;
+- a priority queue lets interactive work (drafting the answer) overtake
+  bulk enrichment (topic extraction, summaries);
+- 429s, timeouts, connection errors and 5xx are retried with exponential
+  backoff and full jitter, honouring Retry-After when the server sends it;
+- identical in-flight requests are coalesced onto one future;
+- stream() opens a streamed chat under the same limits and retries and
+  yields content deltas as they arrive;
+- each request is recorded as an "llm"/"embedding" span (queue wait,
+  retries, tokens, payload sizes) on the trace that submitted it.
+
+The underlying client is an ordinary OpenAI() (with its own retries turned
+off), so pointing OPENAI_BASE_URL at a local fake server exercises the
+whole path.
+"""
+
+import hashlib
+import itertools
+import json
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import Future
+from queue import PriorityQueue
+
+import openai
+from openai import OpenAI
+
+from llm import tracing
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_PIPELINE = 5
+PRIORITY_BACKGROUND = 10
+
+DEFAULT_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+DEFAULT_RPM = 500
+DEFAULT_TPM = 200_000
+# Fallback (requests/min, tokens/min) per model, used only when the
+# environment configures nothing for it (see model_limits).
+MODEL_LIMITS = {
+    "gpt-4o": (500, 30_000),
+    "gpt-4o-mini": (500, 200_000),
+    "text-embedding-3-large": (3_000, 1_000_000),
+    "text-embedding-3-small": (3_000, 1_000_000),
+}
+# Completion tokens assumed for TPM accounting when max_tokens is not set.
+DEFAULT_COMPLETION_ESTIMATE = 512
+
+MAX_RETRIES = 6
+BASE_DELAY = 1.0
+MAX_DELAY = 60.0
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+def _env_limit(name, model):
+    suffix = re.sub(r"[^A-Z0-9]+", "_", model.upper())
+    value = os.getenv(f"{name}_{suffix}") or os.getenv(name)
+    return int(value) if value else None
+
+
+def model_limits(model):
+    """
+    (requests/min, tokens/min) for a model: OPENAI_RPM_<MODEL> /
+    OPENAI_TPM_<MODEL> (e.g. OPENAI_TPM_GPT_4O), then OPENAI_RPM /
+    OPENAI_TPM, then MODEL_LIMITS, then the defaults.
+    """
+    rpm, tpm = MODEL_LIMITS.get(model, (DEFAULT_RPM, DEFAULT_TPM))
+    env_rpm, env_tpm = _env_limit("OPENAI_RPM", model), _env_limit("OPENAI_TPM", model)
+    return env_rpm or rpm, env_tpm or tpm
+
+
+def estimate_tokens(payload):
+    """
+    Rough prompt size (chars / 4) for TPM accounting.
+    """
+    if "messages" in payload:
+        chars = sum(len(str(m.get("content", ""))) for m in payload["messages"])
+        return chars // 4 + payload.get("max_tokens", DEFAULT_COMPLETION_ESTIMATE)
+    inputs = payload.get("input", "")
+    if isinstance(inputs, str):
+        inputs = [inputs]
+    return sum(len(str(t)) for t in inputs) // 4
+
+
+class TokenBucket:
+    """
+    Continuous-refill bucket: `rate_per_minute` units, burst up to one minute.
+    """
+
+    def __init__(self, rate_per_minute):
+        self.capacity = float(rate_per_minute)
+        self.rate = rate_per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount=1.0):
+        amount = min(float(amount), self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class _Job:
+    __slots__ = ("kind", "model", "payload", "future", "key", "tokens", "size", "trace", "submitted")
+
+    def __init__(self, kind, model, payload, key, tokens, size, trace):
+        self.kind = kind
+        self.model = model
+        self.payload = payload
+        self.future = Future()
+        self.key = key
+        self.tokens = tokens
+        self.size = size
+        self.trace = trace
+        self.submitted = time.perf_counter()
+
+
+class LLMExecutor:
+    def __init__(
+        self,
+        client=None,
+        max_concurrency=DEFAULT_MAX_CONCURRENCY,
+        model_limits=None,
+        max_retries=MAX_RETRIES,
+        base_delay=BASE_DELAY,
+        max_delay=MAX_DELAY,
+    ):
+        self.client = client or OpenAI(max_retries=0)
+        self.max_concurrency = max_concurrency
+        # Explicit per-model limits; everything else goes to model_limits()
+        self.model_limits = dict(model_limits or {})
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._queue = PriorityQueue()
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._buckets = {}
+        self._workers = []
+        self.stats = {
+            "submitted": 0,
+            "coalesced": 0,
+            "requests": 0,
+            "retries": 0,
+            "failures": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+        }
+
+    # --- submission ------------------------------------------------------- #
+
+    def submit(self, kind, model, payload, priority=PRIORITY_PIPELINE, coalesce=True):
+        """
+        Queue one request; kind is "chat" or "embedding". Returns a Future
+        resolving to the raw OpenAI response. Identical requests already in
+        flight share that request's future unless coalesce is False.
+        """
+        trace = tracing.capture()
+        body = None
+        if coalesce or trace is not None:
+            body = json.dumps([kind, model, payload], sort_keys=True, default=str).encode("utf-8")
+        key = hashlib.sha256(body).hexdigest() if coalesce else f"uncoalesced-{next(self._seq)}"
+        with self._lock:
+            self.stats["submitted"] += 1
+            existing = self._inflight.get(key)
+            if existing is not None:
+                self.stats["coalesced"] += 1
+                tracing.add("llm" if kind == "chat" else kind, trace, coalesced=1)
+                return existing.future
+            job = _Job(kind, model, payload, key, estimate_tokens(payload), len(body or b""), trace)
+            self._inflight[key] = job
+            self._ensure_workers()
+        self._queue.put((priority, next(self._seq), job))
+        return job.future
+
+    def chat(self, messages, model="gpt-4o", priority=PRIORITY_PIPELINE, **kwargs):
+        return self.submit("chat", model, dict(messages=messages, **kwargs), priority)
+
+    def embed(self, input, model, priority=PRIORITY_PIPELINE, **kwargs):
+        return self.submit("embedding", model, dict(input=input, **kwargs), priority)
+
+    def complete(self, prompt, model="gpt-4o", priority=PRIORITY_PIPELINE, **kwargs):
+        """
+        Blocking single-prompt chat; returns the message content.
+        """
+        messages = [{"role": "user", "content": prompt}]
+        response = self.chat(messages, model=model, priority=priority, **kwargs).result()
+        return response.choices[0].message.content
+
+    def stream(self, messages, model="gpt-4o", priority=PRIORITY_INTERACTIVE, **kwargs):
+        """
+        Streamed chat: yields content deltas as they arrive. The request
+        waits on the rate limits and is retried like any other until the
+        stream opens; a stream is never shared, so it is not coalesced.
+        """
+        payload = dict(messages=messages, stream=True, stream_options={"include_usage": True}, **kwargs)
+        response = self.submit("chat", model, payload, priority, coalesce=False).result()
+        # The request's span closed when the stream opened; tokens and
+        # streamed bytes are added to the trace as they arrive.
+        trace = tracing.capture()
+        received = 0
+        for chunk in response:
+            usage = getattr(chunk, "usage", None)
+            if usage is not None:
+                prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+                completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+                with self._lock:
+                    self.stats["prompt_tokens"] += prompt_tokens
+                    self.stats["completion_tokens"] += completion_tokens
+                tracing.add("llm", trace, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+            if chunk.choices:
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    received += len(delta.encode("utf-8"))
+                    yield delta
+        tracing.add("llm", trace, response_bytes=received)
+
+    # --- workers ---------------------------------------------------------- #
+
+    def _ensure_workers(self):
+        while len(self._workers) < self.max_concurrency:
+            worker = threading.Thread(target=self._work, name=f"llm-{len(self._workers)}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def _limits(self, model):
+        with self._lock:
+            buckets = self._buckets.get(model)
+            if buckets is None:
+                rpm, tpm = self.model_limits.get(model) or model_limits(model)
+                buckets = (TokenBucket(rpm), TokenBucket(tpm))
+                self._buckets[model] = buckets
+            return buckets
+
+    def _work(self):
+        while True:
+            _, _, job = self._queue.get()
+            try:
+                result = self._run(job)
+            except BaseException as exc:  # noqa: BLE001 - delivered via the future
+                with self._lock:
+                    self.stats["failures"] += 1
+                    self._inflight.pop(job.key, None)
+                job.future.set_exception(exc)
+            else:
+                with self._lock:
+                    self._inflight.pop(job.key, None)
+                job.future.set_result(result)
+
+    def _send(self, job):
+        if job.kind == "chat":
+            return self.client.chat.completions.create(model=job.model, **job.payload)
+        return self.client.embeddings.create(model=job.model, **job.payload)
+
+    def _run(self, job):
+        started = time.perf_counter()
+        attempt = 0
+        usage = response = None
+        try:
+            response, attempt = self._attempts(job)
+            usage = getattr(response, "usage", None)
+        except BaseException as exc:
+            self._trace(job, started, attempt, None, None, exc)
+            raise
+        self._trace(job, started, attempt, response, usage, None)
+        if usage is not None:
+            with self._lock:
+                self.stats["prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+                self.stats["completion_tokens"] += getattr(usage, "completion_tokens", 0) or 0
+        return response
+
+    def _attempts(self, job):
+        requests_bucket, tokens_bucket = self._limits(job.model)
+        attempt = 0
+        while True:
+            requests_bucket.acquire(1)
+            tokens_bucket.acquire(job.tokens)
+            try:
+                with self._lock:
+                    self.stats["requests"] += 1
+                return self._send(job), attempt
+            except RETRYABLE_ERRORS as exc:
+                if attempt >= self.max_retries:
+                    exc.attempts = attempt
+                    raise
+                attempt += 1
+                with self._lock:
+                    self.stats["retries"] += 1
+                time.sleep(self._backoff(attempt, exc))
+
+    def _trace(self, job, started, attempt, response, usage, error):
+        if job.trace is None:
+            return
+        now = time.perf_counter()
+        attempt = getattr(error, "attempts", attempt)
+        attrs = {
+            "model": job.model,
+            "queue_s": started - job.submitted,
+            "retries": attempt,
+            "request_bytes": job.size,
+        }
+        if job.payload.get("stream"):
+            attrs["stream"] = True
+        elif response is not None:
+            if job.kind == "chat":
+                attrs["response_bytes"] = sum(len((c.message.content or "").encode("utf-8")) for c in response.choices)
+            else:
+                attrs["items"] = len(response.data)
+                attrs["response_bytes"] = sum(4 * len(d.embedding) for d in response.data)
+        if usage is not None:
+            attrs["prompt_tokens"] = getattr(usage, "prompt_tokens", 0) or 0
+            attrs["completion_tokens"] = getattr(usage, "completion_tokens", 0) or 0
+        kind = "llm" if job.kind == "chat" else job.kind
+        tracing.record(kind, job.model, now - started, error=error, context=job.trace, **attrs)
+
+    def _backoff(self, attempt, exc):
+        """
+        Full-jitter exponential delay, or the server's Retry-After if longer.
+        """
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        response = getattr(exc, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        try:
+            delay = max(delay, float(retry_after))
+        except (TypeError, ValueError):
+            pass
+        return delay
+
+
+_default_executor = None
+_default_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Process-wide executor shared by every stage.
+    """
+    global _default_executor
+    with _default_lock:
+        if _default_executor is None:
+            _default_executor = LLMExecutor()
+        return _default_executor
@@ -0,0 +1,438 @@
+"""
+Per-run tracing: spans for workflow nodes and for every OpenAI, provider
+and scrape call made while they run.
+
+A Tracer is made current with activate(); span(), record() and add() write
+to the current tracer and do nothing when there is none, so instrumented
+code costs next to nothing outside a traced run. Work handed to other
+threads keeps its attribution by capturing the tracer when it is handed
+off: wrap(fn) for thread-pool tasks, capture() for objects that carry it
+(the LLM executor's jobs).
+
+Each span is a dict
+
+    {"id", "parent", "node", "kind", "name", "start", "duration_s",
+     "thread", "error", **attrs}
+
+where kind is "node", "step", "llm", "embedding", "provider" or "scrape".
+Besides the spans, every kind keeps running totals (calls, errors, seconds
+and the SUMMED_ATTRS: tokens, retries, cache hits, payload sizes), overall
+and per node, so summaries stay exact when MAX_SPANS drops spans.
+
+traced_node() wraps a LangGraph node so the run's trace continues from node
+to node. The spans stay in the Tracer, which this process keeps by trace_id
+(the MAX_TRACES most recent). AgentState["trace"] and the checkpoints only
+carry the to_state() summary: trace_id, totals per kind and per node, and the
+span count. A run resumed in another process continues the totals, but its
+earlier spans are gone. get_trace() resolves a summary to the full trace, and
+export_trace() writes it as Chrome trace-event JSON (chrome://tracing,
+Perfetto). NEWS_AGENT_PROFILE names nodes (comma-separated, or "all") to
+run under cProfile: the .prof file and the top functions by cumulative
+time are attached to the node's span.
+"""
+
+import contextvars
+import cProfile
+import functools
+import inspect
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from graph.paths import CACHE_DIR
+
+TRACING_ENABLED = os.getenv("NEWS_AGENT_TRACE", "1") != "0"
+PROFILE_NODES = {n.strip() for n in os.getenv("NEWS_AGENT_PROFILE", "").split(",") if n.strip()}
+PROFILE_DIR = os.getenv("NEWS_AGENT_PROFILE_DIR", os.path.join(CACHE_DIR, "profiles"))
+PROFILE_TOP = 20
+# Spans kept per run; later ones only update the totals.
+MAX_SPANS = 20_000
+# Runs whose spans this process keeps, most recently started last.
+MAX_TRACES = int(os.getenv("NEWS_AGENT_MAX_TRACES", "64"))
+
+SUMMED_ATTRS = (
+    "prompt_tokens",
+    "completion_tokens",
+    "retries",
+    "coalesced",
+    "cache_hits",
+    "cache_misses",
+    "items",
+    "request_bytes",
+    "response_bytes",
+)
+
+_tracer = contextvars.ContextVar("news_agent_tracer", default=None)
+_span = contextvars.ContextVar("news_agent_span", default=None)
+_node = contextvars.ContextVar("news_agent_node", default=None)
+
+_traces = OrderedDict()  # trace_id -> Tracer
+_traces_lock = threading.Lock()
+
+
+def _empty_totals():
+    return {"calls": 0, "errors": 0, "seconds": 0.0}
+
+
+def _accumulate(totals, calls, seconds, error, attrs):
+    totals["calls"] += calls
+    totals["seconds"] += seconds
+    if error:
+        totals["errors"] += 1
+    for key in SUMMED_ATTRS:
+        value = attrs.get(key)
+        if value:
+            totals[key] = totals.get(key, 0) + value
+
+
+class Tracer:
+    def __init__(self, trace_id=None):
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.spans = []
+        self.dropped = 0
+        self.totals = {}  # kind -> totals
+        self.nodes = {}  # node -> kind -> totals
+        self._next_id = 1
+        self._lock = threading.Lock()
+        with _traces_lock:
+            _traces[self.trace_id] = self
+            while len(_traces) > MAX_TRACES:
+                _traces.popitem(last=False)
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Continue a trace saved by to_dict or to_state (e.g. from a
+        checkpointed state): the live Tracer when this process still holds
+        it, else a new one carrying the saved totals.
+        """
+        if data and data.get("trace_id"):
+            with _traces_lock:
+                live = _traces.get(data["trace_id"])
+            if live is not None:
+                return live
+        tracer = cls(data.get("trace_id") if data else None)
+        if data:
+            tracer.spans = list(data.get("spans", []))
+            tracer.dropped = data.get("dropped_spans", 0)
+            tracer.totals = {k: dict(v) for k, v in data.get("totals", {}).items()}
+            tracer.nodes = {
+                node: {k: dict(v) for k, v in kinds.items()} for node, kinds in data.get("nodes", {}).items()
+            }
+            tracer._next_id = data.get("next_id", len(tracer.spans) + 1)
+        return tracer
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "trace_id": self.trace_id,
+                "spans": list(self.spans),
+                "dropped_spans": self.dropped,
+                "totals": {k: dict(v) for k, v in self.totals.items()},
+                "nodes": {node: {k: dict(v) for k, v in kinds.items()} for node, kinds in self.nodes.items()},
+                "next_id": self._next_id,
+            }
+
+    def to_state(self):
+        """
+        to_dict without the spans, for AgentState and checkpoints.
+        """
+        with self._lock:
+            return {
+                "trace_id": self.trace_id,
+                "span_count": len(self.spans),
+                "dropped_spans": self.dropped,
+                "totals": {k: dict(v) for k, v in self.totals.items()},
+                "nodes": {node: {k: dict(v) for k, v in kinds.items()} for node, kinds in self.nodes.items()},
+                "next_id": self._next_id,
+            }
+
+    def new_id(self):
+        with self._lock:
+            span_id = self._next_id
+            self._next_id += 1
+            return span_id
+
+    def add(self, kind, node=None, calls=0, seconds=0.0, error=None, **attrs):
+        with self._lock:
+            _accumulate(self.totals.setdefault(kind, _empty_totals()), calls, seconds, error, attrs)
+            by_kind = self.nodes.setdefault(node or "-", {})
+            _accumulate(by_kind.setdefault(kind, _empty_totals()), calls, seconds, error, attrs)
+
+    def record(self, kind, name, start, duration_s, parent=None, node=None, error=None, span_id=None, **attrs):
+        self.add(kind, node, calls=1, seconds=duration_s, error=error, **attrs)
+        span = {
+            "id": span_id or self.new_id(),
+            "parent": parent,
+            "node": node,
+            "kind": kind,
+            "name": name,
+            "start": start,
+            "duration_s": duration_s,
+            "thread": threading.current_thread().name,
+            "error": str(error) if error else None,
+        }
+        span.update(attrs)
+        with self._lock:
+            if len(self.spans) < MAX_SPANS:
+                self.spans.append(span)
+            else:
+                self.dropped += 1
+        return span
+
+
+def current():
+    return _tracer.get()
+
+
+def capture():
+    """
+    The current (tracer, parent span, node), for recording from another
+    thread later via record(..., context=...). None outside a traced run.
+    """
+    tracer = _tracer.get()
+    return (tracer, _span.get(), _node.get()) if tracer is not None else None
+
+
+@contextmanager
+def activate(tracer, parent=None, node=None):
+    tokens = (_tracer.set(tracer), _span.set(parent), _node.set(node))
+    try:
+        yield tracer
+    finally:
+        _node.reset(tokens[2])
+        _span.reset(tokens[1])
+        _tracer.reset(tokens[0])
+
+
+def wrap(fn):
+    """
+    fn bound to the caller's trace context, for submitting to thread pools
+    (which do not inherit context variables).
+    """
+    context = capture()
+    if context is None:
+        return fn
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        with activate(*context):
+            return fn(*args, **kwargs)
+
+    return run
+
+
+def add(kind, context=None, **counts):
+    """
+    Add counts (cache hits, tokens, ...) to a kind's totals without a span.
+    """
+    context = context or capture()
+    if context is not None:
+        tracer, _, node = context
+        tracer.add(kind, node, **counts)
+
+
+def record(kind, name, duration_s, start=None, error=None, context=None, **attrs):
+    """
+    Record a finished call. `start` is a time.time() timestamp (defaults to
+    now - duration_s); context is a capture() from the submitting thread.
+    """
+    context = context or capture()
+    if context is None:
+        return None
+    tracer, parent, node = context
+    if start is None:
+        start = time.time() - duration_s
+    return tracer.record(kind, name, start, duration_s, parent=parent, node=node, error=error, **attrs)
+
+
+@contextmanager
+def span(kind, name, **attrs):
+    """
+    Time the enclosed block as a span; calls recorded inside it become its
+    children. Yields a dict the block can add attributes to.
+    """
+    tracer = _tracer.get()
+    if tracer is None:
+        yield attrs
+        return
+    span_id = tracer.new_id()
+    parent, node = _span.get(), _node.get()
+    token = _span.set(span_id)
+    start, started = time.time(), time.perf_counter()
+    error = None
+    try:
+        yield attrs
+    except BaseException as exc:
+        error = exc
+        raise
+    finally:
+        _span.reset(token)
+        tracer.record(
+            kind, name, start, time.perf_counter() - started,
+            parent=parent, node=node, error=error, span_id=span_id, **attrs
+        )
+
+
+# --- profiling ------------------------------------------------------------ #
+
+
+def _profile_wanted(name, profile):
+    if profile is not None:
+        return bool(profile)
+    return name in PROFILE_NODES or "all" in PROFILE_NODES
+
+
+def _profile_report(profiler, name, trace_id):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"{name}-{trace_id[:12]}-{int(time.time())}.prof")
+    profiler.dump_stats(path)
+    out = io.StringIO()
+    stats = pstats.Stats(profiler, stream=out).sort_stats("cumulative")
+    top = []
+    for func in stats.fcn_list[:PROFILE_TOP]:
+        calls, _, tottime, cumtime, _ = stats.stats[func]
+        top.append({
+            "function": f"{func[0]}:{func[1]}({func[2]})",
+            "calls": calls,
+            "tottime_s": round(tottime, 6),
+            "cumtime_s": round(cumtime, 6),
+        })
+    return path, top
+
+
+# --- workflow nodes ------------------------------------------------------- #
+
+
+def traced_node(name, fn, profile=None):
+    """
+    Wrap a LangGraph node (sync or async): the node runs as a "node" span
+    of the run's trace, whose summary is carried in state["trace"],
+    optionally under cProfile (profile=True, or the node listed in
+    NEWS_AGENT_PROFILE).
+    """
+    profiled = _profile_wanted(name, profile)
+    if not TRACING_ENABLED and not profiled:
+        return fn
+
+    def start(state):
+        tracer = Tracer.from_dict(state.get("trace"))
+        profiler = cProfile.Profile() if profiled else None
+        return tracer, profiler
+
+    def finish(tracer, profiler, attrs):
+        profiler.disable()
+        attrs["profile"], attrs["profile_top"] = _profile_report(profiler, name, tracer.trace_id)
+
+    if inspect.iscoroutinefunction(fn):
+
+        @functools.wraps(fn)
+        async def arun(state):
+            tracer, profiler = start(state)
+            with activate(tracer, node=name), span("node", name) as attrs:
+                if profiler is not None:
+                    profiler.enable()
+                try:
+                    result = await fn(state)
+                finally:
+                    if profiler is not None:
+                        finish(tracer, profiler, attrs)
+            result["trace"] = tracer.to_state()
+            return result
+
+        return arun
+
+    @functools.wraps(fn)
+    def run(state):
+        tracer, profiler = start(state)
+        with activate(tracer, node=name), span("node", name) as attrs:
+            if profiler is not None:
+                profiler.enable()
+            try:
+                result = fn(state)
+            finally:
+                if profiler is not None:
+                    finish(tracer, profiler, attrs)
+        result["trace"] = tracer.to_state()
+        return result
+
+    return run
+
+
+# --- reporting ------------------------------------------------------------ #
+
+
+def get_trace(trace):
+    """
+    The full trace dict for a trace summary (e.g. state["trace"]): its spans
+    come from the live Tracer, or are empty when this process no longer
+    holds it. Full trace dicts are returned as they are.
+    """
+    if not trace or "spans" in trace:
+        return trace
+    with _traces_lock:
+        tracer = _traces.get(trace["trace_id"])
+    return tracer.to_dict() if tracer is not None else dict(trace, spans=[])
+
+
+def summary(trace):
+    """
+    Compact view of a trace dict or summary: totals per kind and, per node,
+    its wall time (summed over runs) and totals per kind.
+    """
+    if not trace:
+        return {}
+    spans = trace["span_count"] if "span_count" in trace else len(trace.get("spans", []))
+    return {
+        "trace_id": trace["trace_id"],
+        "spans": spans,
+        "dropped_spans": trace.get("dropped_spans", 0),
+        "totals": trace.get("totals", {}),
+        "nodes": {
+            node: {"seconds": kinds["node"]["seconds"] if "node" in kinds else None, "calls": kinds}
+            for node, kinds in trace.get("nodes", {}).items()
+        },
+    }
+
+
+def to_chrome_trace(trace):
+    """
+    Chrome trace-event form of a trace (dict or summary): one complete
+    ("X") event per span on its recording thread, attributes under args.
+    """
+    trace = get_trace(trace)
+    spans = (trace or {}).get("spans", [])
+    origin = min((s["start"] for s in spans), default=0.0)
+    threads = {}
+    events = []
+    for s in spans:
+        tid = threads.setdefault(s["thread"], len(threads) + 1)
+        args = {k: v for k, v in s.items() if k not in ("kind", "name", "start", "duration_s", "thread")}
+        events.append({
+            "name": s["name"],
+            "cat": s["kind"],
+            "ph": "X",
+            "ts": (s["start"] - origin) * 1e6,
+            "dur": s["duration_s"] * 1e6,
+            "pid": 1,
+            "tid": tid,
+            "args": args,
+        })
+    for thread, tid in threads.items():
+        events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": thread}})
+    return {"traceEvents": events, "otherData": {"trace_id": (trace or {}).get("trace_id"), "summary": summary(trace)}}
+
+
+def export_trace(trace, path):
+    """
+    Write a trace (e.g. state["trace"]) as Chrome trace-event JSON.
+    """
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(to_chrome_trace(trace), fh, default=str)
+    return path
@@ -1,6 +1,6 @@
 from eventregistry import EventRegistry, QueryArticlesIter, QueryItems
 from newsdataapi import NewsDataAPIClient
-from finlight_client import FinlightApi
+from finlight_client import ApiConfig, FinlightApi
 from finlight_client.models import GetArticlesParams
 import http.client, urllib.parse
 import json
@@ -39,7 +39,7 @@ def fetch_news_data(keyword: str, max_items: int = 10):
     Run a single-query search in news data api for a given keyword.
     Returns a list of standardized article dictionaries.
     """
-    api = NewsDataApiClient(apikey='YOUR_API_KEY')
+    api = NewsDataAPIClient(apikey='YOUR_API_KEY')
 
     response = api.latest_api(q=keyword, max_results = max_items)
     results = []
@@ -86,12 +86,12 @@ def fetch_finflight(keyword: str, max_items: int = 10):
     
     return results
 
-def fetch_the_news_api(keyword : str, max_items: int = 10):
+def fetch_the_news_api(keyword : str, max_items: int = 10, timeout: float = 10.0):
     """
-    Run a single-query search in fin flight api for a given keyword.
+    Run a single-query search in the news api for a given keyword.
     Returns a list of standardized article dictionaries.
     """
-    conn = http.client.HTTPSConnection('api.thenewsapi.com')
+    conn = http.client.HTTPSConnection('api.thenewsapi.com', timeout=timeout)
 
     params = urllib.parse.urlencode({
         'api_token': 'YOUR_API_TOKEN',
@@ -99,16 +99,16 @@ def fetch_the_news_api(keyword : str, max_items: int = 10):
         'limit': max_items,
         })
 
-    conn.request('GET', '/v1/news/all?{}'.format(params))
-
-    res = conn.getresponse()
-    data = res.read()
-
-    print(data.decode('utf-8'))
+    try:
+        conn.request('GET', '/v1/news/all?{}'.format(params))
+        res = conn.getresponse()
+        data = json.loads(res.read().decode('utf-8'))
+    finally:
+        conn.close()
 
     results = []
     
-    for art in data:
+    for art in data.get("data", []):
         results.append({
             "title": art.get("title"),
             "url": art.get("url"),
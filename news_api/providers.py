@@ -0,0 +1,326 @@
+"""
+Common adapter interface over the api_calls fetchers, with a shared
+response cache and a circuit breaker per provider.
+
+Every provider is a ProviderAdapter: search(keyword, max_items, **params)
+returns standardized article dicts. ProviderClient wraps an adapter and is
+what the workflow calls (get_clients / fetchers()):
+
+- ResponseCache: responses keyed by (provider, keyword, params) in SQLite
+  under NEWS_AGENT_CACHE_DIR. Within `ttl` a hit is served as is; up to
+  `stale_ttl` after that it is served immediately while one background
+  refresh updates it (stale-while-revalidate). Older entries are misses.
+- CircuitBreaker: `failure_threshold` consecutive failures (errors, or
+  calls slower than `slow_call_s`) open the breaker and the provider is
+  skipped, served only from stale cache, for `cooldown` seconds, doubling
+  up to MAX_COOLDOWN while probes keep failing. After the cooldown one
+  probe call is let through (half-open); success closes the breaker.
+  Breaker state lives in the same database, so a broken provider is not
+  retried by every short-lived process either.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from graph.paths import CACHE_DIR
+from llm import tracing
+from news_api import api_calls
+
+DEFAULT_TTL = 10 * 60
+DEFAULT_STALE_TTL = 60 * 60
+FAILURE_THRESHOLD = 3
+SLOW_CALL_SECONDS = 15.0
+DEFAULT_COOLDOWN = 60.0
+MAX_COOLDOWN = 15 * 60.0
+
+
+class ProviderUnavailable(RuntimeError):
+    """
+    Raised instead of calling a provider whose breaker is open and that has
+    no cached response to fall back on.
+    """
+
+
+class ProviderAdapter:
+    """
+    One news provider. Subclasses implement search().
+    """
+
+    name = "provider"
+
+    def search(self, keyword: str, max_items: int = 10, **params) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+
+class FunctionAdapter(ProviderAdapter):
+    """
+    Adapter over a fetch_* function in api_calls, looked up at call time so
+    patched fetchers are picked up.
+    """
+
+    def __init__(self, name: str, function_name: str):
+        self.name = name
+        self.function_name = function_name
+
+    def search(self, keyword: str, max_items: int = 10, **params) -> List[Dict[str, Any]]:
+        fn = getattr(api_calls, self.function_name)
+        return list(fn(keyword, max_items=max_items, **params) or [])
+
+
+ADAPTERS = [
+    FunctionAdapter("event_registry", "fetch_event_registry"),
+    FunctionAdapter("news_data", "fetch_news_data"),
+    FunctionAdapter("finflight", "fetch_finflight"),
+    FunctionAdapter("the_news_api", "fetch_the_news_api"),
+]
+
+
+def cache_key(provider: str, keyword: str, params: Dict[str, Any]) -> str:
+    payload = json.dumps([provider, keyword.strip().lower(), params], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path=None, ttl=DEFAULT_TTL, stale_ttl=DEFAULT_STALE_TTL):
+        if path is None:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            path = os.path.join(CACHE_DIR, "providers.sqlite")
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                provider TEXT,
+                keyword TEXT,
+                articles TEXT,
+                fetched_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS breakers (
+                provider TEXT PRIMARY KEY,
+                failures INTEGER,
+                opened_until REAL,
+                cooldown REAL
+            );
+            """
+        )
+        self._db.commit()
+        self._stats = {"lookups": 0, "hits": 0, "stale_hits": 0, "misses": 0, "stores": 0, "refreshes": 0}
+
+    def lookup(self, key: str):
+        """
+        Returns (articles, state) with state "fresh", "stale" or "miss"
+        (articles None).
+        """
+        with self._lock:
+            self._stats["lookups"] += 1
+            row = self._db.execute("SELECT articles, fetched_at FROM responses WHERE key = ?", (key,)).fetchone()
+            age = time.time() - row[1] if row else None
+            if row is None or age > self.ttl + self.stale_ttl:
+                self._stats["misses"] += 1
+                return None, "miss"
+            state = "fresh" if age <= self.ttl else "stale"
+            self._stats["hits" if state == "fresh" else "stale_hits"] += 1
+            return json.loads(row[0]), state
+
+    def store(self, key: str, provider: str, keyword: str, articles: List[Dict[str, Any]]) -> None:
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (key, provider, keyword, json.dumps(articles, default=str), time.time()),
+            )
+            self._stats["stores"] += 1
+
+    def count_refresh(self) -> None:
+        with self._lock:
+            self._stats["refreshes"] += 1
+
+    def purge_expired(self) -> int:
+        with self._lock, self._db:
+            cur = self._db.execute(
+                "DELETE FROM responses WHERE fetched_at < ?", (time.time() - self.ttl - self.stale_ttl,)
+            )
+            return cur.rowcount
+
+    def load_breaker(self, provider: str):
+        with self._lock:
+            return self._db.execute(
+                "SELECT failures, opened_until, cooldown FROM breakers WHERE provider = ?", (provider,)
+            ).fetchone()
+
+    def save_breaker(self, provider: str, failures: int, opened_until: float, cooldown: float) -> None:
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO breakers VALUES (?, ?, ?, ?)", (provider, failures, opened_until, cooldown)
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        served = stats["hits"] + stats["stale_hits"]
+        stats["hit_rate"] = served / stats["lookups"] if stats["lookups"] else 0.0
+        return stats
+
+    def close(self) -> None:
+        self._db.close()
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        provider: str,
+        store: Optional[ResponseCache] = None,
+        failure_threshold: int = FAILURE_THRESHOLD,
+        slow_call_s: float = SLOW_CALL_SECONDS,
+        cooldown: float = DEFAULT_COOLDOWN,
+        max_cooldown: float = MAX_COOLDOWN,
+    ):
+        self.provider = provider
+        self.store = store
+        self.failure_threshold = failure_threshold
+        self.slow_call_s = slow_call_s
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._lock = threading.Lock()
+        self._probing = False
+        saved = store.load_breaker(provider) if store is not None else None
+        self.failures, self.opened_until, self.cooldown = saved or (0, 0.0, cooldown)
+
+    @property
+    def state(self) -> str:
+        if self.failures < self.failure_threshold:
+            return "closed"
+        return "open" if time.time() < self.opened_until else "half_open"
+
+    def allow(self) -> bool:
+        """
+        Whether a call may go out now. In half-open state only one probe is
+        let through at a time.
+        """
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record(self, ok: bool, seconds: float) -> None:
+        with self._lock:
+            was_probe, self._probing = self._probing, False
+            if ok and seconds <= self.slow_call_s:
+                self.failures, self.opened_until, self.cooldown = 0, 0.0, self.base_cooldown
+            else:
+                self.failures += 1
+                if self.failures >= self.failure_threshold:
+                    if was_probe:
+                        self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+                    self.opened_until = time.time() + self.cooldown
+                    print(f"[providers:{self.provider}] circuit open for {self.cooldown:.0f}s")
+            if self.store is not None:
+                self.store.save_breaker(self.provider, self.failures, self.opened_until, self.cooldown)
+
+
+class ProviderClient:
+    """
+    An adapter behind the response cache and its circuit breaker. fetch()
+    has the api_calls fetcher signature.
+    """
+
+    def __init__(self, adapter: ProviderAdapter, cache: ResponseCache, breaker: CircuitBreaker):
+        self.adapter = adapter
+        self.cache = cache
+        self.breaker = breaker
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        return self.adapter.name
+
+    def _call(self, keyword: str, max_items: int, params: Dict[str, Any], key: str) -> List[Dict[str, Any]]:
+        started = time.monotonic()
+        try:
+            articles = self.adapter.search(keyword, max_items=max_items, **params)
+        except Exception:
+            self.breaker.record(False, time.monotonic() - started)
+            raise
+        self.breaker.record(True, time.monotonic() - started)
+        self.cache.store(key, self.name, keyword, articles)
+        return articles
+
+    def _refresh(self, keyword: str, max_items: int, params: Dict[str, Any], key: str) -> None:
+        with self._lock:
+            if key in self._refreshing or not self.breaker.allow():
+                return
+            self._refreshing.add(key)
+        self.cache.count_refresh()
+
+        def run():
+            try:
+                self._call(keyword, max_items, params, key)
+            except Exception as exc:  # noqa: BLE001 - the stale copy stays in use
+                print(f"[providers:{self.name}] background refresh failed: {exc}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=run, name=f"refresh-{self.name}", daemon=True).start()
+
+    def fetch(self, keyword: str, max_items: int = 10, **params) -> List[Dict[str, Any]]:
+        key = cache_key(self.name, keyword, dict(params, max_items=max_items))
+        articles, state = self.cache.lookup(key)
+        if state == "fresh":
+            tracing.add("provider", cache_hits=1)
+            return articles
+        if state == "stale":
+            tracing.add("provider", cache_hits=1)
+            self._refresh(keyword, max_items, params, key)
+            return articles
+
+        tracing.add("provider", cache_misses=1)
+        if not self.breaker.allow():
+            raise ProviderUnavailable(f"{self.name} circuit open until {time.ctime(self.breaker.opened_until)}")
+        return self._call(keyword, max_items, params, key)
+
+
+_default_clients = None
+_default_lock = threading.Lock()
+
+
+def get_clients() -> List[ProviderClient]:
+    """
+    Process-wide ProviderClient per adapter in ADAPTERS, sharing one cache.
+    """
+    global _default_clients
+    with _default_lock:
+        if _default_clients is None:
+            cache = ResponseCache()
+            _default_clients = [
+                ProviderClient(adapter, cache, CircuitBreaker(adapter.name, store=cache)) for adapter in ADAPTERS
+            ]
+        return _default_clients
+
+
+def fetchers() -> List[tuple]:
+    """
+    (name, fetch) pairs for the workflow, in provider order.
+    """
+    return [(client.name, client.fetch) for client in get_clients()]
+
+
+def stats() -> Dict[str, Any]:
+    clients = get_clients()
+    return {
+        "cache": clients[0].cache.stats() if clients else {},
+        "breakers": {c.name: {"state": c.breaker.state, "failures": c.breaker.failures} for c in clients},
+    }
@@ -1,22 +1,91 @@
-from llama_index.core import Document, VectorStoreIndex
-from llama_index.embeddings.openai import OpenAIEmbedding
+import numpy as np
 
+from graph import embeddings
+from graph.article_store import article_cosine
 
-def rerank_articles(chunks, query, top_k=50):
+
+def _normalize(X):
+    X = np.asarray(X, dtype=np.float32)
+    norms = np.linalg.norm(X, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return X / norms
+
+
+def top_k_indices(scores, k):
+    """
+    Indices of the k highest scores, best first, via partial selection.
+    """
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+def mmr_select(query_vec, vectors, k, lambda_=0.7):
     """
-    Retrieve the top-k relevant text chunks via vector similarity (cosine).
+    Maximal marginal relevance: greedily pick up to k rows that are close to
+    the query but not to rows already picked (lambda_=1 is plain cosine
+    ranking). Returns row indices in pick order.
     """
+    X = _normalize(vectors)
+    if not len(X) or k <= 0:
+        return []
+    relevance = X @ _normalize(query_vec)
+    redundancy = np.full(len(X), -np.inf, dtype=np.float32)
+    picked = np.zeros(len(X), dtype=bool)
+    order = []
+    for _ in range(min(k, len(X))):
+        scores = relevance if not order else lambda_ * relevance - (1 - lambda_) * redundancy
+        scores = np.where(picked, -np.inf, scores)
+        i = int(np.argmax(scores))
+        order.append(i)
+        picked[i] = True
+        redundancy = np.maximum(redundancy, X @ X[i])
+    return order
+
+
+def rank_clusters_by_embedding(clusters, query, top_k=None):
+    """
+    Rank cluster dicts against the query using the vectors they already
+    carry: the summary embedding and their articles' embeddings (all from
+    the one configured model). Only the query is embedded.
+
+    score = 0.5 * cos(query, summary) + 0.5 * max cos(query, article),
+    using whichever part is available. Returns the clusters best first,
+    each annotated with "relevance".
+    """
+    if not clusters:
+        return []
+
+    service = embeddings.get_service()
+    query_vec = _normalize(service.embed_one(query))
+
+    # Clusters built before embeddings were stored get theirs from the cache
+    missing = [c for c in clusters if c.get("embedding") is None]
+    if missing:
+        for c, vec in zip(missing, service.embed([c.get("summary", "") for c in missing])):
+            c["embedding"] = vec
 
-    # 1. Convert each chunk into a LlamaIndex Document
-    documents = [Document(page_content=chunk) for chunk in chunks]
+    summary_scores = _normalize(np.stack([np.asarray(c["embedding"], dtype=np.float32) for c in clusters])) @ query_vec
 
-    # 2. Build an in-memory vector index using OpenAI embeddings
-    embed_model = OpenAIEmbedding(model="text-embedding-3-small")
-    index = VectorStoreIndex.from_documents(documents, embed_model=embed_model)
+    # One cosine pass over every article of every cluster, read straight from
+    # the shared (possibly quantized) embedding matrix when there is one
+    owners, members = [], []
+    for k, c in enumerate(clusters):
+        for art in c.get("articles") or []:
+            vec = art.get("embedding")
+            if vec is not None and len(vec) == len(query_vec):
+                owners.append(k)
+                members.append(art)
+    article_best = np.full(len(clusters), -np.inf, dtype=np.float32)
+    if members:
+        np.maximum.at(article_best, np.asarray(owners), article_cosine(members, query_vec))
 
-    # 3. Retrieve top-k nodes via cosine similarity
-    retriever = index.as_retriever(similarity_top_k=min(top_k, len(documents)))
-    retrieved_nodes = retriever.retrieve(query)
+    scores = np.where(np.isfinite(article_best), 0.5 * summary_scores + 0.5 * article_best, summary_scores)
 
-    # 4. Return ranked text chunks
-    return [n.node.get_content() for n in retrieved_nodes]
\ No newline at end of file
+    ranked = []
+    for i in top_k_indices(scores, top_k or len(clusters)):
+        clusters[i]["relevance"] = float(scores[i])
+        ranked.append(clusters[i])
+    return ranked
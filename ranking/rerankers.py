@@ -0,0 +1,257 @@
+"""
+Pluggable cheap-to-expensive cluster reranking.
+
+A MultiStageReranker runs a list of (stage, keep) pairs: each stage scores
+the clusters that survived the previous one and only the best `keep` move
+on. The default pipeline is
+
+1. EmbeddingStage      cosine against stored vectors (one query embedding)
+2. CrossEncoderStage   optional local sentence-transformers cross-encoder,
+                       loaded from RERANKER_MODEL_PATH
+3. LLMJudgeStage       one batched LLM call over the survivors; clusters
+                       scored below its threshold are dropped
+
+Stage scores are cached per (stage, query, cluster content hash), so asking
+the same question over unchanged clusters costs nothing.
+"""
+
+import json
+import os
+import re
+import threading
+
+import numpy as np
+
+from graph.text_cache import TextCache, content_hash
+from llm.executor import PRIORITY_INTERACTIVE, get_executor
+from ranking.ranking_articles import rank_clusters_by_embedding, top_k_indices
+
+try:
+    from sentence_transformers import CrossEncoder
+except ImportError:  # optional stage
+    CrossEncoder = None
+
+CROSS_ENCODER_PATH = os.getenv("RERANKER_MODEL_PATH")
+
+DEFAULT_PREFILTER_K = 20
+DEFAULT_CROSS_ENCODER_K = 10
+DEFAULT_LLM_K = 8
+# LLM judge scores are 0-10; below this a cluster counts as irrelevant.
+DEFAULT_LLM_THRESHOLD = 4.0
+LLM_SUMMARY_CHARS = 1500
+
+_score_cache = None
+_score_lock = threading.Lock()
+
+
+def _cache():
+    global _score_cache
+    with _score_lock:
+        if _score_cache is None:
+            _score_cache = TextCache("rerank_scores")
+        return _score_cache
+
+
+def cluster_content_hash(cluster):
+    """
+    Stable identity of a cluster's content: its summary plus its articles'
+    text hashes, independent of cid or order.
+    """
+    if "content_hash" not in cluster:
+        texts = sorted(content_hash(a.get("text") or a.get("full_text") or "") for a in cluster.get("articles") or [])
+        cluster["content_hash"] = content_hash(cluster.get("summary", ""), *texts)
+    return cluster["content_hash"]
+
+
+def _as_scores(values, n):
+    if values is None:
+        return np.full(n, np.nan, dtype=np.float32)
+    return np.asarray([np.nan if v is None else v for v in values], dtype=np.float32)
+
+
+class RerankStage:
+    """
+    Base stage: subclasses implement _score(query, clusters) -> scores,
+    with None for clusters the stage could not score (or None for the whole
+    batch). Unscored clusters come back as NaN and are never cached.
+    `cache_id` must change whenever the stage's scoring changes.
+    """
+
+    name = "stage"
+    cache_id = "stage"
+    cacheable = True
+
+    def score(self, query, clusters):
+        if not self.cacheable:
+            return _as_scores(self._score(query, clusters), len(clusters))
+
+        cache = _cache()
+        keys = [content_hash(self.cache_id, query, cluster_content_hash(c)) for c in clusters]
+        scores = np.zeros(len(clusters), dtype=np.float32)
+        missing = []
+        for k, key in enumerate(keys):
+            cached = cache.get(key)
+            if cached is None:
+                missing.append(k)
+            else:
+                scores[k] = float(cached)
+
+        if missing:
+            fresh = _as_scores(self._score(query, [clusters[k] for k in missing]), len(missing))
+            for k, value in zip(missing, fresh):
+                scores[k] = value
+                if not np.isnan(value):
+                    cache.put(keys[k], repr(float(value)))
+        return scores
+
+    def _score(self, query, clusters):
+        raise NotImplementedError
+
+
+class EmbeddingStage(RerankStage):
+    """
+    Cosine against the clusters' stored summary/article embeddings. Cheap
+    enough that caching is pointless.
+    """
+
+    name = "embedding"
+    cacheable = False
+
+    def _score(self, query, clusters):
+        rank_clusters_by_embedding(clusters, query)
+        return [c["relevance"] for c in clusters]
+
+
+class CrossEncoderStage(RerankStage):
+    name = "cross_encoder"
+    _models = {}
+    _lock = threading.Lock()
+
+    def __init__(self, model_path=CROSS_ENCODER_PATH, batch_size=16):
+        self.model_path = model_path
+        self.batch_size = batch_size
+        self.cache_id = f"cross_encoder:{model_path}"
+
+    @property
+    def available(self):
+        return CrossEncoder is not None and bool(self.model_path)
+
+    def _model(self):
+        with self._lock:
+            model = self._models.get(self.model_path)
+            if model is None:
+                model = CrossEncoder(self.model_path)
+                self._models[self.model_path] = model
+            return model
+
+    def _score(self, query, clusters):
+        pairs = [(query, c.get("summary", "")) for c in clusters]
+        return self._model().predict(pairs, batch_size=self.batch_size)
+
+
+class LLMJudgeStage(RerankStage):
+    """
+    Scores all candidates 0-10 in one completion.
+    """
+
+    name = "llm"
+
+    def __init__(self, model="gpt-4o-mini", threshold=DEFAULT_LLM_THRESHOLD):
+        self.model = model
+        self.threshold = threshold
+        self.cache_id = f"llm_judge:v1:{model}"
+
+    def _score(self, query, clusters):
+        blocks = [
+            f"[{k}] {c.get('summary', '')[:LLM_SUMMARY_CHARS]}\n"
+            for k, c in enumerate(clusters)
+        ]
+        prompt = f"""
+User query: "{query}"
+
+Rate how relevant each story cluster below is to the query, from 0 (unrelated)
+to 10 (directly answers it).
+
+Clusters:
+{''.join(blocks)}
+Return ONLY a JSON object mapping each cluster number to its score.
+"""
+        raw = get_executor().complete(prompt.strip(), model=self.model, priority=PRIORITY_INTERACTIVE)
+        match = re.search(r"\{.*\}", raw or "", re.S)
+        try:
+            parsed = json.loads(match.group(0)) if match else None
+        except ValueError:
+            parsed = None
+        if not isinstance(parsed, dict):
+            print(f"[rerank:{self.name}] unparseable judgment, keeping the previous order")
+            return None
+        return [_parse_score(parsed.get(str(k))) for k in range(len(clusters))]
+
+
+def _parse_score(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class MultiStageReranker:
+    def __init__(self, stages):
+        """
+        stages: list of (RerankStage, keep) applied in order.
+        """
+        self.stages = stages
+
+    def rerank(self, query, clusters, k=None):
+        """
+        Returns surviving clusters best first (at most k), each annotated
+        with "rerank_scores" per stage, plus per-stage candidate counts.
+        """
+        candidates = list(clusters)
+        counts = {}
+        for stage, keep in self.stages:
+            counts[stage.name] = len(candidates)
+            if not candidates:
+                break
+            scores = stage.score(query, candidates)
+            scored = ~np.isnan(scores)
+            if not scored.any():
+                # Nothing usable from this stage: keep the previous order
+                continue
+            for c, s, ok in zip(candidates, scores, scored):
+                if ok:
+                    c.setdefault("rerank_scores", {})[stage.name] = float(s)
+
+            # Clusters the stage could not score follow the scored ones in
+            # their previous order and are not held to the threshold
+            order = list(top_k_indices(np.where(scored, scores, -np.inf), int(scored.sum())))
+            order += [i for i in range(len(candidates)) if not scored[i]]
+            threshold = getattr(stage, "threshold", None)
+            candidates = [
+                candidates[i] for i in order[: keep or len(candidates)]
+                if threshold is None or not scored[i] or scores[i] >= threshold
+            ]
+
+        self.last_counts = counts
+        return candidates[:k] if k else candidates
+
+
+def default_reranker(
+    prefilter_k=DEFAULT_PREFILTER_K,
+    cross_encoder_k=DEFAULT_CROSS_ENCODER_K,
+    llm_k=DEFAULT_LLM_K,
+    cross_encoder_path=CROSS_ENCODER_PATH,
+    llm_model="gpt-4o-mini",
+    llm_threshold=DEFAULT_LLM_THRESHOLD,
+):
+    """
+    Embedding prefilter -> (cross-encoder if a local model is configured)
+    -> single batched LLM judgment. Set llm_k=0 to skip the LLM stage.
+    """
+    stages = [(EmbeddingStage(), prefilter_k)]
+    cross = CrossEncoderStage(cross_encoder_path)
+    if cross.available:
+        stages.append((cross, cross_encoder_k))
+    if llm_k:
+        stages.append((LLMJudgeStage(llm_model, llm_threshold), llm_k))
+    return MultiStageReranker(stages)
@@ -1,79 +1,124 @@
-import json
-from openai import OpenAI
-from llama_index.core import Document
-from llama_index.core.node_parser import SimpleNodeParser
-from llama_index.core.postprocessor import LLMRerank
-from llama_index.llms.openai import OpenAI as LlamaOpenAI
+import re
+import time
 
-client = OpenAI()
+import numpy as np
 
+from graph import embeddings
+from llm.executor import PRIORITY_INTERACTIVE, get_executor
+from ranking.ranking_articles import mmr_select
+from ranking.rerankers import default_reranker
 
-def retrieve_top_k_clusters(query, clusters, k=8):
+
+def retrieve_top_k_clusters(query, clusters, k=8, reranker=None):
     """
-    Use LlamaIndex's LLMRerank to order clusters by relevance to the query.
+    Order clusters by relevance with the tiered reranker: embedding
+    prefilter, optional local cross-encoder, then one batched LLM judgment
+    that also drops irrelevant clusters.
     """
+    reranker = reranker or default_reranker(llm_k=k)
+    return reranker.rerank(query, clusters, k=k)
 
-    documents = [
-        Document(text=c["summary"], metadata={"cid": c["cid"]})
-        for c in clusters
-    ]
-
-    parser = SimpleNodeParser.from_defaults()
-    nodes = parser.get_nodes_from_documents(documents)
 
-    reranker = LLMRerank(
-        top_n=min(k, len(nodes)),
-        choice_batch_size=5,
-        llm=LlamaOpenAI(model="gpt-4o-mini"),
-    )
-    reranked = reranker.postprocess_nodes(nodes, query_str=query)
+NO_ARTICLES_ANSWER = "No relevant articles found."
 
-    cid_to_cluster = {c["cid"]: c for c in clusters}
-    ordered = []
-    for n in reranked:
-        cid = n.node.metadata.get("cid")
-        if cid in cid_to_cluster:
-            ordered.append(cid_to_cluster[cid])
+# Evidence packed into the answer prompt, in tokens of the answering model.
+ANSWER_CONTEXT_TOKENS = 6000
+ARTICLE_HEADER_TOKENS = 40
+MAX_EVIDENCE_CHUNKS = 64
+MMR_LAMBDA = 0.7
+# Lead used for articles that have no chunk index (e.g. older stores).
+LEAD_CHARS = 1200
 
+CITATION_RE = re.compile(r"\[CID (\w+)(?:/A(\d+))?\]")
+# Prefixes of a citation tag still being generated, e.g. "[CI" or "[CID 3/A".
+_PARTIAL_CITATION_RE = re.compile(r"\[(C(I(D( (\w+(/(A\d*)?)?)?)?)?)?)?$")
 
-    if len(ordered) < len(clusters):
-        remaining = [c for c in clusters if c["cid"] not in {cl["cid"] for cl in ordered}]
-        ordered.extend(remaining)
 
-    return ordered[:k]
+def _candidate_passages(filtered_clusters):
+    """
+    Every evidence passage the clusters offer, in document order:
+    (cluster position, article number, chunk position, text, vector).
+    Articles without a chunk index contribute their lead as one passage.
+    """
+    passages = []
+    for pos, c in enumerate(filtered_clusters):
+        for idx, art in enumerate(c.get("articles", []) or [], start=1):
+            chunks = art.get("chunks") or []
+            vectors = art.get("chunk_embeddings")
+            if chunks and vectors is not None and len(vectors) == len(chunks):
+                for k, (text, vec) in enumerate(zip(chunks, vectors)):
+                    passages.append((pos, idx, k, text, vec))
+            else:
+                lead = art.get("content", art.get("text", ""))[:LEAD_CHARS]
+                passages.append((pos, idx, 0, lead, None))
+    return passages
+
+
+def select_evidence(query, filtered_clusters, budget=ANSWER_CONTEXT_TOKENS, model="gpt-4o"):
+    """
+    Choose passages for the answer prompt: indexed chunks in MMR order
+    (relevant to the query, not redundant with each other), then leads of
+    unindexed articles, packed until `budget` tokens of the answering
+    model's tokenizer are used. Returns (passages in document order,
+    tokens used).
+    """
+    tokenizer = embeddings.get_tokenizer(model)
+    passages = _candidate_passages(filtered_clusters)
+    indexed = [k for k, p in enumerate(passages) if p[4] is not None]
+    order = []
+    if indexed:
+        query_vec = embeddings.get_service().embed_one(query)
+        usable = [k for k in indexed if len(passages[k][4]) == len(query_vec)]
+        if usable:
+            vectors = np.stack([passages[k][4] for k in usable])
+            picks = mmr_select(query_vec, vectors, min(len(usable), MAX_EVIDENCE_CHUNKS), MMR_LAMBDA)
+            order = [usable[i] for i in picks]
+    order += [k for k, p in enumerate(passages) if p[4] is None]
+
+    chosen, used, headed = [], 0, set()
+    for k in order:
+        pos, idx, _, text, _ = passages[k]
+        cost = tokenizer.count(text) + (0 if (pos, idx) in headed else ARTICLE_HEADER_TOKENS)
+        if used + cost > budget:
+            continue
+        chosen.append(k)
+        used += cost
+        headed.add((pos, idx))
+    return [passages[k] for k in sorted(chosen)], used
 
 
-def llm_filter_clusters(query, candidate_clusters):
+def _answer_prompt(query, filtered_clusters, model="gpt-4o", budget=ANSWER_CONTEXT_TOKENS):
     cluster_blocks = []
-    for c in candidate_clusters:
-        cluster_blocks.append(
-            f"[CID {c['cid']}]\nSummary: {c['summary']}\n"
-        )
+    for c in filtered_clusters:
+        if not c.get("articles"):
+            # fall back to the cluster summary if no articles are present
+            cluster_blocks.append(f"[CID {c.get('cid', 'unknown')}] Summary: {c.get('summary', '')}\n")
+
+    passages, _ = select_evidence(query, filtered_clusters, budget, model)
+    current = None
+    for pos, idx, _, text, _ in passages:
+        c = filtered_clusters[pos]
+        if (pos, idx) != current:
+            current = (pos, idx)
+            art = c["articles"][idx - 1]
+            title = art.get("title", "Untitled")
+            url = art.get("url", "")
+            cluster_blocks.append(f"[CID {c.get('cid', 'unknown')}/A{idx}] Title: {title}\nURL: {url}\n")
+        cluster_blocks.append(f"Excerpt: {text}\n")
 
     prompt = f"""
-User query: "{query}"
+You are a news assistant. Answer the user query using the provided articles.
+Always cite sources inline using the tag format [CID x/Ay] where x is the cluster id and y is the article number.
+If you have only a cluster summary, cite as [CID x].
 
-Below are the candidate story clusters. 
-Each has a summary. Rank them by relevance to the query and return only the 
-relevant cluster IDs as a JSON list.
+User query: "{query}"
 
-Clusters:
+Articles (relevant excerpts):
 {''.join(cluster_blocks)}
 
-Return ONLY JSON list of CIDs.
+Return only the answer text with inline citations; no extra commentary.
 """
-
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "user", "content": prompt.strip()}
-        ]
-    )
-    content = response.choices[0].message.content
-    selected_cids = json.loads(content)
-
-    # filter the cluster dicts
-    return [c for c in candidate_clusters if c["cid"] in selected_cids]
+    return prompt.strip()
 
 
 def draft_answer(query, filtered_clusters, model="gpt-4o"):
@@ -81,40 +126,74 @@ def draft_answer(query, filtered_clusters, model="gpt-4o"):
     Draft an answer using the filtered clusters, citing articles.
     """
     if not filtered_clusters:
-        return "No relevant articles found."
+        return NO_ARTICLES_ANSWER
 
-    cluster_blocks = []
-    for c in filtered_clusters:
-        cid = c.get("cid", "unknown")
-        articles = c.get("articles", []) or []
-        if not articles:
-            # fall back to the cluster summary if no articles are present
-            cluster_blocks.append(f"[CID {cid}] Summary: {c.get('summary', '')}\n")
-            continue
+    prompt = _answer_prompt(query, filtered_clusters, model=model)
+    return get_executor().complete(prompt, model=model, priority=PRIORITY_INTERACTIVE)
 
-        for idx, art in enumerate(articles, start=1):
-            title = art.get("title", "Untitled")
-            url = art.get("url", "")
-            content_snip = art.get("content", art.get("text", ""))[:1200]
-            cluster_blocks.append(
-                f"[CID {cid}/A{idx}] Title: {title}\nURL: {url}\nContent: {content_snip}\n"
-            )
 
-    prompt = f"""
-You are a news assistant. Answer the user query using the provided articles.
-Always cite sources inline using the tag format [CID x/Ay] where x is the cluster id and y is the article number.
-If you have only a cluster summary, cite as [CID x].
+def _citation_event(match, clusters_by_cid):
+    cid, article_no = match.group(1), match.group(2)
+    event = {"type": "citation", "text": match.group(0), "cid": cid, "article": None}
+    cluster = clusters_by_cid.get(cid)
+    if cluster is not None and article_no:
+        articles = cluster.get("articles") or []
+        k = int(article_no) - 1
+        if 0 <= k < len(articles):
+            event["article"] = int(article_no)
+            event["title"] = articles[k].get("title")
+            event["url"] = articles[k].get("url")
+    return event
 
-User query: "{query}"
 
-Articles:
-{''.join(cluster_blocks)}
+def stream_answer(query, filtered_clusters, model="gpt-4o", stats=None):
+    """
+    Generator form of draft_answer. Yields events in order:
+    {"type": "token", "text": ...} for answer text and
+    {"type": "citation", "text": "[CID x/Ay]", "cid", "article", "title", "url"}
+    for each inline citation, resolved against the clusters. Joining every
+    event's "text" gives the full answer.
+
+    If `stats` is a dict it is filled with prompt_tokens, ttft_s (time to
+    first token), total_s and events once the stream ends.
+    """
+    started = time.monotonic()
+    stats = stats if stats is not None else {}
+    stats.update({"model": model, "query": query, "ttft_s": None, "total_s": None, "events": 0})
 
-Return only the answer text with inline citations; no extra commentary.
-"""
+    def emit(event):
+        if stats["ttft_s"] is None:
+            stats["ttft_s"] = time.monotonic() - started
+        stats["events"] += 1
+        return event
 
-    response = client.chat.completions.create(
-        model=model,
-        messages=[{"role": "user", "content": prompt.strip()}],
-    )
-    return response.choices[0].message.content
+    if not filtered_clusters:
+        yield emit({"type": "token", "text": NO_ARTICLES_ANSWER})
+        stats["total_s"] = time.monotonic() - started
+        return
+
+    clusters_by_cid = {str(c.get("cid", "unknown")): c for c in filtered_clusters}
+    prompt = _answer_prompt(query, filtered_clusters, model=model)
+    stats["prompt_tokens"] = embeddings.get_tokenizer(model).count(prompt)
+    messages = [{"role": "user", "content": prompt}]
+    pending = ""
+    for delta in get_executor().stream(messages, model=model, priority=PRIORITY_INTERACTIVE):
+        pending += delta
+        # Emit complete citations as their own events; hold back a trailing
+        # partial tag until the next delta decides it.
+        while True:
+            match = CITATION_RE.search(pending)
+            if match is None:
+                break
+            if match.start():
+                yield emit({"type": "token", "text": pending[:match.start()]})
+            yield emit(_citation_event(match, clusters_by_cid))
+            pending = pending[match.end():]
+        partial = _PARTIAL_CITATION_RE.search(pending)
+        ready = pending[:partial.start()] if partial else pending
+        if ready:
+            yield emit({"type": "token", "text": ready})
+            pending = pending[len(ready):]
+    if pending:
+        yield emit({"type": "token", "text": pending})
+    stats["total_s"] = time.monotonic() - started
@@ -0,0 +1,56 @@
+import importlib.util
+import os
+import sys
+import tempfile
+import types
+
+import pytest
+
+# The repo is run from a checkout (no package install); keep the shared
+# caches out of the working tree.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("NEWS_AGENT_CACHE_DIR", tempfile.mkdtemp(prefix="news_agent_tests_"))
+
+# news_api.api_calls imports the provider SDKs at module level. Tests never
+# call them (fetchers are replaced), so missing SDKs get empty stand-ins
+# and agent.workflow stays importable.
+PROVIDER_SDKS = {
+    "eventregistry": ("EventRegistry", "QueryArticlesIter", "QueryItems"),
+    "newsdataapi": ("NewsDataAPIClient",),
+    "finlight_client": ("ApiConfig", "FinlightApi"),
+    "finlight_client.models": ("GetArticlesParams",),
+}
+_missing = {name.split(".")[0] for name in PROVIDER_SDKS if importlib.util.find_spec(name.split(".")[0]) is None}
+for _name, _attrs in PROVIDER_SDKS.items():
+    if _name.split(".")[0] not in _missing:
+        continue
+    _module = types.ModuleType(_name)
+    for _attr in _attrs:
+        setattr(_module, _attr, type(_attr, (), {}))
+    sys.modules[_name] = _module
+
+
+@pytest.fixture
+def fake_openai(monkeypatch, tmp_path):
+    """
+    Point the shared executor and embedding service at bench.fakes'
+    FakeOpenAI (no latency, no rate limits, a per-test embedding cache).
+    Returns the client, whose snapshot() counts calls per kind.
+    """
+    from bench.fakes import FAKE_EMBEDDING_DIMENSIONS, FakeOpenAI
+    from graph import embeddings
+    from llm import executor
+
+    client = FakeOpenAI(chat_latency=0.0, embed_latency=0.0)
+    unlimited = {model: (10**9, 10**12) for model in executor.MODEL_LIMITS}
+    unlimited[embeddings.EMBEDDING_MODEL] = (10**9, 10**12)
+    llm = executor.LLMExecutor(client=client, model_limits=unlimited)
+    service = embeddings.EmbeddingService(
+        dimensions=FAKE_EMBEDDING_DIMENSIONS,
+        cache=embeddings.EmbeddingCache(cache_dir=str(tmp_path)),
+        executor=llm,
+    )
+    monkeypatch.setattr(executor, "_default_executor", llm)
+    monkeypatch.setattr(embeddings, "_default_service", service)
+    return client
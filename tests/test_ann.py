@@ -0,0 +1,62 @@
+import numpy as np
+
+from graph import ann, kgraph
+
+
+def clustered_articles(n=1500, centers=30, dim=32, seed=0):
+    rng = np.random.default_rng(seed)
+    C = rng.standard_normal((centers, dim))
+    label = rng.integers(0, centers, n)
+    X = C[label] + 0.4 * rng.standard_normal((n, dim))
+    # Topics follow the story, as extracted ones do, plus one stray term
+    topics = [[f"story{label[i]}", f"term{rng.integers(0, 200)}"] for i in range(n)]
+    return [{"embedding": X[i].astype(np.float32).tolist(), "topics": topics[i]} for i in range(n)]
+
+
+def test_exhaustive_probing_is_exact():
+    articles = clustered_articles(400)
+    Xn = kgraph.normalize_rows(kgraph.embedding_matrix(articles))
+    index = ann.IVFIndex(nlist=10, nprobe=10).fit(Xn)
+    assert sorted(np.concatenate(index.lists).tolist()) == list(range(400))
+
+    idx, sims = index.self_knn(5)
+    exact = Xn @ Xn.T
+    np.fill_diagonal(exact, -np.inf)
+    np.testing.assert_allclose(np.sort(sims, axis=1), np.sort(exact, axis=1)[:, -5:], atol=1e-5)
+    assert not (idx == np.arange(400)[:, None]).any()
+
+
+def test_default_settings_recall():
+    articles = clustered_articles()
+    edges, neighbors = ann.build_graph_ann(articles, top_n=3)
+    assert neighbors.shape == (1500, 3)
+    assert ann.evaluate_recall(articles, neighbors, top_n=3, sample_size=300) >= 0.85
+
+
+def test_recall_grows_with_nprobe_and_oversample():
+    articles = clustered_articles()
+
+    def recall(**options):
+        return ann.evaluate_recall(articles, ann.ann_neighbors(articles, **options)[0], sample_size=300)
+
+    assert recall(nprobe=1) < recall(nprobe=4) <= recall(nprobe=32)
+    # Every cell probed and a wide enough shortlist: exact
+    assert recall(nprobe=10**6, oversample=30) == 1.0
+
+
+def test_edges_match_the_exact_graph_format():
+    articles = clustered_articles(300)
+    edges, neighbors = ann.build_graph_ann(articles, top_n=3, nprobe=64)
+    exact = kgraph.build_graph(kgraph.compute_similarity(articles), top_n=3)
+    assert len(edges) == len(exact) == 900
+    assert all(u < v for u, v, _ in edges)
+    assert len({(u, v) for u, v, _ in edges} ^ {(u, v) for u, v, _ in exact}) <= 0.05 * len(exact)
+    S = kgraph.compute_similarity(articles)
+    assert all(abs(S[u, v] - w) < 1e-5 for u, v, w in edges)
+
+
+def test_tiny_inputs():
+    assert ann.build_graph_ann([])[0] == []
+    one = clustered_articles(1)
+    edges, neighbors = ann.build_graph_ann(one)
+    assert edges == [] and ann.evaluate_recall(one, neighbors) == 1.0
@@ -0,0 +1,94 @@
+from typing import Any, Dict, List, TypedDict
+
+from langgraph.graph import END, StateGraph
+
+from agent import workflow
+from summary import summarise_answer
+
+CLUSTERS = [
+    {
+        "cid": "1",
+        "summary": "Rates",
+        "articles": [
+            {"title": "Bank holds", "url": "https://a.example/1", "content": "The bank held rates."},
+            {"title": "Bank hints", "url": "https://a.example/2", "content": "A cut may follow."},
+        ],
+    },
+    {"cid": "2", "summary": "Markets react", "articles": []},
+]
+
+
+class ScriptedExecutor:
+    """
+    Streams fixed deltas, splitting citation tags across them.
+    """
+
+    def __init__(self, deltas):
+        self.deltas = deltas
+        self.prompts = []
+
+    def stream(self, messages, model="gpt-4o", priority=None):
+        self.prompts.append(messages[0]["content"])
+        yield from self.deltas
+
+
+def test_citations_split_across_deltas_become_events(monkeypatch, fake_openai):
+    deltas = ["Rates held [CI", "D 1/A", "2] while stocks fell [CID 2]", ". See [CID 9/A1] and [C"]
+    executor = ScriptedExecutor(deltas)
+    monkeypatch.setattr(summarise_answer, "get_executor", lambda: executor)
+
+    stats = {}
+    events = list(summarise_answer.stream_answer("rates", CLUSTERS, stats=stats))
+
+    assert "".join(e["text"] for e in events) == "".join(deltas)
+    citations = [e for e in events if e["type"] == "citation"]
+    assert [(c["cid"], c["article"]) for c in citations] == [("1", 2), ("2", None), ("9", None)]
+    assert citations[0]["title"] == "Bank hints" and citations[0]["url"] == "https://a.example/2"
+    # A partial tag is held back until the stream ends, then sent as text
+    assert events[-1] == {"type": "token", "text": "[C"}
+    assert "[CID 1/A2] Title: Bank hints" in executor.prompts[0]
+    assert "[CID 2] Summary: Markets react" in executor.prompts[0]
+
+    assert stats["events"] == len(events)
+    assert 0 <= stats["ttft_s"] <= stats["total_s"]
+    assert stats["prompt_tokens"] > 0 and stats["query"] == "rates"
+
+
+def test_streamed_answer_matches_the_drafted_one(fake_openai):
+    streamed = "".join(e["text"] for e in summarise_answer.stream_answer("rates", CLUSTERS))
+    assert streamed == summarise_answer.draft_answer("rates", CLUSTERS)
+    assert "[CID 1/A1]" in streamed
+    assert fake_openai.snapshot()["chat.answer"]["calls"] == 2
+
+
+def test_no_clusters_streams_the_fallback_answer(fake_openai):
+    stats = {}
+    events = list(summarise_answer.stream_answer("rates", [], stats=stats))
+    assert events == [{"type": "token", "text": summarise_answer.NO_ARTICLES_ANSWER}]
+    assert stats["ttft_s"] is not None and stats["events"] == 1
+    assert fake_openai.snapshot() == {}
+
+
+class State(TypedDict, total=False):
+    answer: str
+    generation_stats: List[Dict[str, Any]]
+
+
+def test_graph_custom_stream_carries_answer_events(monkeypatch, fake_openai):
+    def answer(state):
+        return {"answer": workflow._generate_answer(state, "rates", CLUSTERS), "generation_stats": state.get("generation_stats")}
+
+    builder = StateGraph(State)
+    builder.add_node("answer", answer)
+    builder.set_entry_point("answer")
+    builder.add_edge("answer", END)
+    graph = builder.compile()
+
+    events, final = [], None
+    for mode, chunk in graph.stream({}, stream_mode=["custom", "values"]):
+        if mode == "custom":
+            events.append(chunk)
+        else:
+            final = chunk
+    assert events and "".join(e["text"] for e in events) == final["answer"]
+    assert final["generation_stats"][0]["events"] == len(events)
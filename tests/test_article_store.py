@@ -0,0 +1,77 @@
+import gc
+
+import numpy as np
+import pytest
+
+from graph import article_store
+from graph.article_store import ArticleStore, QuantizedMatrix, article_cosine, cosine
+
+
+def matrix(n=200, d=64, seed=0):
+    X = np.random.default_rng(seed).standard_normal((n, d)).astype(np.float32)
+    X[5] = 0.0
+    return X
+
+
+def test_attached_rows_are_views_of_the_shared_matrix():
+    store = ArticleStore(matrix(10))
+    articles = store.attach([{} for _ in range(10)])
+    assert article_store.stacked_embeddings(articles, dtype=None) is not None
+    assert np.shares_memory(articles[3]["embedding"], store.matrix)
+    assert articles[3]["row"] == 3
+
+
+@pytest.mark.parametrize("dtype, tol", [("float16", 1e-3), ("int8", 2e-2)])
+def test_quantized_cosine_tracks_float32(dtype, tol):
+    X = matrix()
+    q = np.random.default_rng(1).standard_normal(64)
+    quantized = QuantizedMatrix.from_matrix(X, dtype)
+    assert quantized.data.dtype == np.dtype(dtype) and quantized.nbytes < X.nbytes / 1.9
+    np.testing.assert_allclose(quantized.cosine(q), cosine(X, q), atol=tol)
+    assert quantized.cosine(q)[5] == 0.0
+    rows = [7, 0, 199]
+    np.testing.assert_allclose(quantized.cosine(q, rows), quantized.cosine(q)[rows], atol=1e-6)
+
+
+def test_reduced_dimensions_compare_leading_columns():
+    X = matrix()
+    q = np.random.default_rng(1).standard_normal(64)
+    quantized = QuantizedMatrix.from_matrix(X, "float16", dimensions=16)
+    assert quantized.data.shape == (200, 16)
+    np.testing.assert_allclose(quantized.cosine(q), cosine(X[:, :16], q[:16]), atol=1e-3)
+
+
+def test_store_caches_its_quantized_copy():
+    store = ArticleStore(matrix())
+    q = np.ones(64)
+    assert store.quantized(None) is None
+    assert store.quantized("int8") is store.quantized("int8")
+    np.testing.assert_allclose(store.cosine(q, quantization="int8"), store.cosine(q, quantization=None), atol=2e-2)
+
+    key = (id(store.matrix), "int8", article_store.STORE_DIMENSIONS)
+    assert key in article_store._quantized
+    del store
+    gc.collect()
+    assert key not in article_store._quantized
+
+
+def test_article_cosine_uses_the_quantized_copy_of_shared_rows():
+    store = ArticleStore(matrix())
+    articles = store.attach([{} for _ in range(200)])
+    members = [articles[i] for i in (3, 40, 41, 150)]
+    q = np.random.default_rng(2).standard_normal(64)
+
+    exact = article_cosine(members, q, quantization=None)
+    np.testing.assert_allclose(exact, cosine(store.matrix[[3, 40, 41, 150]], q), atol=1e-6)
+    quantized = article_cosine(members, q, quantization="int8")
+    np.testing.assert_allclose(quantized, exact, atol=2e-2)
+    assert (id(store.matrix), "int8", article_store.STORE_DIMENSIONS) in article_store._quantized
+
+    # Already-quantized rows (a loaded int8 store) are scored as stored
+    loaded = QuantizedMatrix.from_matrix(store.matrix, "int8").data
+    stored = [{"embedding": loaded[i]} for i in (3, 40, 41, 150)]
+    np.testing.assert_allclose(article_cosine(stored, q, quantization="int8"), quantized, atol=1e-6)
+
+    # Vectors that share no matrix are stacked
+    loose = [{"embedding": store.matrix[i].copy()} for i in (3, 40, 41, 150)]
+    np.testing.assert_allclose(article_cosine(loose, q, quantization="int8"), exact, atol=1e-6)
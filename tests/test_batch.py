@@ -0,0 +1,136 @@
+import asyncio
+import threading
+
+import pytest
+from langgraph.graph import END, StateGraph
+
+from agent import batch, workflow
+from agent.checkpoint import DiskCheckpointer
+from graph import dedup
+
+FEEDS = {
+    "fed rates": ["https://a.example/rates", "https://b.example/cut?utm_source=x", "https://c.example/fed"],
+    "treasury yields": ["https://b.example/cut", "https://d.example/yields", "https://a.example/rates"],
+    "inflation": ["https://e.example/cpi"],
+}
+
+
+class World:
+    """
+    Fake fetch and enrichment that count what they were asked to do.
+    """
+
+    def __init__(self, monkeypatch):
+        self.lock = threading.Lock()
+        self.fetched = []
+        self.enrich_calls = []
+        monkeypatch.setattr(workflow, "expand_query", lambda state: dict(state, subqueries=[state["topic"]]))
+        monkeypatch.setattr(workflow, "fetch_articles", self.fetch)
+        monkeypatch.setattr(workflow, "enrich_articles", self.enrich)
+
+    def fetch(self, state):
+        with self.lock:
+            self.fetched.append(state["topic"])
+        raws = [{"url": url, "title": url.split("?")[0].rsplit("/", 1)[-1]} for url in FEEDS[state["topic"]]]
+        return dict(state, raw_articles=raws, fetch_stats={})
+
+    def enrich(self, state):
+        self.enrich_calls.append([a["url"] for a in state["raw_articles"]])
+        by_url = {}
+        for raw in state["raw_articles"]:
+            key = dedup.canonicalize_url(raw["url"])
+            if key in by_url:
+                by_url[key]["sources"].append(raw)
+            else:
+                by_url[key] = dict(raw, canonical_url=key, sources=[raw])
+        return {"enriched_articles": list(by_url.values()), "scrape_cache_stats": {"hits": 0}}
+
+
+def make_graph(tmp_path, fail=()):
+    """
+    enrich_articles (seeded by run_many) -> answer, which lists the articles
+    it was handed and fails for topics in `fail`.
+    """
+
+    def answer(state):
+        if state["topic"] in fail:
+            raise RuntimeError("answer failed")
+        return {"answer": ",".join(sorted(a["title"] for a in state["enriched_articles"]))}
+
+    builder = StateGraph(workflow.AgentState)
+    builder.add_node("enrich_articles", lambda state: state)
+    builder.add_node("answer", answer)
+    builder.set_entry_point("enrich_articles")
+    builder.add_edge("enrich_articles", "answer")
+    builder.add_edge("answer", END)
+    return builder.compile(checkpointer=DiskCheckpointer(str(tmp_path / "checkpoints.sqlite")))
+
+
+def check_results(world, results):
+    assert sorted(world.fetched) == sorted(FEEDS)
+    # One enrichment over the union of every topic's fetch
+    assert len(world.enrich_calls) == 1 and len(world.enrich_calls[0]) == 7
+    assert results["fed rates"]["answer"] == "cut,fed,rates"
+    assert results["treasury yields"]["answer"] == "cut,rates,yields"
+    assert results["inflation"]["answer"] == "cpi"
+
+    fed, treasury = results["fed rates"]["enriched_articles"], results["treasury yields"]["enriched_articles"]
+    cut = [a for a in fed + treasury if a["canonical_url"] == "https://b.example/cut"]
+    # Both topics got the one merged copy of the story
+    assert len(cut) == 2 and cut[0] == cut[1] and len(cut[0]["sources"]) == 2
+
+    stats = results["inflation"]["batch_stats"]
+    assert stats["fetched_articles"] == 7 and stats["unique_articles"] == 5
+    assert stats["shared_articles"] == 2
+    assert stats["topic_articles"] == {"fed rates": 3, "treasury yields": 3, "inflation": 1}
+    assert set(stats["thread_ids"]) == set(FEEDS)
+    assert {"batch_fetch", "batch_enrich"} <= set(stats["trace"]["nodes"])
+    # Raw articles stay each topic's own, untouched by dedup
+    assert "sources" not in results["fed rates"]["raw_articles"][0]
+
+
+def test_enrich_shared_hands_topics_the_same_dicts(monkeypatch):
+    world = World(monkeypatch)
+    fetched = {topic: world.fetch({"topic": topic}) for topic in FEEDS}
+    per_topic, stats = batch.enrich_shared(fetched)
+
+    fed = {a["canonical_url"]: a for a in per_topic["fed rates"]}
+    treasury = {a["canonical_url"]: a for a in per_topic["treasury yields"]}
+    assert set(fed) & set(treasury) == {"https://a.example/rates", "https://b.example/cut"}
+    for url in set(fed) & set(treasury):
+        assert fed[url] is treasury[url]
+    assert stats["shared_articles"] == 2 and len(world.enrich_calls) == 1
+
+
+def test_run_many_enriches_the_union_once(monkeypatch, tmp_path):
+    world = World(monkeypatch)
+    graph = make_graph(tmp_path)
+    results = batch.run_many(list(FEEDS) + ["fed rates"], graph=graph, batch_id="b1")
+    check_results(world, results)
+    # Completed threads are deleted
+    assert graph.checkpointer.disk_usage()["checkpoints"] == 0
+
+
+def test_arun_many_matches_run_many(monkeypatch, tmp_path):
+    world = World(monkeypatch)
+    results = asyncio.run(batch.arun_many(list(FEEDS), graph=make_graph(tmp_path), max_concurrency=2))
+    check_results(world, results)
+
+
+def test_a_failed_topic_keeps_its_thread(monkeypatch, tmp_path):
+    World(monkeypatch)
+    graph = make_graph(tmp_path, fail={"inflation"})
+    results = batch.run_many(list(FEEDS), graph=graph, batch_id="b2")
+
+    assert results["inflation"] is None and results["fed rates"]["answer"] == "cut,fed,rates"
+    thread_id = results["fed rates"]["batch_stats"]["thread_ids"]["inflation"]
+    state = graph.get_state(workflow._thread_config(thread_id))
+    assert state.next == ("answer",)
+    assert [a["title"] for a in state.values["enriched_articles"]] == ["cpi"]
+
+
+@pytest.mark.parametrize("topics", [[], ["inflation"]])
+def test_small_batches(monkeypatch, tmp_path, topics):
+    World(monkeypatch)
+    results = batch.run_many(topics, graph=make_graph(tmp_path))
+    assert list(results) == topics
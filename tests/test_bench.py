@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from agent import retrieval
+from bench import fakes, run
+from graph import embeddings, scraper
+from llm import executor
+from news_api import api_calls
+
+
+@pytest.fixture
+def installed(monkeypatch):
+    """
+    Let fakes.install patch the process, and undo it afterwards.
+    """
+    monkeypatch.setattr(retrieval, "ARTICLE_BUDGET", retrieval.ARTICLE_BUDGET)
+    monkeypatch.setattr(scraper.Scraper, "download", scraper.Scraper.download)
+    monkeypatch.setattr(scraper, "parse_html", scraper.parse_html)
+    monkeypatch.setattr(executor, "_default_executor", executor._default_executor)
+    monkeypatch.setattr(embeddings, "_default_service", embeddings._default_service)
+    for name in ("fetch_event_registry", "fetch_news_data", "fetch_finflight", "fetch_the_news_api"):
+        monkeypatch.setattr(api_calls, name, getattr(api_calls, name))
+    monkeypatch.setattr(fakes, "DEFAULT_PROVIDER_LATENCY", {name: 0.0 for name in fakes.PROVIDERS})
+
+
+def test_corpus_is_deterministic_and_split_across_providers():
+    a, b = fakes.SyntheticCorpus(60, seed=4), fakes.SyntheticCorpus(60, seed=4)
+    assert a.articles == b.articles and a.pages == b.pages
+    shares = a.split()
+    assert sorted(shares) == sorted(fakes.PROVIDERS)
+    assert sum(len(s) for s in shares.values()) == 60
+    assert fakes.SyntheticCorpus(60, seed=5).articles != a.articles
+
+
+def test_feature_hash_embeds_similar_texts_close():
+    base = "the central bank held interest rates steady on tuesday"
+    near = fakes.feature_hash(base + " again")
+    far = fakes.feature_hash("the football final went to penalties after extra time")
+    v = fakes.feature_hash(base)
+    assert v.shape == (fakes.FAKE_EMBEDDING_DIMENSIONS,)
+    assert np.allclose(v, fakes.feature_hash(base))
+    assert float(v @ near) > float(v @ far)
+
+
+def test_fake_client_routes_and_counts_prompts():
+    client = fakes.FakeOpenAI(chat_latency=0.0, embed_latency=0.0)
+    reply = client.chat.completions.create(model="gpt-4o", messages=[{"role": "user", "content": "key topics\nArticle: story3term1 story3term1"}])
+    assert reply.choices[0].message.content == '["story3term1"]'
+    streamed = client.chat.completions.create(
+        model="gpt-4o", messages=[{"role": "user", "content": "Answer the user query\n[CID 1/A1] Title: x"}], stream=True
+    )
+    text = "".join(c.choices[0].delta.content for c in streamed if c.choices)
+    assert "[CID 1/A1]" in text
+    client.embeddings.create(model="m", input=["a", "b"])
+    counts = client.snapshot()
+    assert {k: v["calls"] for k, v in counts.items()} == {"chat.topics": 1, "chat.answer": 1, "embedding": 1}
+
+
+def test_deltas_keep_only_kinds_that_were_called():
+    before = {"chat.summary": {"calls": 2, "prompt_tokens": 50, "completion_tokens": 10}}
+    after = {
+        "chat.summary": {"calls": 2, "prompt_tokens": 50, "completion_tokens": 10},
+        "chat.topics": {"calls": 3, "prompt_tokens": 30, "completion_tokens": 6},
+        "embedding": {"calls": 1, "prompt_tokens": 400, "completion_tokens": 0},
+    }
+    totals = run._totals(run._delta(after, before))
+    assert totals["llm_calls"] == 3 and totals["llm_prompt_tokens"] == 30
+    assert totals["embedding_calls"] == 1 and totals["embedding_tokens"] == 400
+    assert set(totals["calls_by_kind"]) == {"chat.topics", "embedding"}
+
+
+def test_stage_run_reports_every_stage(installed):
+    report = run.run_worker(40, "stages", seed=0, trace_memory=True, chat_latency=0.0, embed_latency=0.0, page_latency=0.0)
+
+    assert list(report["stages"]) == list(run.STAGES)
+    for stage in report["stages"].values():
+        assert stage["wall_s"] >= 0 and stage["peak_rss_mb"] > 0 and "traced_peak_mb" in stage
+    assert report["stages"]["expand_query"]["calls_by_kind"] == {
+        "chat.expand": {"calls": 1, "prompt_tokens": report["stages"]["expand_query"]["llm_prompt_tokens"],
+                        "completion_tokens": report["stages"]["expand_query"]["llm_completion_tokens"]}
+    }
+    assert report["stages"]["enrich_articles"]["embedding_calls"] >= 1
+    assert report["articles"]["raw"] == 40 and 0 < report["articles"]["enriched"] <= 40
+    assert report["articles"]["clusters"] > 0
+    assert report["generation_stats"][0]["ttft_s"] is not None
@@ -0,0 +1,204 @@
+import os
+import pickle
+import time
+import zlib
+from typing import TypedDict
+
+import pytest
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.graph import END, StateGraph
+
+from agent.checkpoint import DiskCheckpointer
+
+
+class State(TypedDict, total=False):
+    text: str
+    steps: list
+
+
+def make_graph(checkpointer, fail):
+    """
+    collect -> draft -> END; draft raises while fail["draft"] is set.
+    """
+    calls = {"collect": 0, "draft": 0}
+
+    def collect(state):
+        calls["collect"] += 1
+        return {"text": state["text"] * 1000, "steps": state.get("steps", []) + ["collect"]}
+
+    def draft(state):
+        calls["draft"] += 1
+        if fail["draft"]:
+            raise RuntimeError("draft failed")
+        return {"steps": state["steps"] + ["draft"]}
+
+    builder = StateGraph(State)
+    builder.add_node("collect", collect)
+    builder.add_node("draft", draft)
+    builder.set_entry_point("collect")
+    builder.add_edge("collect", "draft")
+    builder.add_edge("draft", END)
+    return builder.compile(checkpointer=checkpointer), calls
+
+
+@pytest.fixture
+def checkpointer(tmp_path):
+    return DiskCheckpointer(str(tmp_path / "checkpoints.sqlite"))
+
+
+def config(thread_id):
+    return {"configurable": {"thread_id": thread_id}}
+
+
+def test_failed_run_resumes_from_last_completed_node(checkpointer):
+    fail = {"draft": True}
+    graph, calls = make_graph(checkpointer, fail)
+    with pytest.raises(RuntimeError):
+        graph.invoke({"text": "x"}, config("t1"))
+    assert graph.get_state(config("t1")).next == ("draft",)
+
+    fail["draft"] = False
+    result = graph.invoke(None, config("t1"))
+    assert result["steps"] == ["collect", "draft"]
+    assert calls == {"collect": 1, "draft": 2}
+    assert graph.get_state(config("t1")).next == ()
+
+
+def test_resume_in_a_new_process_reads_the_database(tmp_path):
+    path = str(tmp_path / "checkpoints.sqlite")
+    graph, _ = make_graph(DiskCheckpointer(path), {"draft": True})
+    with pytest.raises(RuntimeError):
+        graph.invoke({"text": "x"}, config("t1"))
+
+    graph, calls = make_graph(DiskCheckpointer(path), {"draft": False})
+    result = graph.invoke(None, config("t1"))
+    assert result["steps"] == ["collect", "draft"]
+    assert calls == {"collect": 0, "draft": 1}
+
+
+def test_unchanged_values_are_stored_once(checkpointer):
+    graph, _ = make_graph(checkpointer, {"draft": False})
+    graph.invoke({"text": "x"}, config("t1"))
+    graph.invoke({"text": "x"}, config("t2"))
+    usage = checkpointer.disk_usage()
+    assert usage["checkpoints"] > 2
+    # "x" * 1000 is the same blob in every checkpoint of both threads
+    assert usage["blobs"] < usage["checkpoints"]
+
+
+def test_delete_thread_drops_checkpoints_and_unreferenced_blobs(checkpointer):
+    graph, _ = make_graph(checkpointer, {"draft": False})
+    graph.invoke({"text": "x"}, config("t1"))
+    graph.invoke({"text": "y"}, config("t2"))
+    before = checkpointer.disk_usage()
+
+    checkpointer.delete_thread("t1")
+    assert checkpointer.get_tuple(config("t1")) is None
+    assert checkpointer.get_tuple(config("t2")) is not None
+    after = checkpointer.disk_usage()
+    assert 0 < after["blobs"] < before["blobs"]
+
+    checkpointer.delete_thread("t2")
+    assert checkpointer.disk_usage() == {"blobs": 0, "blob_bytes": 0, "checkpoints": 0}
+
+
+def test_prune_by_age(checkpointer):
+    graph, _ = make_graph(checkpointer, {"draft": True})
+    for thread_id in ("old", "new"):
+        with pytest.raises(RuntimeError):
+            graph.invoke({"text": thread_id}, config(thread_id))
+    with checkpointer._db:
+        checkpointer._db.execute(
+            "UPDATE threads SET updated_at = ? WHERE thread_id = 'old'", (time.time() - 3600,)
+        )
+
+    pruned = checkpointer.prune(max_age=60, max_bytes=None)
+    assert pruned["threads"] == 1 and pruned["blobs"] > 0
+    assert checkpointer.get_tuple(config("old")) is None
+    assert checkpointer.get_tuple(config("new")) is not None
+
+
+def test_prune_by_size_drops_oldest_first(checkpointer):
+    graph, _ = make_graph(checkpointer, {"draft": True})
+    for i, thread_id in enumerate(("a", "b", "c")):
+        with pytest.raises(RuntimeError):
+            graph.invoke({"text": os.urandom(64).hex()}, config(thread_id))
+        with checkpointer._db:
+            checkpointer._db.execute("UPDATE threads SET updated_at = ? WHERE thread_id = ?", (i, thread_id))
+
+    total = checkpointer.disk_usage()["blob_bytes"]
+    pruned = checkpointer.prune(max_age=float("inf"), max_bytes=total // 2)
+    assert pruned["threads"] >= 1
+    assert checkpointer.get_tuple(config("a")) is None
+    assert checkpointer.get_tuple(config("c")) is not None
+    assert checkpointer.disk_usage()["blob_bytes"] <= total // 2
+
+
+class CountingSerde(JsonPlusSerializer):
+    def __init__(self):
+        super().__init__(pickle_fallback=True)
+        self.dumped = []
+
+    def dumps_typed(self, obj):
+        self.dumped.append(obj)
+        return super().dumps_typed(obj)
+
+
+def test_values_go_through_the_serde(tmp_path):
+    serde = CountingSerde()
+    checkpointer = DiskCheckpointer(str(tmp_path / "checkpoints.sqlite"), serde=serde)
+    graph, _ = make_graph(checkpointer, {"draft": False})
+    graph.invoke({"text": "x"}, config("t1"))
+    assert "x" * 1000 in serde.dumped
+    types = {row[0] for row in checkpointer._db.execute("SELECT type FROM blobs")}
+    assert types <= {"msgpack", "null"}
+    assert checkpointer.get_tuple(config("t1")).checkpoint["channel_values"]["text"] == "x" * 1000
+
+
+def test_only_new_versions_are_serialized(tmp_path):
+    serde = CountingSerde()
+    checkpointer = DiskCheckpointer(str(tmp_path / "checkpoints.sqlite"), serde=serde)
+    graph, _ = make_graph(checkpointer, {"draft": False})
+    graph.invoke({"text": "x"}, config("t1"))
+    saved = checkpointer.get_tuple(config("t1"))
+    versions = saved.checkpoint["channel_versions"]
+
+    # Re-putting a checkpoint whose channel versions are all on record
+    # serializes only the checkpoint and its metadata.
+    serde.dumped.clear()
+    checkpointer.put(saved.config, saved.checkpoint, saved.metadata, versions)
+    assert len(serde.dumped) == 2
+    assert checkpointer.stats["versions_reused"] == len(versions)
+
+    # A put with no new versions touches no channel value at all
+    serde.dumped.clear()
+    checkpointer.put(saved.config, saved.checkpoint, saved.metadata, {})
+    assert "x" * 1000 not in serde.dumped
+
+
+def test_pickled_rows_from_older_databases_still_load(tmp_path):
+    path = str(tmp_path / "checkpoints.sqlite")
+    checkpointer = DiskCheckpointer(path)
+    graph, _ = make_graph(checkpointer, {"draft": False})
+    graph.invoke({"text": "x"}, config("t1"))
+    saved = checkpointer.get_tuple(config("t1"))
+
+    # Rewrite every row the way the pickle-only version stored it, in its
+    # schema (no type columns)
+    with checkpointer._db:
+        rows = checkpointer._db.execute("SELECT hash, data, type FROM blobs").fetchall()
+        for digest, data, type_ in rows:
+            value = checkpointer.serde.loads_typed((type_, zlib.decompress(data)))
+            checkpointer._db.execute(
+                "UPDATE blobs SET data = ? WHERE hash = ?", (zlib.compress(pickle.dumps(value)), digest)
+            )
+        stored = {k: v for k, v in saved.checkpoint.items() if k != "channel_values"}
+        checkpointer._db.execute(
+            "UPDATE checkpoints SET checkpoint = ?, metadata = ?", (pickle.dumps(stored), pickle.dumps(saved.metadata))
+        )
+        for table, column in (("blobs", "type"), ("checkpoints", "checkpoint_type"), ("checkpoints", "metadata_type")):
+            checkpointer._db.execute(f"ALTER TABLE {table} DROP COLUMN {column}")
+
+    reopened = DiskCheckpointer(path).get_tuple(config("t1"))
+    assert reopened.checkpoint["channel_values"] == saved.checkpoint["channel_values"]
+    assert reopened.metadata == saved.metadata
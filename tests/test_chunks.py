@@ -0,0 +1,92 @@
+import numpy as np
+
+from graph import article_store, chunks
+from graph.chunks import chunk_text, index_articles, split_sentences
+from summary import summarise_answer
+
+
+class WordTokenizer:
+    def count(self, text):
+        return len(text.split())
+
+
+def test_sentences_keep_closing_quotes_and_brackets():
+    text = 'He said "it is over." Then he left. (The vote was close.) "Why?" she asked.'
+    assert split_sentences(text) == [
+        'He said "it is over."',
+        "Then he left.",
+        "(The vote was close.)",
+        '"Why?" she asked.',
+    ]
+
+
+def test_abbreviations_do_not_end_sentences():
+    text = "Mr. Smith met Dr. Jones at 10 a.m. on Main St. in the U.S. capital. They agreed."
+    assert split_sentences(text) == [
+        "Mr. Smith met Dr. Jones at 10 a.m. on Main St. in the U.S. capital.",
+        "They agreed.",
+    ]
+
+
+def test_lines_and_lowercase_continuations():
+    text = "First line ends here.\nSecond line.\n\nThird. e.g. not a break? Yes."
+    assert split_sentences(text) == ["First line ends here.", "Second line.", "Third. e.g. not a break?", "Yes."]
+    assert split_sentences("") == [] and split_sentences(None) == []
+
+
+def test_chunks_pack_sentences_with_overlap():
+    sentences = [f"Sentence {k} has exactly six words." for k in range(10)]
+    got = chunk_text(" ".join(sentences), max_tokens=20, overlap=1, tokenizer=WordTokenizer())
+    # Three six-word sentences fit; each chunk repeats the previous one's last sentence
+    assert got[0] == " ".join(sentences[0:3])
+    assert got[1] == " ".join(sentences[2:5])
+    assert all(WordTokenizer().count(c) <= 20 for c in got)
+    assert got[-1].endswith(sentences[-1])
+
+
+def test_long_sentences_split_on_words():
+    long = " ".join(f"w{k}" for k in range(25)) + "."
+    got = chunk_text(long + " Short one.", max_tokens=10, overlap=0, tokenizer=WordTokenizer())
+    # 25 words become 10 + 10 + 5, and the next sentence packs onto the last piece
+    assert [WordTokenizer().count(c) for c in got] == [10, 10, 7]
+    assert " ".join(got) == long + " Short one."
+
+
+def test_index_articles_embeds_all_chunks_in_one_matrix(fake_openai, monkeypatch):
+    monkeypatch.setattr(chunks.embeddings, "get_tokenizer", lambda model: WordTokenizer())
+    articles = [
+        {"text": " ".join(f"Story one sentence {k} about rates." for k in range(12))},
+        {"full_text": "Only a short text."},
+        {"body": ""},
+    ]
+    index_articles(articles, max_tokens=20, max_chunks=2)
+
+    assert len(articles[0]["chunks"]) == 2 and articles[1]["chunks"] == ["Only a short text."]
+    assert articles[2]["chunks"] == [] and len(articles[2]["chunk_embeddings"]) == 0
+    first, second = articles[0]["chunk_embeddings"], articles[1]["chunk_embeddings"]
+    assert article_store._root(first) is article_store._root(second)
+    assert fake_openai.snapshot()["embedding"]["calls"] == 1
+
+
+def test_select_evidence_packs_mmr_picks_in_document_order(fake_openai):
+    E = np.eye(8, dtype=np.float32)
+    article = {
+        "title": "t",
+        "chunks": ["sports", "rates other angle", "rates one again", "rates one"],
+        "chunk_embeddings": np.stack([E[3], 0.8 * E[0] + 0.6 * E[2], E[0] + 0.01 * E[1], E[0]]),
+    }
+    legacy = {"title": "old", "content": "lead " * 10}
+    clusters = [{"cid": "1", "articles": [article]}, {"cid": "2", "articles": [legacy]}]
+    summarise_answer.embeddings.get_service().embed_one = lambda text: E[0]
+
+    tokenizer = summarise_answer.embeddings.get_tokenizer("gpt-4o")
+    rates = ["rates other angle", "rates one again", "rates one"]
+    budget = summarise_answer.ARTICLE_HEADER_TOKENS + sum(tokenizer.count(t) for t in rates)
+    passages, used = summarise_answer.select_evidence("rates", clusters, budget=budget)
+    # The off-topic chunk and the unindexed lead come last and no longer fit;
+    # what fits is returned in document order
+    assert [p[3] for p in passages] == rates
+    assert used == budget
+
+    passages, _ = summarise_answer.select_evidence("rates", clusters, budget=10**6)
+    assert [p[3] for p in passages] == article["chunks"] + [legacy["content"]]
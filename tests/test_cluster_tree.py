@@ -0,0 +1,175 @@
+from itertools import combinations
+
+import numpy as np
+import pytest
+from igraph import Graph
+
+from graph import cluster_tree, graph_analysis
+
+GROUPS, SUBGROUPS, SIZE = 3, 3, 5
+DIM = GROUPS + GROUPS * SUBGROUPS
+
+
+def planted():
+    """
+    GROUPS groups of SUBGROUPS cliques of SIZE articles: heavy edges inside
+    a clique, lighter ones between cliques of a group and a weak chain
+    between groups. Embeddings share a group axis and a clique axis.
+    """
+    n = GROUPS * SUBGROUPS * SIZE
+    group = [i // (SUBGROUPS * SIZE) for i in range(n)]
+    sub = [i // SIZE for i in range(n)]
+    edges, weights = [], []
+    for i, j in combinations(range(n), 2):
+        if sub[i] == sub[j]:
+            edges.append((i, j))
+            weights.append(1.0)
+        elif group[i] == group[j] and i % SIZE == j % SIZE:
+            edges.append((i, j))
+            weights.append(0.3)
+        elif group[j] == group[i] + 1 and i % (SUBGROUPS * SIZE) == 0 and j % (SUBGROUPS * SIZE) == 0:
+            edges.append((i, j))
+            weights.append(0.05)
+    G = Graph(n=n, edges=edges)
+    G.es["weight"] = weights
+
+    articles = []
+    for i in range(n):
+        vec = np.zeros(DIM, dtype=np.float32)
+        vec[group[i]] = 1.0
+        vec[GROUPS + sub[i]] = 1.0
+        articles.append({"text": f"article {i}", "embedding": vec.tolist(), "keywords": [f"k{sub[i]}"]})
+    return G, articles, sub
+
+
+@pytest.fixture(scope="module")
+def tree():
+    G, articles, sub = planted()
+    return cluster_tree.build_tree(G), articles, sub
+
+
+def members(tree, nid):
+    return sorted(tree["nodes"][nid]["article_ids"])
+
+
+def test_levels_nest_into_a_tree(tree):
+    tree, articles, _ = tree
+    nodes = tree["nodes"]
+    assert len(tree["levels"]) >= 2
+    assert tree["resolutions"] == sorted(tree["resolutions"])
+    sizes = [len(level) for level in tree["levels"]]
+    assert sizes == sorted(sizes) and len(set(sizes)) == len(sizes)
+
+    for depth, level in enumerate(tree["levels"]):
+        # Every level covers every article exactly once
+        assert sorted(i for nid in level for i in nodes[nid]["article_ids"]) == list(range(len(articles)))
+        for nid in level:
+            node = nodes[nid]
+            assert node["level"] == depth
+            assert all(tree["membership"][depth][i] == nid for i in node["article_ids"])
+            if depth:
+                parent = nodes[node["parent"]]
+                assert parent["level"] == depth - 1 and nid in parent["children"]
+                assert set(node["article_ids"]) <= set(parent["article_ids"])
+            if node["children"]:
+                assert sorted(i for c in node["children"] for i in nodes[c]["article_ids"]) == members(tree, nid)
+
+
+def test_finest_level_recovers_the_cliques(tree):
+    tree, _, sub = tree
+    finest = sorted(members(tree, nid) for nid in tree["levels"][-1])
+    assert finest == [[i for i in range(len(sub)) if sub[i] == s] for s in range(GROUPS * SUBGROUPS)]
+
+
+def test_level_for_picks_the_closest_resolution(tree):
+    tree, _, _ = tree
+    resolutions = tree["resolutions"]
+    assert cluster_tree.level_for(tree, 1e-6) == 0
+    assert cluster_tree.level_for(tree, 1e6) == len(resolutions) - 1
+    for depth, resolution in enumerate(resolutions):
+        assert cluster_tree.level_for(tree, resolution) == depth
+
+
+def query_for(group=None, sub=None):
+    vec = np.zeros(DIM, dtype=np.float32)
+    if group is None:
+        vec[:GROUPS] = 1.0
+    else:
+        vec[group] = 1.0
+        vec[GROUPS + sub] = 1.0
+    return vec
+
+
+def assert_covers(tree, cut, n):
+    assert sorted(i for nid in cut for i in tree["nodes"][nid]["article_ids"]) == list(range(n))
+
+
+def test_adaptive_cut_stays_coarse_for_broad_queries(tree):
+    tree, articles, _ = tree
+    relevance = cluster_tree.node_relevance(tree, articles, query_for())
+    assert cluster_tree.adaptive_cut(tree, relevance) == sorted(tree["levels"][0])
+
+
+def test_adaptive_cut_drills_into_narrow_queries(tree):
+    tree, articles, sub = tree
+    relevance = cluster_tree.node_relevance(tree, articles, query_for(group=1, sub=4))
+    cut = cluster_tree.adaptive_cut(tree, relevance)
+    assert_covers(tree, cut, len(articles))
+
+    target = [i for i in range(len(sub)) if sub[i] == 4]
+    assert target in [members(tree, nid) for nid in cut]
+    # Groups the query is not about are left as coarse as they were
+    assert len(cut) < len(tree["levels"][-1])
+    best = max(cut, key=lambda nid: relevance[nid])
+    assert members(tree, best) == target
+
+
+def test_adaptive_cut_respects_max_nodes(tree):
+    tree, articles, _ = tree
+    relevance = cluster_tree.node_relevance(tree, articles, query_for(group=0, sub=0))
+    assert cluster_tree.adaptive_cut(tree, relevance, max_nodes=len(tree["levels"][0])) == sorted(tree["levels"][0])
+
+
+def test_node_relevance_skips_articles_without_embeddings(tree):
+    tree, articles, _ = tree
+    partial = [dict(a, embedding=None) if i < 5 else a for i, a in enumerate(articles)]
+    relevance = cluster_tree.node_relevance(tree, partial, query_for(group=0, sub=0))
+    clique = tree["membership"][-1][0]
+    assert relevance[clique] == -np.inf
+    assert np.isfinite(relevance[tree["membership"][-1][5]])
+
+
+class FakeEmbeddings:
+    def __init__(self, vec):
+        self.vec = vec
+
+    def embed_one(self, text):
+        return self.vec
+
+
+def test_clusters_for_summarises_each_node_once(tree, monkeypatch):
+    tree, articles, _ = tree
+    tree = {**tree, "nodes": [dict(node) for node in tree["nodes"]]}
+    summarised = []
+
+    def analyze(articles, groups):
+        summarised.extend(sorted(g) for g in groups)
+        return {k: {"combined_summary": f"summary of {len(g)}", "summary_embedding": [0.0]} for k, g in enumerate(groups)}
+
+    monkeypatch.setattr(graph_analysis, "analyze_clusters", analyze)
+    monkeypatch.setattr(cluster_tree.embeddings, "get_service", lambda: FakeEmbeddings(query_for(group=2, sub=7)))
+
+    clusters = cluster_tree.clusters_for(tree, articles, "narrow question")
+    assert clusters[0]["articles"] == [articles[i] for i in range(35, 40)]
+    assert clusters[0]["keywords"] == ["k7"] * SIZE
+    assert len(summarised) == len(clusters)
+
+    # Same question again: nothing new to summarise
+    cluster_tree.clusters_for(tree, articles, "narrow question")
+    assert len(summarised) == len(clusters)
+
+    # Finest level: only the nodes not summarised yet
+    done = {nid for nid, node in enumerate(tree["nodes"]) if "summary" in node}
+    fine = cluster_tree.clusters_for(tree, articles, "narrow question", granularity=1e6, max_clusters=3)
+    assert len(fine) == 3 and {c["level"] for c in fine} == {len(tree["levels"]) - 1}
+    assert len(summarised) == len(clusters) + len({c["cid"] for c in fine} - done)
@@ -0,0 +1,36 @@
+from types import SimpleNamespace
+
+import pytest
+
+from graph import data_prep
+
+
+def reply(content):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+@pytest.mark.parametrize(
+    "content, topics",
+    [
+        ('["ecb", "interest rates"]', ["ecb", "interest rates"]),
+        ('```json\n["ecb", "interest rates"]\n```', ["ecb", "interest rates"]),
+        ('```\n["ecb"]\n```', ["ecb"]),
+        ("Topics: ecb, rates", []),
+        ('{"topics": ["ecb"]}', []),
+        ("", []),
+        (None, []),
+    ],
+)
+def test_parse_topics(content, topics):
+    assert data_prep.parse_topics(reply(content)) == topics
+
+
+def test_get_topics_tags_every_article(fake_openai):
+    articles = [
+        {"full_text": "story1term4 story1term4 story1term9 markets"},
+        {"full_text": "story2term1 story2term1 weather"},
+    ]
+    data_prep.get_topics(articles)
+    assert articles[0]["topics"][:2] == ["story1term4", "story1term9"]
+    assert articles[1]["topics"] == ["story2term1"]
+    assert fake_openai.snapshot()["chat.topics"]["calls"] == 2
@@ -0,0 +1,105 @@
+import random
+
+import pytest
+
+from graph import dedup
+
+WORDS = [f"w{k}" for k in range(500)]
+
+
+def story(seed, n=600):
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+
+def article(url, text, source="outlet"):
+    return {"url": url, "full_text": text, "source": source, "title": url}
+
+
+@pytest.mark.parametrize(
+    "url, canonical",
+    [
+        ("http://www.Example.com/news/story/?utm_source=x&b=2&a=1#top", "https://example.com/news/story?a=1&b=2"),
+        ("https://amp.example.com/news/story/amp", "https://example.com/news/story"),
+        ("https://example.com/news/story.amp?outputType=amp", "https://example.com/news/story"),
+        ("https://example.com/?fbclid=abc&gclid=def&ref=tw", "https://example.com/"),
+        ("https://example.com/a?page=2&mkt_tok=zz", "https://example.com/a?page=2"),
+    ],
+)
+def test_canonicalize_url(url, canonical):
+    assert dedup.canonicalize_url(url) == canonical
+
+
+def test_dedup_by_url_folds_copies_into_sources():
+    articles = [
+        article("https://www.example.com/a?utm_campaign=x", "one", "A"),
+        article("https://example.com/b", "two", "B"),
+        article("http://example.com/a/", "one again", "C"),
+    ]
+    unique = dedup.dedup_by_url(articles)
+    assert [a["title"] for a in unique] == [articles[0]["title"], articles[1]["title"]]
+    assert unique[0]["canonical_url"] == "https://example.com/a"
+    assert [s["source"] for s in unique[0]["sources"]] == ["A", "C"]
+
+
+def test_simhash_is_close_for_near_duplicates_and_far_otherwise():
+    text = story(1)
+    edited = text + " (Reuters)"
+    assert bin(dedup.simhash(text) ^ dedup.simhash(edited)).count("1") <= dedup.MAX_HAMMING
+    assert bin(dedup.simhash(text) ^ dedup.simhash(story(2))).count("1") > 16
+    assert dedup.simhash("too short to fingerprint") is None
+
+
+def test_collapse_keeps_longest_copy_and_every_source():
+    text = story(7)
+    articles = [
+        article("https://a.example/1", text, "A"),
+        article("https://b.example/1", text + " More at b.example", "B"),
+        article("https://c.example/1", story(8), "C"),
+        article("https://d.example/1", text + " (AP)", "D"),
+    ]
+    kept = dedup.collapse_near_duplicates(articles)
+    assert [a["source"] for a in kept] == ["B", "C"]
+    assert sorted(s["source"] for s in kept[0]["sources"]) == ["A", "B", "D"]
+
+
+def test_short_texts_are_never_collapsed():
+    articles = [article(f"https://x.example/{k}", "Markets closed higher today.") for k in range(3)]
+    assert len(dedup.collapse_near_duplicates(articles)) == 3
+
+
+def test_lsh_finds_every_pair_within_max_hamming():
+    texts = [story(k) for k in range(40)]
+    texts += [texts[k] + " (AP)" for k in range(0, 40, 4)]
+    articles = [article(f"https://o{k}.example/", t) for k, t in enumerate(texts)]
+    prints = [dedup.simhash(t) for t in texts]
+
+    # Brute-force grouping over all pairs
+    group = list(range(len(texts)))
+    for i in range(len(texts)):
+        for j in range(i):
+            if bin(prints[i] ^ prints[j]).count("1") <= dedup.MAX_HAMMING:
+                old = group[i]
+                group = [group[j] if g == old else g for g in group]
+    assert len(set(group)) < len(texts)
+
+    kept = dedup.collapse_near_duplicates(articles)
+    assert len(kept) == len(set(group))
+    for a in kept:
+        members = {int(s["url"].split("//o")[1].split(".")[0]) for s in a.get("sources", [{"url": a["url"]}])}
+        assert len({group[k] for k in members}) == 1
+
+
+def test_streaming_dedup_folds_url_and_text_copies():
+    text = story(3)
+    stream = dedup.StreamingDedup()
+    first = article("https://www.a.example/x?utm_source=rss", text, "A")
+    assert not stream.seen_url(first)
+    assert stream.seen_url(article("https://a.example/x", text, "A2"))
+    assert not stream.seen_text(first)
+
+    copy = article("https://b.example/y", text + " Reporting by staff.", "B")
+    assert not stream.seen_url(copy)
+    assert stream.seen_text(copy)
+    assert not stream.seen_text(article("https://c.example/z", story(4), "C"))
+    assert [s["source"] for s in first["sources"]] == ["A", "A2", "B"]
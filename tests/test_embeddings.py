@@ -0,0 +1,40 @@
+import numpy as np
+
+from bench.fakes import FAKE_EMBEDDING_DIMENSIONS, FakeOpenAI, feature_hash
+from graph import embeddings
+from graph.embeddings import EmbeddingCache, EmbeddingService
+from llm.executor import LLMExecutor
+
+
+def make_service(cache_dir, **kwargs):
+    client = FakeOpenAI(chat_latency=0.0, embed_latency=0.0)
+    executor = LLMExecutor(client=client, model_limits={embeddings.EMBEDDING_MODEL: (10**9, 10**12)})
+    service = EmbeddingService(
+        dimensions=FAKE_EMBEDDING_DIMENSIONS, cache=EmbeddingCache(str(cache_dir)), executor=executor, **kwargs
+    )
+    return service, client
+
+
+def test_embeds_in_batches_and_caches_on_disk(tmp_path):
+    texts = [f"article {k} about rates" for k in range(10)]
+    service, client = make_service(tmp_path, max_batch_items=4)
+    X = service.embed(texts)
+    assert X.shape == (10, FAKE_EMBEDDING_DIMENSIONS) and X.dtype == np.float32
+    np.testing.assert_allclose(X[3], feature_hash(texts[3]), atol=1e-6)
+    assert service.api_calls == 3
+
+    # A new service on the same directory only requests the unseen text
+    again, client = make_service(tmp_path, max_batch_items=4)
+    Y = again.embed(texts + ["something new"])
+    np.testing.assert_allclose(Y[:10], X)
+    assert again.api_calls == 1 and again.cache_hits == 10
+    assert client.snapshot()["embedding"]["calls"] == 1
+
+
+def test_duplicates_and_empty_texts(tmp_path):
+    service, client = make_service(tmp_path)
+    X = service.embed(["same", "", None, "same"])
+    np.testing.assert_allclose(X[0], X[3])
+    assert not X[1].any() and not X[2].any()
+    assert client.snapshot()["embedding"]["prompt_tokens"] == 1
+
@@ -0,0 +1,159 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from llm import executor
+from llm.executor import LLMExecutor, TokenBucket
+
+UNLIMITED = {"gpt-4o": (10**9, 10**12)}
+
+
+def rate_limit_error(retry_after=None):
+    headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(429, headers=headers, request=request)
+    return openai.RateLimitError("rate limited", response=response, body=None)
+
+
+def chat_response(content):
+    message = SimpleNamespace(content=content)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+class FakeClient:
+    """
+    Chat-only client: raises the queued errors first, then answers with the
+    last user message, after `delay` seconds.
+    """
+
+    def __init__(self, errors=(), delay=0.0):
+        self.errors = list(errors)
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, **kwargs):
+        with self._lock:
+            self.calls += 1
+            error = self.errors.pop(0) if self.errors else None
+        time.sleep(self.delay)
+        if error is not None:
+            raise error
+        return chat_response(messages[-1]["content"])
+
+
+def make_executor(client, **kwargs):
+    kwargs.setdefault("model_limits", UNLIMITED)
+    return LLMExecutor(client=client, max_concurrency=4, base_delay=0.001, max_delay=0.01, **kwargs)
+
+
+def test_retries_rate_limit_errors():
+    client = FakeClient(errors=[rate_limit_error(), rate_limit_error()])
+    ex = make_executor(client)
+    assert ex.complete("hello") == "hello"
+    assert client.calls == 3
+    assert ex.stats["retries"] == 2
+    assert ex.stats["failures"] == 0
+
+
+def test_gives_up_after_max_retries():
+    client = FakeClient(errors=[rate_limit_error()] * 5)
+    ex = make_executor(client, max_retries=2)
+    with pytest.raises(openai.RateLimitError):
+        ex.complete("hello")
+    assert client.calls == 3
+    assert ex.stats["failures"] == 1
+
+
+def test_does_not_retry_other_errors():
+    client = FakeClient(errors=[ValueError("bad request")])
+    ex = make_executor(client)
+    with pytest.raises(ValueError):
+        ex.complete("hello")
+    assert client.calls == 1
+    assert ex.stats["retries"] == 0
+
+
+def test_backoff_honours_retry_after():
+    ex = make_executor(FakeClient())
+    assert ex._backoff(1, rate_limit_error(retry_after=3)) == 3.0
+    assert ex._backoff(1, rate_limit_error()) <= ex.max_delay
+
+
+def test_coalesces_identical_inflight_requests():
+    client = FakeClient(delay=0.2)
+    ex = make_executor(client)
+    messages = [{"role": "user", "content": "same"}]
+    futures = [ex.chat(messages) for _ in range(5)]
+    assert len({id(f) for f in futures}) == 1
+    assert futures[0].result().choices[0].message.content == "same"
+    assert client.calls == 1
+    assert ex.stats["coalesced"] == 4
+
+
+def test_does_not_coalesce_different_or_finished_requests():
+    client = FakeClient()
+    ex = make_executor(client)
+    assert ex.complete("a") == "a"
+    assert ex.complete("a") == "a"
+    assert ex.complete("b") == "b"
+    assert client.calls == 3
+    assert ex.stats["coalesced"] == 0
+
+
+def test_uncoalesced_requests_are_sent_separately():
+    client = FakeClient(delay=0.1)
+    ex = make_executor(client)
+    payload = dict(messages=[{"role": "user", "content": "same"}])
+    futures = [ex.submit("chat", "gpt-4o", payload, coalesce=False) for _ in range(3)]
+    for future in futures:
+        future.result()
+    assert client.calls == 3
+
+
+def test_token_bucket_waits_for_refill():
+    bucket = TokenBucket(600)  # 10 per second, burst 600
+    bucket.acquire(600)
+    started = time.monotonic()
+    bucket.acquire(2)
+    assert time.monotonic() - started >= 0.15
+
+
+def test_requests_wait_on_the_model_rate_limit():
+    client = FakeClient()
+    ex = make_executor(client, model_limits={"gpt-4o": (600, 10**12)})
+    requests_bucket, _ = ex._limits("gpt-4o")
+    requests_bucket.tokens = 0.0
+    started = time.monotonic()
+    ex.complete("hello")
+    assert time.monotonic() - started >= 0.08
+
+
+def test_model_limits_precedence(monkeypatch):
+    for name in ("OPENAI_RPM", "OPENAI_TPM", "OPENAI_RPM_GPT_4O", "OPENAI_TPM_GPT_4O"):
+        monkeypatch.delenv(name, raising=False)
+    assert executor.model_limits("gpt-4o") == executor.MODEL_LIMITS["gpt-4o"]
+    assert executor.model_limits("unknown-model") == (executor.DEFAULT_RPM, executor.DEFAULT_TPM)
+
+    monkeypatch.setenv("OPENAI_TPM", "1000")
+    assert executor.model_limits("gpt-4o")[1] == 1000
+    monkeypatch.setenv("OPENAI_TPM_GPT_4O", "2000")
+    assert executor.model_limits("gpt-4o")[1] == 2000
+    assert executor.model_limits("gpt-4o-mini")[1] == 1000
+    monkeypatch.setenv("OPENAI_RPM", "7")
+    assert executor.model_limits("gpt-4o") == (7, 2000)
+
+
+def test_explicit_limits_beat_the_environment(monkeypatch):
+    monkeypatch.setenv("OPENAI_RPM", "7")
+    monkeypatch.setenv("OPENAI_TPM", "1000")
+    ex = make_executor(FakeClient(), model_limits={"gpt-4o": (60, 6000)})
+    requests_bucket, tokens_bucket = ex._limits("gpt-4o")
+    assert (requests_bucket.capacity, tokens_bucket.capacity) == (60, 6000)
+    requests_bucket, tokens_bucket = ex._limits("gpt-4o-mini")
+    assert (requests_bucket.capacity, tokens_bucket.capacity) == (7, 1000)
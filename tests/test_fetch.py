@@ -0,0 +1,64 @@
+import time
+
+import pytest
+
+from agent import workflow
+
+
+def fetcher(name, delay=0.0, items=1, error=None):
+    def fetch(keyword, max_items=10):
+        time.sleep(delay)
+        if error is not None:
+            raise error
+        return [{"title": f"{name} {k}", "url": f"https://{name}.example/{k}"} for k in range(items)]
+
+    return name, fetch
+
+
+@pytest.fixture
+def deadlines(monkeypatch):
+    monkeypatch.setattr(workflow, "PROVIDER_TIMEOUTS", {"fast": 1.0, "medium": 1.0, "slow": 0.3, "broken": 1.0})
+    monkeypatch.setattr(workflow, "FETCH_STAGE_BUDGET", 1.0)
+
+
+def run(monkeypatch, fetchers):
+    monkeypatch.setattr(workflow, "provider_fetchers", lambda: fetchers)
+    started = time.monotonic()
+    state = workflow.fetch_articles({"topic": "ecb rates"})
+    return state, time.monotonic() - started
+
+
+def test_providers_are_fetched_concurrently(monkeypatch, deadlines):
+    state, elapsed = run(monkeypatch, [fetcher("fast", 0.2, 2), fetcher("medium", 0.25, 3)])
+    # One provider's latency, not the sum
+    assert elapsed < 0.4
+    assert [a["title"] for a in state["raw_articles"]] == ["fast 0", "fast 1", "medium 0", "medium 1", "medium 2"]
+    assert {name: s["status"] for name, s in state["fetch_stats"].items()} == {"fast": "ok", "medium": "ok"}
+    assert state["fetch_stats"]["medium"]["items"] == 3
+
+
+def test_slow_provider_is_skipped_at_its_deadline(monkeypatch, deadlines):
+    state, elapsed = run(monkeypatch, [fetcher("slow", 2.0, 5), fetcher("fast", 0.05, 1)])
+    assert elapsed < 0.6
+    assert state["fetch_stats"]["slow"]["status"] == "timeout"
+    assert state["fetch_stats"]["slow"]["items"] == 0
+    assert [a["title"] for a in state["raw_articles"]] == ["fast 0"]
+
+
+def test_stage_budget_caps_every_provider(monkeypatch, deadlines):
+    monkeypatch.setattr(workflow, "FETCH_STAGE_BUDGET", 0.2)
+    state, elapsed = run(monkeypatch, [fetcher("medium", 1.5, 1), fetcher("fast", 0.0, 1)])
+    assert elapsed < 0.5
+    assert state["fetch_stats"]["medium"]["status"] == "timeout"
+    assert state["fetch_stats"]["fast"]["status"] == "ok"
+
+
+def test_provider_errors_do_not_fail_the_stage(monkeypatch, deadlines):
+    state, _ = run(monkeypatch, [fetcher("broken", error=RuntimeError("quota")), fetcher("fast", 0.0, 1)])
+    assert state["fetch_stats"]["broken"] == {
+        "status": "error",
+        "latency_s": pytest.approx(state["fetch_stats"]["broken"]["latency_s"]),
+        "items": 0,
+        "error": "quota",
+    }
+    assert [a["title"] for a in state["raw_articles"]] == ["fast 0"]
@@ -0,0 +1,83 @@
+import threading
+
+import pytest
+
+from graph import graph_analysis
+from graph.text_cache import TextCache
+
+STORY = "The central bank held rates at four percent and signalled a cut in spring. "
+
+
+@pytest.fixture(autouse=True)
+def caches(tmp_path, monkeypatch):
+    path = str(tmp_path / "text_cache.sqlite")
+    monkeypatch.setattr(graph_analysis, "_summary_cache", TextCache("cluster_summary", path))
+    monkeypatch.setattr(graph_analysis, "_digest_cache", TextCache("article_digest", path))
+
+
+def articles(n, repeat=4):
+    return [{"text": f"Report {k}. " + STORY * repeat, "keywords": [f"k{k}"]} for k in range(n)]
+
+
+def chat_calls(client, kind):
+    return client.snapshot().get(kind, {}).get("calls", 0)
+
+
+def test_cluster_summaries_are_cached(fake_openai):
+    arts = articles(6)
+    first = graph_analysis.analyze_clusters(arts, [[0, 1, 2], [3, 4], [5]])
+    assert chat_calls(fake_openai, "chat.summary") == 3
+    assert first[1]["article_ids"] == [3, 4] and first[1]["keywords"] == ["k3", "k4"]
+    assert first[0]["summary_embedding"].shape[0] > 0
+
+    # Same membership, any order: served from the cache
+    second = graph_analysis.analyze_clusters(arts, [[5], [4, 3], [2, 1, 0]])
+    assert chat_calls(fake_openai, "chat.summary") == 3
+    assert second[2]["combined_summary"] == first[0]["combined_summary"]
+
+    # A changed cluster is summarised again; the others are not
+    arts[5]["text"] += " Update: markets rallied."
+    graph_analysis.analyze_clusters(arts, [[0, 1, 2], [3, 4], [5]])
+    assert chat_calls(fake_openai, "chat.summary") == 4
+
+
+def test_large_clusters_are_summarised_map_reduce(fake_openai, monkeypatch):
+    monkeypatch.setattr(graph_analysis, "DIRECT_SUMMARY_MAX_CHARS", 1000)
+    monkeypatch.setattr(graph_analysis, "REDUCE_MAX_CHARS", 800)
+    arts = articles(8, repeat=6)
+    graph_analysis.analyze_clusters(arts, [list(range(8))])
+    calls = chat_calls(fake_openai, "chat.summary")
+    # 8 digests, at least one reduce round, one final summary
+    assert calls > 9
+
+    # Digests are cached per article: a new cluster over the same articles
+    # only pays for its reduce and final calls
+    graph_analysis.analyze_clusters(arts, [list(range(7))])
+    assert chat_calls(fake_openai, "chat.summary") - calls < 7
+
+
+def test_pack_always_shrinks():
+    assert graph_analysis._pack(["a" * 10] * 4, 5) == ["a" * 10 + "\n" + "a" * 10] * 2
+    assert graph_analysis._pack(["ab", "cd", "ef"], 100) == ["ab\ncd\nef"]
+
+
+def test_caches_initialise_once_across_threads(monkeypatch):
+    monkeypatch.setattr(graph_analysis, "_summary_cache", None)
+    monkeypatch.setattr(graph_analysis, "_digest_cache", None)
+    created = []
+    monkeypatch.setattr(graph_analysis, "TextCache", lambda namespace: created.append(namespace) or namespace)
+
+    barrier = threading.Barrier(8)
+    results = []
+
+    def worker():
+        barrier.wait()
+        results.append(graph_analysis._caches())
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == [("cluster_summary", "article_digest")] * 8
+    assert sorted(created) == ["article_digest", "cluster_summary"]
@@ -0,0 +1,188 @@
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from agent import ingest, workflow
+from graph import dedup, graph_analysis
+
+T0 = 1_750_000_000.0
+DIM = 16
+
+
+def iso(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+
+class World:
+    """
+    Fake providers and enrichment: articles in two tight embedding groups,
+    published at controllable times, with a controllable clock.
+    """
+
+    def __init__(self, monkeypatch):
+        rng = np.random.default_rng(0)
+        self.centers = {"a": np.eye(DIM)[0], "b": np.eye(DIM)[1]}
+        self.rng = rng
+        self.now = T0
+        self.feed = []
+        self.folded = {}
+        self.enriched_batches = []
+        self.analyzed = []
+
+        monkeypatch.setattr(ingest, "time", SimpleNamespace(time=lambda: self.now))
+        monkeypatch.setattr(workflow, "fetch_articles", self.fetch)
+        monkeypatch.setattr(workflow, "enrich_articles", self.enrich)
+        monkeypatch.setattr(graph_analysis, "analyze_clusters", self.analyze)
+
+    def add(self, name, group, age=10.0):
+        vec = self.centers[group] + 0.05 * self.rng.standard_normal(DIM)
+        self.feed.append({
+            "url": f"https://news.example.com/{name}?utm_source=feed",
+            "title": name,
+            "published_at": iso(self.now - age),
+            "embedding": vec.astype(np.float32).tolist(),
+        })
+
+    def fetch(self, state):
+        return {"raw_articles": [dict(a) for a in self.feed], "fetch_stats": {}}
+
+    def enrich(self, state):
+        raws = state["raw_articles"]
+        self.enriched_batches.append([r["title"] for r in raws])
+        articles = []
+        for raw in raws:
+            if raw["title"] in self.folded:
+                continue
+            sources = [raw] + [r for r in raws if self.folded.get(r["title"]) == raw["title"]]
+            articles.append(dict(raw, canonical_url=dedup.canonicalize_url(raw["url"]), text=raw["title"], sources=sources))
+        return {"enriched_articles": articles}
+
+    def analyze(self, articles, partition):
+        groups = [list(ids) for ids in partition]
+        self.analyzed.append(groups)
+        return {
+            k: {"combined_summary": f"summary {k}", "article_ids": ids, "keywords": [], "summary_embedding": [0.0] * DIM}
+            for k, ids in enumerate(groups)
+        }
+
+
+@pytest.fixture
+def world(monkeypatch):
+    return World(monkeypatch)
+
+
+def titles(ingestor):
+    return sorted(a["title"] for a in ingestor.articles)
+
+
+def cluster_titles(ingestor):
+    return sorted(sorted(a["title"] for a in c["articles"]) for c in ingestor.clusters)
+
+
+def edges(ingestor):
+    G = ingestor.graph
+    return sorted((e.source, e.target, e["owner"], round(e["weight"], 5)) for e in G.es)
+
+
+def assert_consistent(ingestor):
+    G = ingestor.graph
+    assert G.vcount() == len(ingestor.articles) == len(ingestor.membership) == len(ingestor.kth_score)
+    assert all(0 <= e["owner"] < G.vcount() and e["owner"] in e.tuple for e in G.es)
+    assert all(w > 0 for w in G.es["weight"])
+
+
+def test_first_poll_builds_graph_and_clusters(world):
+    for k in range(4):
+        world.add(f"a{k}", "a")
+        world.add(f"b{k}", "b")
+    ingestor = ingest.IncrementalIngestor("topic", top_n=2)
+    state = ingestor.poll_once()
+
+    assert titles(ingestor) == sorted(f"{g}{k}" for g in "ab" for k in range(4))
+    assert cluster_titles(ingestor) == [[f"a{k}" for k in range(4)], [f"b{k}" for k in range(4)]]
+    assert len(state["enriched_articles"]) == 8 and state["igraph"].ecount() == ingestor.graph.ecount()
+    assert_consistent(ingestor)
+
+
+def test_repeat_poll_enriches_and_summarises_nothing(world):
+    for k in range(3):
+        world.add(f"a{k}", "a")
+        world.add(f"b{k}", "b")
+    ingestor = ingest.IncrementalIngestor("topic", top_n=2)
+    ingestor.poll_once()
+    before = edges(ingestor)
+
+    ingestor.poll_once()
+    assert len(world.enriched_batches) == 1
+    assert len(world.analyzed) == 1
+    assert edges(ingestor) == before
+
+
+def test_new_article_is_added_and_only_its_cluster_resummarised(world):
+    for k in range(3):
+        world.add(f"a{k}", "a")
+        world.add(f"b{k}", "b")
+    ingestor = ingest.IncrementalIngestor("topic", top_n=2)
+    ingestor.poll_once()
+
+    world.add("a3", "a")
+    ingestor.poll_once()
+    assert world.enriched_batches[-1] == ["a3"]
+    assert [sorted(ingestor.articles[i]["title"] for i in g) for g in world.analyzed[-1]] == [["a0", "a1", "a2", "a3"]]
+    assert cluster_titles(ingestor) == [["a0", "a1", "a2", "a3"], ["b0", "b1", "b2"]]
+    assert_consistent(ingestor)
+
+    # Incremental edges match a rebuild from scratch
+    incremental = edges(ingestor)
+    ingestor.rebuild()
+    assert edges(ingestor) == incremental
+
+
+def test_stale_articles_are_evicted_and_not_readded(world):
+    for k in range(3):
+        world.add(f"a{k}", "a", age=10)
+        world.add(f"b{k}", "b", age=500)
+    ingestor = ingest.IncrementalIngestor("topic", window_seconds=1000, top_n=2)
+    ingestor.poll_once()
+    assert len(ingestor.articles) == 6
+
+    world.now += 600
+    ingestor.poll_once()
+    assert titles(ingestor) == ["a0", "a1", "a2"]
+    assert cluster_titles(ingestor) == [["a0", "a1", "a2"]]
+    assert len(world.enriched_batches) == 1
+    assert_consistent(ingestor)
+
+    incremental = edges(ingestor)
+    ingestor.rebuild()
+    assert edges(ingestor) == incremental
+
+
+def test_articles_outside_the_window_are_never_enriched(world):
+    world.add("a0", "a", age=10)
+    world.add("a1", "a", age=10)
+    world.add("old", "a", age=5000)
+    ingestor = ingest.IncrementalIngestor("topic", window_seconds=1000, top_n=2)
+    ingestor.poll_once()
+    assert world.enriched_batches == [["a0", "a1"]]
+
+    ingestor.poll_once()
+    assert len(world.enriched_batches) == 1
+    assert titles(ingestor) == ["a0", "a1"]
+
+
+def test_folded_duplicates_are_not_enriched_again(world):
+    for k in range(3):
+        world.add(f"a{k}", "a")
+    world.add("a0-syndicated", "a")
+    world.folded["a0-syndicated"] = "a0"
+    ingestor = ingest.IncrementalIngestor("topic", top_n=2)
+    ingestor.poll_once()
+    assert titles(ingestor) == ["a0", "a1", "a2"]
+
+    world.folded.clear()
+    ingestor.poll_once()
+    assert len(world.enriched_batches) == 1
+    assert titles(ingestor) == ["a0", "a1", "a2"]
@@ -0,0 +1,105 @@
+import math
+
+import numpy as np
+import pytest
+
+from graph import kgraph
+
+TOPICS = ["election", "budget", "markets", "rates", "energy", "strike", "court", "trade"]
+
+
+def make_articles(n, dim=24, seed=0):
+    rng = np.random.default_rng(seed)
+    articles = []
+    for i in range(n):
+        topics = list(rng.choice(TOPICS, size=rng.integers(0, 4), replace=False))
+        articles.append({"embedding": rng.standard_normal(dim).astype(np.float32).tolist(), "topics": topics})
+    # An article without an embedding keeps its row (cosine 0 to everything)
+    articles[3]["embedding"] = None
+    return articles
+
+
+def dense_reference(articles):
+    """
+    The pre-vectorisation pairwise loop: 0.5 * cosine + 0.5 * IDF-weighted
+    Jaccard of the topic sets, zero diagonal.
+    """
+    n = len(articles)
+    terms = [{t.lower() for t in a["topics"]} for a in articles]
+    df = {}
+    for ts in terms:
+        for t in ts:
+            df[t] = df.get(t, 0) + 1
+    weight = {t: math.log((1 + n) / (1 + c)) + 1.0 for t, c in df.items()}
+
+    S = np.zeros((n, n))
+    for i in range(n):
+        for j in range(n):
+            if i == j:
+                continue
+            a, b = articles[i]["embedding"], articles[j]["embedding"]
+            cos = 0.0
+            if a is not None and b is not None:
+                cos = float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
+            union = sum(weight[t] for t in terms[i] | terms[j])
+            overlap = sum(weight[t] for t in terms[i] & terms[j]) / union if union else 0.0
+            S[i, j] = 0.5 * cos + 0.5 * overlap
+    return S
+
+
+@pytest.mark.parametrize("block_size", [1, 7, 1024])
+def test_blocked_similarity_matches_dense_loop(block_size):
+    articles = make_articles(40)
+    S = kgraph.compute_similarity(articles, block_size=block_size)
+    assert S.dtype == np.float32
+    np.testing.assert_allclose(S, dense_reference(articles), atol=1e-5)
+    np.testing.assert_allclose(S, S.T, atol=1e-6)
+
+
+def test_similarity_rows_match_full_matrix():
+    articles = make_articles(30)
+    Xn = kgraph.normalize_rows(kgraph.embedding_matrix(articles))
+    index = kgraph.build_topic_index(articles)
+    rows = [29, 0, 17, 3]
+    np.testing.assert_allclose(
+        kgraph.similarity_rows(Xn, index, rows), kgraph.compute_similarity(articles)[rows], atol=1e-6
+    )
+
+
+def test_topic_overlap_pairs_match_rows():
+    articles = make_articles(25)
+    index = kgraph.build_topic_index(articles)
+    left, right = np.triu_indices(25, 1)
+    rows = kgraph.topic_overlap_rows(index, np.arange(25))
+    np.testing.assert_allclose(kgraph.topic_overlap_pairs(index, left, right), rows[left, right], atol=1e-6)
+
+
+def test_build_graph_keeps_each_rows_top_n():
+    articles = make_articles(50)
+    S = kgraph.compute_similarity(articles)
+    edges = kgraph.build_graph(S, top_n=3, block_size=8)
+    assert len(edges) == 50 * 3
+
+    for u, v, w in edges:
+        assert u < v and w == pytest.approx(S[u, v])
+    for r in range(50):
+        # Edges come row by row, best first; ties may pick either peer
+        masked = np.delete(S[r], r)
+        expected = np.sort(masked)[::-1][:3]
+        np.testing.assert_allclose([w for *_, w in edges[3 * r:3 * r + 3]], expected, atol=1e-6)
+
+
+@pytest.mark.parametrize("block_size", [5, 1024])
+def test_chunked_graph_matches_dense_graph(block_size):
+    articles = make_articles(60, seed=1)
+    dense = kgraph.build_graph(kgraph.compute_similarity(articles), top_n=4)
+    chunked = kgraph.build_graph_chunked(articles, top_n=4, block_size=block_size)
+    assert [(u, v) for u, v, _ in chunked] == [(u, v) for u, v, _ in dense]
+    np.testing.assert_allclose([w for *_, w in chunked], [w for *_, w in dense], atol=1e-6)
+
+
+def test_small_inputs():
+    assert kgraph.compute_similarity([]).shape == (0, 0)
+    assert kgraph.build_graph_chunked([]) == []
+    one = make_articles(4)[:1]
+    assert kgraph.build_graph(kgraph.compute_similarity(one)) == []
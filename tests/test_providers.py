@@ -0,0 +1,123 @@
+import threading
+import time
+
+import pytest
+
+from news_api import providers
+from news_api.providers import CircuitBreaker, ProviderClient, ProviderUnavailable, ResponseCache
+
+
+class FlakyAdapter(providers.ProviderAdapter):
+    """
+    Returns one article per call, or raises while `down` is set.
+    """
+
+    name = "flaky"
+
+    def __init__(self):
+        self.down = False
+        self.calls = 0
+        self.called = threading.Event()
+
+    def search(self, keyword, max_items=10, **params):
+        self.calls += 1
+        self.called.set()
+        if self.down:
+            raise RuntimeError("provider down")
+        return [{"url": f"https://flaky.example/{keyword}/{self.calls}", "title": keyword}]
+
+
+def make_client(tmp_path, ttl=providers.DEFAULT_TTL):
+    cache = ResponseCache(str(tmp_path / "providers.sqlite"), ttl=ttl)
+    breaker = CircuitBreaker("flaky", store=cache, failure_threshold=2, cooldown=10.0, max_cooldown=30.0)
+    return ProviderClient(FlakyAdapter(), cache, breaker)
+
+
+def test_breaker_opens_half_opens_and_closes(tmp_path):
+    cache = ResponseCache(str(tmp_path / "providers.sqlite"))
+    breaker = CircuitBreaker("p", store=cache, failure_threshold=2, cooldown=10.0, max_cooldown=30.0)
+
+    breaker.record(False, 0.1)
+    assert breaker.state == "closed" and breaker.allow()
+    # A slow success counts as a failure
+    breaker.record(True, breaker.slow_call_s + 1)
+    assert breaker.state == "open" and not breaker.allow()
+
+    breaker.opened_until = time.time() - 1
+    assert breaker.state == "half_open"
+    assert breaker.allow() and not breaker.allow()
+    # The failed probe reopens it for twice as long, capped at max_cooldown
+    breaker.record(False, 0.1)
+    assert breaker.state == "open" and breaker.cooldown == 20.0
+    breaker.opened_until = time.time() - 1
+    breaker.allow()
+    breaker.record(False, 0.1)
+    assert breaker.cooldown == 30.0
+
+    breaker.opened_until = time.time() - 1
+    assert breaker.allow()
+    breaker.record(True, 0.1)
+    assert breaker.state == "closed" and breaker.failures == 0 and breaker.cooldown == 10.0
+
+
+def test_breaker_state_is_shared_through_the_store(tmp_path):
+    cache = ResponseCache(str(tmp_path / "providers.sqlite"))
+    breaker = CircuitBreaker("p", store=cache, failure_threshold=1)
+    breaker.record(False, 0.1)
+    reloaded = CircuitBreaker("p", store=cache, failure_threshold=1)
+    assert reloaded.state == "open" and reloaded.opened_until == breaker.opened_until
+
+
+def test_fresh_hits_skip_the_provider(tmp_path):
+    client = make_client(tmp_path)
+    first = client.fetch("rates", max_items=5)
+    assert client.fetch("rates", max_items=5) == first and client.adapter.calls == 1
+    # Different params are a different response
+    client.fetch("rates", max_items=6)
+    assert client.adapter.calls == 2
+    assert client.cache.stats()["hits"] == 1
+
+
+def test_stale_response_is_served_while_it_refreshes(tmp_path):
+    client = make_client(tmp_path, ttl=0)
+    first = client.fetch("rates")
+    client.adapter.called.clear()
+
+    assert client.fetch("rates") == first
+    assert client.adapter.called.wait(2.0)
+    deadline = time.time() + 2.0
+    while client._refreshing and time.time() < deadline:
+        time.sleep(0.01)
+    stats = client.cache.stats()
+    assert stats["stale_hits"] == 1 and stats["refreshes"] == 1 and stats["stores"] == 2
+    assert client.fetch("rates") != first
+
+
+def test_stale_response_is_served_while_the_breaker_is_open(tmp_path):
+    client = make_client(tmp_path, ttl=0)
+    first = client.fetch("rates")
+    client.adapter.down = True
+    for _ in range(2):
+        client.breaker.record(False, 0.1)
+    assert client.breaker.state == "open"
+
+    calls = client.adapter.calls
+    assert client.fetch("rates") == first
+    # No refresh goes out to an open breaker
+    assert client.adapter.calls == calls and client.cache.stats()["refreshes"] == 0
+
+    with pytest.raises(ProviderUnavailable):
+        client.fetch("inflation")
+    assert client.adapter.calls == calls
+
+
+def test_failures_on_a_miss_open_the_breaker(tmp_path):
+    client = make_client(tmp_path)
+    client.adapter.down = True
+    for _ in range(2):
+        with pytest.raises(RuntimeError, match="provider down"):
+            client.fetch("rates")
+    assert client.breaker.state == "open"
+    with pytest.raises(ProviderUnavailable):
+        client.fetch("rates")
+    assert client.adapter.calls == 2
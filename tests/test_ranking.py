@@ -0,0 +1,100 @@
+import functools
+
+import numpy as np
+import pytest
+
+from graph import article_store, embeddings
+from graph.article_store import ArticleStore, article_cosine
+from ranking import ranking_articles
+from ranking.ranking_articles import mmr_select, rank_clusters_by_embedding, top_k_indices
+
+E = np.eye(4, dtype=np.float32)
+
+
+class FakeService:
+    """
+    Embeds the query to a fixed vector and summaries by a lookup table.
+    """
+
+    def __init__(self, query_vec, table=None):
+        self.query_vec = query_vec
+        self.table = table or {}
+        self.embedded = []
+
+    def embed_one(self, text):
+        return self.query_vec
+
+    def embed(self, texts):
+        self.embedded.extend(texts)
+        return np.stack([self.table[t] for t in texts])
+
+
+@pytest.fixture
+def service(monkeypatch):
+    def use(query_vec, table=None):
+        fake = FakeService(np.asarray(query_vec, dtype=np.float32), table)
+        monkeypatch.setattr(embeddings, "get_service", lambda: fake)
+        return fake
+
+    return use
+
+
+def test_top_k_indices():
+    scores = np.array([0.1, 0.9, 0.5, 0.9, -1.0], dtype=np.float32)
+    assert top_k_indices(scores, 3).tolist() == [1, 3, 2]
+    assert top_k_indices(scores, 10).tolist() == [1, 3, 2, 0, 4]
+    assert top_k_indices(scores, 0).tolist() == []
+
+
+def test_mmr_prefers_novel_rows():
+    query = np.array([1.0, 1.0, 0.0, 0.0])
+    vectors = np.array([[1.0, 0.9, 0, 0], [1.0, 0.92, 0, 0], [0.2, 1.0, 0, 0], [0, 0, 1.0, 0]])
+    # Plain cosine ranking takes the two near-identical rows first
+    assert mmr_select(query, vectors, 2, lambda_=1.0) == [1, 0]
+    # MMR swaps the second near-duplicate for a different angle on the query
+    assert mmr_select(query, vectors, 2, lambda_=0.5) == [1, 2]
+    assert sorted(mmr_select(query, vectors, 10)) == [0, 1, 2, 3]
+    assert mmr_select(query, vectors[:0], 3) == [] and mmr_select(query, vectors, 0) == []
+
+
+def test_clusters_ranked_from_stored_embeddings(service):
+    fake = service(E[0] + 0.5 * E[1])
+    clusters = [
+        {"summary": "b", "embedding": E[1], "articles": [{"embedding": E[1]}]},
+        {"summary": "a", "embedding": E[0], "articles": [{"embedding": E[0]}, {"embedding": E[2]}]},
+        {"summary": "c", "embedding": E[2], "articles": []},
+    ]
+    ranked = rank_clusters_by_embedding(clusters, "question")
+    assert [c["summary"] for c in ranked] == ["a", "b", "c"]
+    q = (E[0] + 0.5 * E[1]) / np.linalg.norm(E[0] + 0.5 * E[1])
+    # 0.5 * summary cosine + 0.5 * best article cosine; summary only without articles
+    assert ranked[0]["relevance"] == pytest.approx(q[0])
+    assert ranked[2]["relevance"] == pytest.approx(0.0, abs=1e-6)
+    assert fake.embedded == []
+
+    assert [c["summary"] for c in rank_clusters_by_embedding(clusters, "question", top_k=1)] == ["a"]
+
+
+def test_missing_summary_embeddings_are_filled_once(service):
+    fake = service(E[2], {"old": E[2]})
+    clusters = [{"summary": "old", "articles": []}, {"summary": "new", "embedding": E[0], "articles": []}]
+    ranked = rank_clusters_by_embedding(clusters, "question")
+    assert ranked[0]["summary"] == "old" and fake.embedded == ["old"]
+    rank_clusters_by_embedding(clusters, "question")
+    assert fake.embedded == ["old"]
+
+
+
+def test_ranking_reads_the_quantized_copy_of_the_store(service, monkeypatch):
+    store = ArticleStore(np.random.default_rng(0).standard_normal((40, 4)).astype(np.float32))
+    articles = store.attach([{} for _ in range(40)])
+    clusters = [{"summary": str(k), "embedding": E[k], "articles": articles[10 * k:10 * k + 10]} for k in range(4)]
+    service(E[0] + E[3])
+
+    exact = [(c["summary"], c["relevance"]) for c in rank_clusters_by_embedding(clusters, "question")]
+    monkeypatch.setattr(ranking_articles, "article_cosine", functools.partial(article_cosine, quantization="int8"))
+    quantized = [(c["summary"], c["relevance"]) for c in rank_clusters_by_embedding(clusters, "question")]
+
+    assert [s for s, _ in quantized] == [s for s, _ in exact]
+    np.testing.assert_allclose([r for _, r in quantized], [r for _, r in exact], atol=2e-2)
+    assert (id(store.matrix), "int8", article_store.STORE_DIMENSIONS) in article_store._quantized
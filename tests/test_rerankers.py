@@ -0,0 +1,131 @@
+import numpy as np
+import pytest
+
+from graph.text_cache import TextCache
+from ranking import rerankers
+from ranking.rerankers import LLMJudgeStage, MultiStageReranker, RerankStage
+
+
+class FakeExecutor:
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.prompts = []
+
+    def complete(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        return self.replies.pop(0)
+
+
+class FixedStage(RerankStage):
+    """
+    Scores clusters by their "score" key; counts the clusters it scores.
+    """
+
+    name = "fixed"
+    cache_id = "fixed:v1"
+
+    def __init__(self):
+        self.scored = 0
+
+    def _score(self, query, clusters):
+        self.scored += len(clusters)
+        return [c.get("score") for c in clusters]
+
+
+@pytest.fixture(autouse=True)
+def score_cache(tmp_path, monkeypatch):
+    cache = TextCache("rerank_scores", path=str(tmp_path / "cache.sqlite"))
+    monkeypatch.setattr(rerankers, "_score_cache", cache)
+    return cache
+
+
+def use_executor(monkeypatch, replies):
+    fake = FakeExecutor(replies)
+    monkeypatch.setattr(rerankers, "get_executor", lambda: fake)
+    return fake
+
+
+def clusters(n):
+    return [{"cid": k, "summary": f"story {k}", "articles": [{"text": f"article {k}"}]} for k in range(n)]
+
+
+def test_llm_threshold_drops_irrelevant_clusters(monkeypatch):
+    use_executor(monkeypatch, ['{"0": 2, "1": 9, "2": 5, "3": 4}'])
+    reranker = MultiStageReranker([(LLMJudgeStage(threshold=4.0), None)])
+    ranked = reranker.rerank("query", clusters(4))
+    assert [c["cid"] for c in ranked] == [1, 2, 3]
+    assert ranked[0]["rerank_scores"] == {"llm": 9.0}
+
+
+def test_keep_applies_before_the_threshold(monkeypatch):
+    use_executor(monkeypatch, ['{"0": 8, "1": 9, "2": 7}'])
+    reranker = MultiStageReranker([(LLMJudgeStage(), 2)])
+    assert [c["cid"] for c in reranker.rerank("query", clusters(3))] == [1, 0]
+    assert reranker.last_counts == {"llm": 3}
+
+
+def test_scores_are_cached_per_query_and_content(monkeypatch):
+    fake = use_executor(monkeypatch, ['{"0": 6, "1": 8}', '{"0": 3}', '{"0": 1, "1": 1}'])
+    stage = LLMJudgeStage()
+    first = stage.score("query", clusters(2))
+    assert list(first) == [6.0, 8.0]
+
+    # Same question, same content: no call, even with a new cid
+    again = clusters(2)
+    again[0]["cid"] = 42
+    assert list(stage.score("query", again)) == [6.0, 8.0]
+    assert len(fake.prompts) == 1
+
+    # Only the changed cluster is judged again
+    changed = clusters(2)
+    changed[1]["summary"] = "something else"
+    assert list(stage.score("query", changed)) == [6.0, 3.0]
+    assert len(fake.prompts) == 2
+    assert "story 1" not in fake.prompts[1]
+
+    # Another question is scored from scratch
+    stage.score("other query", clusters(2))
+    assert len(fake.prompts) == 3
+
+
+def test_unparseable_judgment_keeps_order_and_is_not_cached(monkeypatch, capsys):
+    fake = use_executor(monkeypatch, ["I cannot rate these.", '{"0": 1, "1": 9, "2": 5}'])
+    reranker = MultiStageReranker([(LLMJudgeStage(), None)])
+    ranked = reranker.rerank("query", clusters(3))
+    assert [c["cid"] for c in ranked] == [0, 1, 2]
+    assert all("rerank_scores" not in c for c in ranked)
+    assert "unparseable" in capsys.readouterr().out
+
+    # Nothing was cached, so the next call asks again
+    ranked = reranker.rerank("query", clusters(3))
+    assert [c["cid"] for c in ranked] == [1, 2]
+    assert len(fake.prompts) == 2
+
+
+def test_missing_scores_are_not_zero(monkeypatch):
+    fake = use_executor(monkeypatch, ['{"0": 2, "2": 7}', '{"0": 6}'])
+    stage = LLMJudgeStage()
+    scores = stage.score("query", clusters(3))
+    assert scores[0] == 2.0 and np.isnan(scores[1]) and scores[2] == 7.0
+
+    # Only the unscored cluster is asked about again
+    assert list(stage.score("query", clusters(3))) == [2.0, 6.0, 7.0]
+    assert "story 1" in fake.prompts[1] and "story 0" not in fake.prompts[1]
+
+
+def test_unscored_clusters_follow_and_skip_the_threshold(monkeypatch):
+    use_executor(monkeypatch, ['{"0": 2, "2": 7, "3": "n/a"}'])
+    reranker = MultiStageReranker([(LLMJudgeStage(threshold=4.0), None)])
+    ranked = reranker.rerank("query", clusters(4))
+    assert [c["cid"] for c in ranked] == [2, 1, 3]
+
+
+def test_stages_run_in_order_on_survivors():
+    first, second = FixedStage(), FixedStage()
+    second.name, second.cache_id = "second", "second:v1"
+    items = [dict(c, score=float(c["cid"])) for c in clusters(6)]
+    reranker = MultiStageReranker([(first, 4), (second, 2)])
+    ranked = reranker.rerank("query", items, k=1)
+    assert [c["cid"] for c in ranked] == [5]
+    assert (first.scored, second.scored) == (6, 4)
+    assert reranker.last_counts == {"fixed": 6, "second": 4}
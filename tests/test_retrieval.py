@@ -0,0 +1,117 @@
+import json
+import threading
+import time
+
+from agent import retrieval
+
+
+def provider(name, articles, delay=0.0, fail=False, log=None):
+    def fetch(query, max_items=10):
+        if log is not None:
+            log.append((name, query, max_items))
+        time.sleep(delay)
+        if fail:
+            raise RuntimeError(f"{name} down")
+        return [dict(a) for a in articles(query)][:max_items]
+
+    return name, fetch
+
+
+def stories(prefix, n, title="budget vote"):
+    return lambda query: [{"url": f"https://{prefix}.example/{query}/{k}", "title": f"{title} {k}"} for k in range(n)]
+
+
+def test_plan_splits_the_budget_by_weight():
+    fetchers = [("a", None), ("b", None)]
+    plan = retrieval.plan_calls(["topic", "sub 1", "sub 2"], fetchers, article_budget=40)
+    assert [(q, name) for q, name, _, _ in plan] == [
+        ("topic", "a"), ("topic", "b"), ("sub 1", "a"), ("sub 1", "b"), ("sub 2", "a"), ("sub 2", "b"),
+    ]
+    # 40 * 1.5 overfetch, topic weighted 2 of 4, split over 2 providers
+    assert [n for *_, n in plan] == [15, 15, 8, 8, 8, 8]
+    tiny = retrieval.plan_calls(["topic", "sub"], fetchers, article_budget=4)
+    assert all(n == retrieval.MIN_ITEMS_PER_CALL for *_, n in tiny)
+
+
+def test_expand_query_falls_back_to_the_topic(fake_openai, monkeypatch):
+    queries = retrieval.expand_query("budget vote", max_subqueries=3)
+    assert queries[0] == "budget vote" and len(queries) == 3
+    assert retrieval.expand_query("budget vote", max_subqueries=1) == ["budget vote"]
+
+    class Broken:
+        def complete(self, *args, **kwargs):
+            return "not json"
+
+    monkeypatch.setattr(retrieval, "get_executor", lambda: Broken())
+    assert retrieval.expand_query("budget vote", max_subqueries=3) == ["budget vote"]
+
+
+def test_fan_out_dedups_across_subqueries_and_providers():
+    same = lambda query: [{"url": "https://wire.example/budget?utm_source=feed", "title": "budget vote passes"}]
+    fetchers = [provider("a", same), provider("b", stories("b", 3))]
+    articles, stats, run = retrieval.fan_out("budget vote", ["budget vote", "budget debate"], fetchers, article_budget=50)
+
+    urls = [a["url"] for a in articles]
+    assert len(urls) == len(set(urls)) == 7
+    assert run["duplicates"] == 1 and run["articles"] == 7 and not run["stopped_early"]
+    assert {a["subquery"] for a in articles} == {"budget vote", "budget debate"}
+    assert stats["a"]["calls"] == 2 and stats["a"]["items"] == 2 and stats["b"]["items"] == 6
+
+
+def test_fan_out_stops_once_the_article_budget_is_filled():
+    log = []
+    fetchers = [provider("fast", stories("f", 30), log=log), provider("slow", stories("s", 30), delay=2.0, log=log)]
+    started = time.monotonic()
+    articles, stats, run = retrieval.fan_out("budget vote", ["budget vote"], fetchers, article_budget=4)
+
+    assert time.monotonic() - started < 1.0
+    assert len(articles) == 4 and run["stopped_early"]
+    assert {c["provider"]: c["status"] for c in run["calls"]} == {"fast": "ok", "slow": "cancelled"}
+    # Each call asks for MIN_ITEMS_PER_CALL; the fast one's extra is over budget
+    assert log[0][2] == retrieval.MIN_ITEMS_PER_CALL and run["over_budget"] == 1
+
+
+def test_fan_out_abandons_calls_at_their_timeout():
+    fetchers = [provider("ok", stories("o", 3)), provider("hung", stories("h", 3), delay=1.0)]
+    started = time.monotonic()
+    articles, stats, run = retrieval.fan_out(
+        "budget vote", ["budget vote"], fetchers, timeouts={"hung": 0.1}, article_budget=50
+    )
+    assert time.monotonic() - started < 0.8
+    assert len(articles) == 3
+    assert stats["hung"]["status"] == "timeout" and stats["ok"]["status"] == "ok"
+
+
+def test_fan_out_latency_budget_caps_every_call():
+    fetchers = [provider("slow", stories("s", 3), delay=1.0)]
+    started = time.monotonic()
+    articles, stats, run = retrieval.fan_out("budget vote", ["budget vote"], fetchers, latency_budget=0.1)
+    assert time.monotonic() - started < 0.8
+    assert articles == [] and stats["slow"]["status"] == "timeout"
+
+
+def test_irrelevant_articles_only_fill_the_remaining_budget():
+    off_topic = stories("x", 10, title="football final")
+    fetchers = [provider("a", stories("a", 4)), provider("b", off_topic)]
+    articles, _, run = retrieval.fan_out("budget vote", ["budget vote"], fetchers, article_budget=6)
+
+    assert [a["url"].split("/")[2] for a in articles] == ["a.example"] * 4 + ["x.example"] * 2
+    # Each provider was asked for 5 (6 * 1.5 overfetch over 2 providers)
+    assert run["irrelevant"] == 5
+
+
+def test_errors_are_reported_per_provider_and_accepted_articles_are_streamed():
+    accepted = []
+    lock = threading.Lock()
+
+    def on_article(article):
+        with lock:
+            accepted.append(article["url"])
+
+    fetchers = [provider("ok", stories("o", 3)), provider("down", stories("d", 3), fail=True)]
+    articles, stats, run = retrieval.fan_out(
+        "budget vote", ["budget vote"], fetchers, article_budget=50, on_article=on_article
+    )
+    assert stats["down"] == {"status": "error", "latency_s": stats["down"]["latency_s"], "items": 0, "calls": 1, "error": "down down"}
+    assert accepted == [a["url"] for a in articles] and len(accepted) == 3
+    json.dumps(run)
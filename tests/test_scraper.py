@@ -0,0 +1,196 @@
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from graph import scraper
+from graph.scrape_cache import ScrapeCache
+from graph.scraper import MIN_TEXT_CHARS, Scraper
+
+ARTICLE = "<html><body>" + "<p>The council approved the budget after a long debate.</p>" * 20 + "</body></html>"
+TEASER = "<html><body><p>Subscribe to read the rest of this story.</p></body></html>"
+SLOW_SECONDS = 0.2
+
+
+class Site:
+    """
+    What the fixture server saw: requests per path, conditional headers and
+    the peak number of requests in flight per Host.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hits = {}
+        self.conditional = []
+        self.inflight = {}
+        self.peak = {}
+
+    def enter(self, host, path, headers):
+        with self.lock:
+            self.hits[path] = self.hits.get(path, 0) + 1
+            if headers.get("If-None-Match"):
+                self.conditional.append(path)
+            self.inflight[host] = self.inflight.get(host, 0) + 1
+            self.peak[host] = max(self.peak.get(host, 0), self.inflight[host])
+
+    def leave(self, host):
+        with self.lock:
+            self.inflight[host] -= 1
+
+
+def make_handler(site):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            host = self.headers["Host"].split(":")[0]
+            site.enter(host, self.path, self.headers)
+            try:
+                self.route()
+            finally:
+                site.leave(host)
+
+        def route(self):
+            if self.path.startswith("/slow/"):
+                time.sleep(SLOW_SECONDS)
+                self.reply(200, ARTICLE)
+            elif self.path == "/etag":
+                if self.headers.get("If-None-Match") == '"v1"':
+                    self.reply(304, "", {"ETag": '"v1"'})
+                else:
+                    self.reply(200, ARTICLE, {"ETag": '"v1"'})
+            elif self.path == "/teaser":
+                self.reply(200, TEASER)
+            elif self.path == "/article":
+                self.reply(200, ARTICLE)
+            else:
+                self.reply(404, "not found")
+
+        def reply(self, status, body, headers=None):
+            data = body.encode("utf-8")
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            if status != 304:
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            if status != 304:
+                self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+@pytest.fixture
+def site():
+    site = Site()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(site))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    site.port = server.server_address[1]
+    yield site
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def tag_stripping_parser(monkeypatch):
+    # newspaper's extraction heuristics are not under test here
+    monkeypatch.setattr(scraper, "parse_html", lambda url, html: " ".join(re.sub(r"<[^>]+>", " ", html).split()))
+
+
+def url(site, path, host="127.0.0.1"):
+    return f"http://{host}:{site.port}{path}"
+
+
+def make_scraper(**kwargs):
+    kwargs.setdefault("domain_interval", 0.0)
+    return Scraper(parse_workers=0, **kwargs)
+
+
+def test_per_domain_concurrency_limit(site):
+    urls = [url(site, f"/slow/{k}", host) for host in ("127.0.0.1", "localhost") for k in range(6)]
+    started = time.monotonic()
+    with make_scraper(max_concurrency=12, max_per_domain=2) as s:
+        texts = s.scrape_urls(urls)
+    elapsed = time.monotonic() - started
+
+    assert all(texts)
+    assert site.peak == {"127.0.0.1": 2, "localhost": 2}
+    # 6 pages per host, 2 at a time
+    assert elapsed >= 3 * SLOW_SECONDS
+
+
+def test_domain_interval_spaces_request_starts(site):
+    with make_scraper(max_per_domain=4, domain_interval=0.1) as s:
+        started = time.monotonic()
+        s.scrape_urls([url(site, f"/slow/{k}") for k in range(4)])
+    assert time.monotonic() - started >= 0.3
+
+
+def test_stale_entry_is_revalidated_with_304(site, tmp_path):
+    cache = ScrapeCache(str(tmp_path / "scrape.sqlite"), ttl=0)
+    with make_scraper(cache=cache) as s:
+        first = s.scrape_urls([url(site, "/etag")])[0]
+        second = s.scrape_urls([url(site, "/etag")])[0]
+
+    assert first == second and len(first) >= MIN_TEXT_CHARS
+    assert site.hits["/etag"] == 2
+    assert site.conditional == ["/etag"]
+    assert cache.stats()["revalidated"] == 1
+
+
+def test_fresh_entry_is_served_from_cache(site, tmp_path):
+    cache = ScrapeCache(str(tmp_path / "scrape.sqlite"))
+    with make_scraper(cache=cache) as s:
+        first = s.scrape_one(url(site, "/article"))
+        second = s.scrape_one(url(site, "/article"))
+    assert first == second
+    assert site.hits["/article"] == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_404_is_cached_negatively(site, tmp_path):
+    cache = ScrapeCache(str(tmp_path / "scrape.sqlite"))
+    with make_scraper(cache=cache) as s:
+        assert s.scrape_urls([url(site, "/gone")]) == [None]
+        assert s.scrape_urls([url(site, "/gone")]) == [None]
+    assert site.hits["/gone"] == 1
+    stats = cache.stats()
+    assert stats["negative_stores"] == 1 and stats["negative_hits"] == 1
+
+
+def test_expired_negative_entry_is_retried(site, tmp_path):
+    cache = ScrapeCache(str(tmp_path / "scrape.sqlite"), negative_ttl=0)
+    with make_scraper(cache=cache) as s:
+        s.scrape_one(url(site, "/gone"))
+        s.scrape_one(url(site, "/gone"))
+    assert site.hits["/gone"] == 2
+
+
+def test_short_pages_fall_below_min_text_chars(site, tmp_path):
+    cache = ScrapeCache(str(tmp_path / "scrape.sqlite"))
+    with make_scraper(cache=cache) as s:
+        teaser, article = s.scrape_urls([url(site, "/teaser"), url(site, "/article")])
+        assert s.scrape_one(url(site, "/teaser")) is None
+
+    assert teaser is None
+    assert len(article) >= MIN_TEXT_CHARS
+    # The teaser is remembered as a failure, not downloaded again
+    assert site.hits["/teaser"] == 1
+    assert cache.stats()["negative_stores"] == 1
+
+
+def test_scrape_urls_reuses_the_shared_scraper(site, tmp_path, monkeypatch):
+    shared = make_scraper(cache=ScrapeCache(str(tmp_path / "scrape.sqlite")))
+    monkeypatch.setattr(scraper, "_default_scraper", shared)
+    assert scraper.get_scraper() is shared
+
+    assert scraper.scrape_urls([url(site, "/article")])[0]
+    assert scraper.scrape_urls([url(site, "/article")])[0]
+    # The second call hit the shared scraper's cache
+    assert site.hits["/article"] == 1
+    shared.close()
@@ -0,0 +1,51 @@
+from agent import store, workflow
+from graph import cluster_tree
+
+
+def test_build_index_expands_the_query_before_fetching(monkeypatch, tmp_path):
+    calls = []
+
+    def step(name, **updates):
+        def node(state):
+            calls.append((name, dict(state)))
+            state.update(updates)
+            return state
+
+        return node
+
+    monkeypatch.setattr(workflow, "expand_query", step("expand", subqueries=["rates", "inflation"]))
+    monkeypatch.setattr(workflow, "fetch_articles", step("fetch", raw_articles=[]))
+    monkeypatch.setattr(workflow, "enrich_articles", step("enrich", enriched_articles=[]))
+    monkeypatch.setattr(workflow, "build_similarity_graph", step("graph"))
+    monkeypatch.setattr(workflow, "cluster_and_summarize", step("cluster"))
+    monkeypatch.setattr(store, "save_store", lambda state, path: path)
+    monkeypatch.setattr(store, "ClusterStore", lambda path: path)
+
+    assert store.build_index("central banks", str(tmp_path)) == str(tmp_path)
+    assert [name for name, _ in calls] == ["expand", "fetch", "enrich", "graph", "cluster"]
+    # fetch sees the sub-queries, so it fans out like the full workflow
+    assert calls[1][1]["subqueries"] == ["rates", "inflation"]
+
+
+class FakeStore:
+    tree = {"nodes": []}
+    articles = [{"title": "a"}]
+
+
+def test_query_graph_nodes_are_traced(monkeypatch):
+    monkeypatch.setattr(cluster_tree, "clusters_for", lambda tree, arts, topic, granularity: [{"cid": "0"}])
+
+    def rank(state):
+        state["ranked_clusters"] = state["clusters"]
+        return state
+
+    def draft(state):
+        state["answer"] = "ok"
+        return state
+
+    monkeypatch.setattr(workflow, "rank_clusters", rank)
+    monkeypatch.setattr(workflow, "draft_response", draft)
+
+    result = store.build_query_graph(FakeStore()).invoke({"topic": "rates"})
+    assert result["answer"] == "ok"
+    assert {"load_store", "rank_clusters", "draft_response"} <= set(result["trace"]["nodes"])
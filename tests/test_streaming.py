@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import time
+
+import pytest
+
+from agent import streaming, workflow
+from agent.checkpoint import DiskCheckpointer
+from bench.fakes import SyntheticCorpus
+
+
+class FakeScraper:
+    def __init__(self, pages):
+        self.pages = pages
+
+    def scrape_one(self, url):
+        return self.pages.get(url)
+
+
+@pytest.fixture
+def corpus(monkeypatch, fake_openai):
+    corpus = SyntheticCorpus(24, seed=3)
+    monkeypatch.setattr(streaming, "get_scraper", lambda: FakeScraper(corpus.pages))
+    return corpus
+
+
+def use_fetchers(monkeypatch, fetchers):
+    monkeypatch.setattr(workflow, "provider_fetchers", lambda: fetchers)
+
+
+def test_provider_timeouts_and_errors_are_logged(monkeypatch, corpus, caplog):
+    def fast(query, max_items=10):
+        return [dict(a) for a in corpus.articles[:8]]
+
+    def slow(query, max_items=10):
+        time.sleep(0.5)
+        return []
+
+    def broken(query, max_items=10):
+        raise RuntimeError("quota exceeded")
+
+    use_fetchers(monkeypatch, [("fast", fast), ("slow", slow), ("broken", broken)])
+    monkeypatch.setitem(workflow.PROVIDER_TIMEOUTS, "slow", 0.05)
+
+    with caplog.at_level(logging.WARNING, logger=streaming.__name__):
+        result = asyncio.run(streaming.stream_articles("budget vote"))
+
+    stats = result["fetch_stats"]
+    assert stats["fast"]["status"] == "ok" and stats["fast"]["items"] == 8
+    assert stats["slow"]["status"] == "timeout"
+    assert stats["broken"]["status"] == "error"
+    messages = [r.getMessage() for r in caplog.records]
+    assert any("[fetch:slow] skipped after" in m for m in messages)
+    assert any("[fetch:broken] skipped due to error: quota exceeded" in m for m in messages)
+    assert result["enriched_articles"] and "retrieval_stats" not in result
+
+
+def test_subqueries_fan_out_under_the_shared_budget(monkeypatch, corpus):
+    asked = []
+
+    def make(name, share):
+        def fetch(query, max_items=10):
+            asked.append((name, query, max_items))
+            return [dict(a, title=f"{query} {a['title']}") for a in share]
+        return fetch
+
+    use_fetchers(monkeypatch, [("a", make("a", corpus.articles[:12])), ("b", make("b", corpus.articles[12:]))])
+    subqueries = ["budget vote", "parliament budget", "tax plan"]
+    result = asyncio.run(streaming.stream_articles("budget vote", subqueries))
+
+    assert {(name, query) for name, query, _ in asked} == {(n, q) for n in "ab" for q in subqueries}
+    stats = result["retrieval_stats"]
+    assert stats["subqueries"] == subqueries and len(stats["calls"]) == 6
+    # Each URL came back once per sub-query; only the first copy is kept
+    assert len(result["raw_articles"]) == 24 and stats["duplicates"] == 48
+    assert all(a["subquery"] in subqueries for a in result["raw_articles"])
+    assert result["stream_stats"]["fetch"]["items"] == 24
+    assert {a["url"] for a in result["enriched_articles"]} <= set(corpus.pages)
+    assert all(a.get("embedding") is not None for a in result["enriched_articles"])
+
+
+def test_streaming_graph_expands_the_query_first(tmp_path):
+    graph = streaming.build_streaming_graph(checkpointer=DiskCheckpointer(str(tmp_path / "checkpoints.sqlite")))
+    edges = {(e.source, e.target) for e in graph.get_graph().edges}
+    assert ("__start__", "expand_query") in edges and ("expand_query", "stream_articles") in edges
@@ -0,0 +1,80 @@
+import json
+from typing import Any, Dict, TypedDict
+
+from langgraph.graph import END, StateGraph
+
+from agent.checkpoint import DiskCheckpointer
+from llm import tracing
+
+
+class State(TypedDict, total=False):
+    n: int
+    trace: Dict[str, Any]
+
+
+def step(state):
+    for k in range(5):
+        tracing.record("llm", "gpt-4o", 0.01, prompt_tokens=10, items=k)
+    return {"n": state.get("n", 0) + 1}
+
+
+def make_graph(checkpointer=None):
+    builder = StateGraph(State)
+    builder.add_node("first", tracing.traced_node("first", step))
+    builder.add_node("second", tracing.traced_node("second", step))
+    builder.set_entry_point("first")
+    builder.add_edge("first", "second")
+    builder.add_edge("second", END)
+    return builder.compile(checkpointer=checkpointer)
+
+
+def test_state_carries_a_summary_and_the_tracer_keeps_the_spans():
+    result = make_graph().invoke({})
+    trace = result["trace"]
+
+    assert "spans" not in trace and trace["span_count"] == 12
+    assert trace["totals"]["llm"]["calls"] == 10 and trace["totals"]["llm"]["prompt_tokens"] == 100
+    assert set(trace["nodes"]) == {"first", "second"}
+
+    full = tracing.get_trace(trace)
+    assert len(full["spans"]) == 12
+    assert {s["node"] for s in full["spans"]} == {"first", "second"}
+    report = tracing.summary(trace)
+    assert report["spans"] == 12 and report["nodes"]["first"]["seconds"] > 0
+    assert report == tracing.summary(full)
+
+
+def test_checkpoints_hold_no_spans(tmp_path):
+    checkpointer = DiskCheckpointer(str(tmp_path / "checkpoints.sqlite"))
+    config = {"configurable": {"thread_id": "t1"}}
+    result = make_graph(checkpointer).invoke({}, config)
+
+    saved = checkpointer.get_tuple(config).checkpoint["channel_values"]["trace"]
+    assert saved == result["trace"] and "spans" not in saved
+
+
+def test_export_resolves_the_summary(tmp_path):
+    result = make_graph().invoke({})
+    path = tracing.export_trace(result["trace"], str(tmp_path / "trace.json"))
+    with open(path, encoding="utf-8") as fh:
+        events = [e for e in json.load(fh)["traceEvents"] if e["ph"] == "X"]
+    assert len(events) == 12
+
+
+def test_a_forgotten_trace_continues_its_totals(monkeypatch):
+    result = make_graph().invoke({})
+    trace = result["trace"]
+    monkeypatch.setattr(tracing, "_traces", type(tracing._traces)())
+
+    # As in a resumed run in a new process: totals carry on, spans restart
+    assert tracing.get_trace(trace)["spans"] == []
+    tracer = tracing.Tracer.from_dict(trace)
+    assert tracer.trace_id == trace["trace_id"] and tracer.totals["llm"]["calls"] == 10
+    assert tracing.Tracer.from_dict(trace) is tracer
+
+
+def test_only_the_latest_traces_are_kept(monkeypatch):
+    monkeypatch.setattr(tracing, "MAX_TRACES", 3)
+    monkeypatch.setattr(tracing, "_traces", type(tracing._traces)())
+    tracers = [tracing.Tracer() for _ in range(5)]
+    assert list(tracing._traces) == [t.trace_id for t in tracers[2:]]